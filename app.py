@@ -4,6 +4,62 @@ import numpy as np
 import openpyxl
 from pathlib import Path
 import altair as alt
+from dataclasses import replace
+
+from calculadora.core import (
+    aggregate_real,
+    kpi_totals,
+    merma_kpi,
+    convert_to_base_units,
+    order_costs,
+    parse_merma,
+)
+from calculadora.anomaly import DIAGNOSTICOS, diagnosis_counts, history_stats, score_history, score_kpi
+from calculadora.branches import (
+    BASE,
+    BranchModel,
+    branch_costs,
+    branch_summary,
+    compile_branches,
+    consolidate_branches,
+    default_branch_path,
+    explode_branches,
+    read_overrides,
+)
+from calculadora.compact import memory_report
+from calculadora.consumption import read_real_consumption
+from calculadora.costing import (
+    cost_breakdown,
+    default_price_path,
+    missing_prices,
+    price_vector,
+    read_price_file,
+    rollup_costs,
+    workbook_prices,
+)
+from calculadora.diagnostics import Profiler, configure_json_log, history_frame
+from calculadora.exports import FORMATS, ExportCache, file_name, mime_type
+from calculadora.forecast import (
+    DEFAULT_HORIZON,
+    METHODS as FORECAST_METHODS,
+    fit_forecast,
+    forecast_summary,
+    products_without_bom,
+    project_requirements,
+    read_sales,
+    requirement_totals,
+    sales_matrix,
+)
+from calculadora.incremental import IncrementalTotals
+from calculadora.kpistore import GRAINS, KpiStore, default_store_dir, kpi_records
+from calculadora.matrix import COMP_KEYS, explode_detail, compare_with_merge
+from calculadora.mermas import MermaRules, compile_rules, default_rules_path, read_rules
+from calculadora.multilevel import product_yields, subrecipe_map
+from calculadora.production import production_mix, stock_vector
+from calculadora.purchasing import optimize_purchase
+from calculadora.snapshot import BomSnapshot, BomWatcher
+from calculadora.units import UNITS
+from calculadora.views import DEFAULT_PAGE_SIZE, PAGE_SIZES, PageCache, ViewSpec, input_digest, page_count
 
 # =========================
 # TEMA ALTÁIR HP
@@ -147,140 +203,163 @@ st.markdown(
 # HELPERS
 # =========================
 DATA_PATH = Path("data") / "bom_recetas.xlsx"
+SUPPLIERS_PATH = Path("data") / "proveedores.csv"
+DIAG_HISTORY = 20
+
+# Perfilador del rerun (memoria solo si el panel de diagnóstico está activo)
+configure_json_log()
+prof = Profiler(memory=st.session_state.get("diag_activo", False))
 
 
-def parse_merma(raw: str) -> float:
+@st.cache_resource
+def load_bom_watcher(path: Path) -> BomWatcher:
     """
-    Acepta: '0.1', '.30', '0.30', '30%', '0,3'
-    Devuelve proporción float >= 0
+    Versión publicada del BOM (compacto, matrices, catálogo, índice), compartida
+    de solo lectura entre sesiones. Un hilo de fondo la recarga cuando cambia
+    el Excel y publica la nueva versión completa de una sola vez.
     """
-    if raw is None:
-        return 0.0
-    s = str(raw).strip()
-    if s == "":
-        return 0.0
-    s = s.replace(",", ".")
-    is_pct = False
-    if s.endswith("%"):
-        is_pct = True
-        s = s[:-1].strip()
-    if s.startswith("."):
-        s = "0" + s
-    try:
-        v = float(s)
-    except Exception:
-        raise ValueError("Merma inválida. Usa por ejemplo: 0.10, .30, 0.30, 30%")
-    if is_pct:
-        v = v / 100.0
-    if v < 0:
-        raise ValueError("La merma no puede ser negativa.")
-    return v
+    return BomWatcher(path).start()
 
 
-def convert_to_base_units(df: pd.DataFrame) -> pd.DataFrame:
+@st.cache_data
+def load_bom_memory_report(bom_sha256: str, _snap: BomSnapshot) -> pd.DataFrame:
     """
-    Convierte la cantidad final:
-    - gr -> kg (divide entre 1000)
-    - ml -> lt (divide entre 1000)
-    Mantiene otras unidades igual.
-    Espera columnas:
-      - Unidad_comp
-      - Cant_total_comp_teorico
-      - Cant_total_comp_objetivo
-    Agrega:
-      - Unidad_final
-      - Cant_total_teorico_final
-      - Cant_total_objetivo_final
+    Memoria del BOM: DataFrame por sesión vs forma compacta compartida.
     """
-    out = df.copy()
+    return memory_report(_snap.compact.to_frame(), _snap.compact)
 
-    unit = out["Unidad_comp"].astype(str).str.strip().str.lower()
 
-    # factores
-    factor = np.where(unit.eq("gr"), 1/1000,
-             np.where(unit.eq("ml"), 1/1000, 1.0))
+@st.cache_resource
+def load_component_prices(bom_sha256: str, precios_mtime: int, _snap: BomSnapshot) -> np.ndarray:
+    """
+    Precio por Unidad_comp alineado con la matriz: el implícito en el Excel
+    (PU / Cantidad_comp), sobrescrito por data/precios_insumos.csv si existe.
+    Se invalida cuando cambia la versión del BOM o ese archivo.
+    """
+    bom = _snap.bom
+    base = workbook_prices(bom, _snap.compact.to_frame([*COMP_KEYS, "PU", "Cantidad_comp"]))
+    archivo = default_price_path(_snap.path)
+    return price_vector(bom, read_price_file(archivo) if archivo.exists() else None, base)
 
-    unidad_final = np.where(unit.eq("gr"), "kg",
-                   np.where(unit.eq("ml"), "lt", out["Unidad_comp"]))
 
-    out["Unidad_final"] = unidad_final
-    out["Cant_total_teorico_final"] = out["Cant_total_comp_teorico"] * factor
-    out["Cant_total_objetivo_final"] = out["Cant_total_comp_objetivo"] * factor
+@st.cache_resource
+def load_branch_model(bom_sha256: str, sucursales_mtime: int, _snap: BomSnapshot) -> BranchModel:
+    """
+    Ajustes por sucursal (data/sucursales.csv) compilados como deltas dispersas
+    sobre el BOM base compartido. None si no existe el archivo. Se invalida
+    cuando cambia la versión del BOM o ese archivo.
+    """
+    archivo = default_branch_path(_snap.path)
+    if not archivo.exists():
+        return None
+    rendimientos = product_yields(_snap.bom, _snap.compact.to_frame(["Producto", "Cantidad_prod", "Unidad_prod"]))
+    return compile_branches(_snap.bom, _snap.flat, rendimientos, read_overrides(archivo))
+
 
-    return out
+@st.cache_resource
+def load_merma_rules(bom_sha256: str, mermas_mtime: int, _snap: BomSnapshot) -> MermaRules:
+    """
+    Reglas de merma (data/mermas.csv) compiladas contra los índices del BOM;
+    sin archivo quedan vacías. Se invalida cuando cambia la versión del BOM o
+    ese archivo.
+    """
+    archivo = default_rules_path(_snap.path)
+    return compile_rules(_snap.bom, read_rules(archivo) if archivo.exists() else None)
 
 
-@st.cache_data
-def load_bom(path: Path) -> pd.DataFrame:
+@st.cache_resource
+def load_export_cache() -> ExportCache:
     """
-    Carga el BOM con columnas estándar.
+    Archivos exportados por hash de contenido, generados en hilos de fondo.
     """
-    if not path.exists():
-        raise FileNotFoundError(f"No se encontró el archivo: {path}")
-    df = pd.read_excel(path)
-
-    expected_cols = [
-        "Producto",
-        "Nombre_prod",
-        "Cantidad_prod",
-        "Unidad_prod",
-        "Referencia",
-        "Tipo_BOM",
-        "Costo_receta",
-        "PU",
-        "Componente",
-        "Nombre_comp",
-        "Cantidad_comp",
-        "Unidad_comp",
-    ]
-    missing = [c for c in expected_cols if c not in df.columns]
-    if missing:
-        raise ValueError(f"Faltan estas columnas en el Excel: {missing}")
+    return ExportCache()
 
-    # Fill-down de cabecera para filas de componentes
-    for col in ["Producto", "Nombre_prod", "Cantidad_prod", "Unidad_prod", "Referencia", "Tipo_BOM", "Costo_receta", "PU"]:
-        df[col] = df[col].ffill()
 
-    # Señal de cabecera
-    mask_header = df["Tipo_BOM"].notna()
+@st.cache_resource
+def load_page_cache() -> PageCache:
+    """
+    Páginas de las tablas de resultados (Arrow) por hash de contenido.
+    """
+    return PageCache()
 
-    # FIX de desfase (solo si tu excel está corrido así)
-    df["Componente"] = df["Componente"].where(mask_header, df["PU"])
-    df["Nombre_comp"] = df["Nombre_comp"].where(mask_header, df["Componente"])
-    df["Cantidad_comp"] = df["Cantidad_comp"].where(mask_header, df["Nombre_comp"])
-    df["Unidad_comp"] = df["Unidad_comp"].where(mask_header, df["Cantidad_comp"])
 
-    # Numéricos
-    for col in ["Cantidad_prod", "Costo_receta", "PU", "Cantidad_comp"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+@st.cache_resource
+def load_kpi_store(path: Path) -> KpiStore:
+    """
+    Histórico de KPI (Parquet particionado + rollups) junto al BOM.
+    """
+    return KpiStore(default_store_dir(path))
+
 
-    # Textos
-    for col in ["Producto", "Nombre_prod", "Componente", "Nombre_comp", "Unidad_comp"]:
-        df[col] = df[col].astype(str).str.strip()
+@st.cache_data
+def load_merma_stats(stamp: int, sucursal: str, _store: KpiStore) -> pd.DataFrame:
+    """
+    Mediana/MAD histórica de la merma por componente (rollup diario). Se
+    invalida cuando se guarda un KPI nuevo (stamp = mtime del rollup).
+    """
+    return history_stats(_store.read_rollup("dia"), sucursal)
 
-    # Quitar ruido sin componente
-    df = df[df["Componente"] != ""].copy()
 
-    return df
+@st.cache_data
+def load_history_anomalies(stamp: int, _store: KpiStore) -> pd.DataFrame:
+    """Renglones atípicos de todo el histórico diario (todas las sucursales y componentes)."""
+    scored = score_history(_store.read_rollup("dia"))
+    return scored[scored["Diagnostico"] != DIAGNOSTICOS[-1]].reset_index(drop=True)
 
 
 # =========================
 # LOAD BOM
 # =========================
 try:
-    bom_df = load_bom(DATA_PATH)
+    with prof.stage("load_bom") as etapa:
+        bom_watcher = load_bom_watcher(DATA_PATH)
+        # Una sola versión por rerun, aunque se publique otra a mitad del cálculo
+        snap = bom_watcher.current()
+        bom_compact = snap.compact
+        bom_matrix = snap.bom
+        bom_flat = snap.flat
+        costo_receta = snap.costo_receta
+        kpi_store = load_kpi_store(DATA_PATH)
+        export_cache = load_export_cache()
+        page_cache = load_page_cache()
+        precios_path = default_price_path(DATA_PATH)
+        precio_comp = load_component_prices(
+            snap.sha256, precios_path.stat().st_mtime_ns if precios_path.exists() else 0, snap
+        )
+        etapa.rows = len(bom_compact)
 except Exception as e:
     st.error("❌ No pude cargar el archivo de BOM.\n\n" f"Detalles del error: {e}")
     st.stop()
 
-productos_df = (
-    bom_df[bom_df["Tipo_BOM"].notna()][["Producto", "Nombre_prod", "Costo_receta", "PU"]]
-    .drop_duplicates(subset=["Producto", "Nombre_prod"])
-    .sort_values("Producto")
-    .reset_index(drop=True)
-)
+sucursales_path = default_branch_path(DATA_PATH)
+sucursales_mtime = sucursales_path.stat().st_mtime_ns if sucursales_path.exists() else 0
+try:
+    with prof.stage("load_sucursales"):
+        modelo_sucursales = load_branch_model(snap.sha256, sucursales_mtime, snap)
+except (ValueError, KeyError) as e:
+    st.warning(f"No pude cargar los ajustes por sucursal (`{sucursales_path}`): {e}")
+    modelo_sucursales = None
+
+mermas_path = default_rules_path(DATA_PATH)
+mermas_mtime = mermas_path.stat().st_mtime_ns if mermas_path.exists() else 0
+try:
+    with prof.stage("load_mermas"):
+        reglas_merma = load_merma_rules(snap.sha256, mermas_mtime, snap)
+except (ValueError, KeyError) as e:
+    st.warning(f"No pude cargar las reglas de merma (`{mermas_path}`): {e}")
+    reglas_merma = compile_rules(snap.bom, None)
+
+with prof.stage("catalogo") as etapa:
+    productos_df = snap.productos
+    indice_productos = snap.indice
+    producto_labels = indice_productos.labels
+    etapa.rows = len(productos_df)
+
+# Aviso cuando la sesión pasa a una versión nueva del BOM
+if st.session_state.get("bom_version", snap.version) != snap.version:
+    st.toast(f"BOM actualizado: {snap.label}", icon="🔄")
+st.session_state.bom_version = snap.version
 
-producto_labels = {row["Producto"]: f'{row["Producto"]} – {row["Nombre_prod"]}' for _, row in productos_df.iterrows()}
 def format_producto(prod_id: str) -> str:
     return producto_labels.get(prod_id, str(prod_id))
 
@@ -300,7 +379,20 @@ with st.sidebar:
         """
     )
 
-    merma_raw = st.text_input("Merma objetivo (proporción). Ej: 0.10, .30, 30%", value="0.00")
+    sucursal_activa = BASE
+    if modelo_sucursales is not None and modelo_sucursales.sucursales:
+        sucursal_activa = st.selectbox(
+            "Sucursal",
+            [BASE, *modelo_sucursales.sucursales],
+            help=f"Aplica los ajustes de receta y merma de la sucursal (`{sucursales_path}`) sobre el BOM base.",
+        )
+    merma_sucursal = modelo_sucursales.target(sucursal_activa, np.nan) if modelo_sucursales is not None else np.nan
+
+    merma_raw = st.text_input(
+        "Merma objetivo (proporción). Ej: 0.10, .30, 30%",
+        value="0.00" if np.isnan(merma_sucursal) else f"{merma_sucursal:g}",
+        key=f"merma_raw_{sucursal_activa}",
+    )
     try:
         merma_obj = parse_merma(merma_raw)
     except Exception as e:
@@ -312,6 +404,26 @@ with st.sidebar:
 
     factor_merma = 1.0 + merma_obj
     st.caption(f"Factor objetivo aplicado a insumos: **{factor_merma:.3f}**")
+    merma_comp_suc = None
+    if sucursal_activa != BASE:
+        merma_comp_suc = modelo_sucursales.merma_comp.get(sucursal_activa)
+        rama_info = modelo_sucursales.delta(sucursal_activa, plano=False)
+        st.caption(
+            f"Sucursal **{sucursal_activa}**: {rama_info.nnz if rama_info else 0} cambio(s) de receta"
+            + (f", {int(np.isfinite(modelo_sucursales.merma_comp[sucursal_activa]).sum())} merma(s) por componente"
+               if sucursal_activa in modelo_sucursales.merma_comp else "")
+        )
+
+    # Reglas por componente/categoría (y las de la sucursal): un factor por componente
+    usa_reglas = not reglas_merma.empty or merma_comp_suc is not None
+    factor_insumos = reglas_merma.vector(merma_obj, merma_comp_suc) if usa_reglas else factor_merma
+    if not reglas_merma.empty:
+        st.caption(
+            f"Reglas de merma (`{mermas_path.name}`): "
+            + ", ".join(f"{n} por {nivel.lower()}" for nivel, n in reglas_merma.level_counts().items() if n)
+        )
+        if not reglas_merma.ignorados.empty:
+            st.warning(f"{len(reglas_merma.ignorados)} regla(s) de merma con claves que no están en el BOM.")
 
     mostrar_costos = st.checkbox("Mostrar sección de costos", value=True)
     aplicar_merma_a_costos = st.checkbox(
@@ -320,80 +432,505 @@ with st.sidebar:
         help="Si activas esto, el costo objetivo se multiplica por (1 + merma).",
     )
 
+    fuente_costo = st.radio(
+        "Costo de receta desde",
+        ["Excel (Costo_receta)", "Precios por componente"],
+        help=(
+            "Precios por componente: costo = BOM aplanado × precio unitario de cada insumo "
+            f"(implícito en el Excel como PU / Cantidad, o desde `{precios_path}` si existe)."
+        ),
+    )
+
+    n_subrecetas = int((subrecipe_map(bom_matrix) >= 0).sum())
+    explotar_subrecetas = st.checkbox(
+        "Explotar sub-recetas hasta insumos crudos",
+        value=True,
+        help="Si un componente es a su vez un producto del BOM (salsas, masas, bases), se reemplaza por sus insumos.",
+    )
+    st.caption(f"Sub-recetas detectadas en el BOM: **{n_subrecetas}**")
+
+    st.caption(f"BOM en uso: **{snap.label}**")
+    if bom_watcher.error is not None:
+        st.warning(
+            f"La última recarga del BOM falló ({bom_watcher.error.fecha:%H:%M:%S}); "
+            f"se sigue usando la versión anterior.\n\n{bom_watcher.error.mensaje}"
+        )
+    if st.button("🔄 Revisar cambios del BOM"):
+        if bom_watcher.check(force=True):
+            st.rerun()
+
+    verificar_matriz = st.checkbox(
+        "Verificar cálculo vs recálculo completo",
+        value=False,
+        help="Compara el motor matricial contra el merge/groupby original y los totales incrementales contra un recálculo completo.",
+    )
+
+    diag_activo = st.checkbox(
+        "🩺 Diagnóstico de rendimiento",
+        value=False,
+        key="diag_activo",
+        help="Muestra tiempo, pico de memoria (tracemalloc) y filas por etapa de cada rerun.",
+    )
+    diag_panel = st.container()
+
+
+# Costo por unidad de producto alineado con la matriz (sub-recetas incluidas)
+if fuente_costo == "Precios por componente":
+    costo_activo = rollup_costs(bom_flat, precio_comp)
+    productos_costo = productos_df.assign(
+        Costo_receta=pd.Series(costo_activo, index=bom_matrix.productos)
+        .reindex(productos_df["Producto"])
+        .fillna(0.0)
+        .to_numpy()
+    )
+else:
+    costo_activo = costo_receta
+    productos_costo = productos_df
+
+# Con precios por componente, los ajustes de receta de la sucursal cambian el costo: + Δ_plano · p
+if fuente_costo == "Precios por componente" and sucursal_activa != BASE:
+    costo_activo = costo_activo + branch_costs(modelo_sucursales, sucursal_activa, precio_comp)
+    productos_costo = productos_costo.assign(
+        Costo_receta=pd.Series(costo_activo, index=bom_matrix.productos)
+        .reindex(productos_costo["Producto"])
+        .fillna(0.0)
+        .to_numpy()
+    )
+
+
+def render_diagnostics() -> None:
+    """
+    Emite el reporte JSON del rerun y, si está activo, lo muestra en el sidebar.
+    """
+    reporte = prof.emit()
+    historial = st.session_state.setdefault("diag_historial", [])
+    historial.append(reporte)
+    del historial[:-DIAG_HISTORY]
+
+    if not diag_activo:
+        return
+    with diag_panel:
+        st.markdown("#### 🩺 Diagnóstico del rerun")
+        st.caption(f"Total: **{reporte['total_ms']:,.1f} ms** · run `{reporte['run_id']}`")
+        st.dataframe(prof.to_frame(), use_container_width=True, hide_index=True)
+        st.caption(f"Últimos {len(historial)} reruns (ms por etapa)")
+        st.dataframe(history_frame(historial), use_container_width=True, hide_index=True)
+        st.caption("Memoria del BOM por usuarios concurrentes")
+        st.dataframe(load_bom_memory_report(snap.sha256, snap), use_container_width=True, hide_index=True)
+
+
+def stop_rerun() -> None:
+    """st.stop() que antes cierra el reporte de diagnóstico."""
+    render_diagnostics()
+    st.stop()
+
+
+def render_table(
+    df: pd.DataFrame,
+    key: str,
+    columnas=None,
+    orden=None,
+    ascendente=True,
+    top_por=None,
+    entrada: tuple = None,
+) -> None:
+    """
+    Tabla paginada: filtro, orden, top-N y página se resuelven en el servidor
+    y solo se envía la página visible (Arrow cacheado por hash). Si se dan
+    las entradas que producen la tabla, se hashean esas en vez del contenido.
+    """
+    columnas = tuple(columnas or df.columns)
+    c1, c2, c3, c4 = st.columns([3, 2, 1, 1])
+    with c1:
+        filtro = st.text_input("Filtrar", key=f"{key}_filtro", placeholder="Texto en cualquier columna")
+    with c2:
+        orden = st.selectbox(
+            "Ordenar por",
+            columnas,
+            index=columnas.index(orden) if orden in columnas else 0,
+            key=f"{key}_orden",
+        )
+    with c3:
+        ascendente = st.checkbox("Ascendente", value=ascendente, key=f"{key}_asc")
+    with c4:
+        por_pagina = st.selectbox("Filas", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key=f"{key}_filas")
+    top_n = 0
+    if top_por is not None:
+        top_n = int(st.number_input(
+            f"Top N por |{top_por}| (0 = todas)", min_value=0, step=10, value=0, key=f"{key}_top"
+        ))
+
+    spec = ViewSpec(
+        columnas=columnas,
+        filtro=filtro,
+        top_n=top_n,
+        top_por=top_por,
+        orden=orden,
+        ascendente=ascendente,
+        por_pagina=por_pagina,
+    )
+    digest = input_digest(key, *entrada) if entrada is not None else page_cache.digest(df)
+    paginas = page_count(len(page_cache.rows(df, spec, digest)), por_pagina)
+    pagina = 1
+    if paginas > 1:
+        clave = f"{key}_pagina"
+        # Con otro filtro puede haber menos páginas que la elegida
+        if st.session_state.get(clave, 1) > paginas:
+            st.session_state[clave] = paginas
+        pagina = st.number_input(f"Página (de {paginas:,})", min_value=1, max_value=paginas, value=1, step=1, key=clave)
+
+    vista = page_cache.page(df, replace(spec, pagina=int(pagina) - 1), digest)
+    st.dataframe(vista.tabla, use_container_width=True, hide_index=True)
+    if vista.total:
+        st.caption(f"Filas {vista.inicio + 1:,}–{vista.fin:,} de {vista.total:,}")
+    else:
+        st.caption("Sin filas para ese filtro.")
+
+# =========================
+# 0) CÁLCULO INVERSO: ¿QUÉ PODEMOS PRODUCIR?
+# =========================
+with st.expander("🔄 ¿Qué podemos producir con el inventario disponible?", expanded=False):
+    st.caption(
+        "Sube el stock por componente (**Componente, Stock** en kg/lt/unidades). "
+        "Opcional: una tabla de productos con **Producto**, **Precio_venta** (para maximizar margen) "
+        "y/o **Demanda** (tope por producto). Sin precios se maximizan unidades."
+    )
+    i1, i2 = st.columns(2)
+    with i1:
+        inv_up = st.file_uploader("Stock por componente (CSV)", type=["csv"], key="inv_stock_up")
+    with i2:
+        precios_up = st.file_uploader("Precios / demanda por producto (CSV, opcional)", type=["csv"], key="inv_precios_up")
+
+    # El resultado guardado se ata a sus entradas: si cambian, se descarta
+    inv_digest = None
+    if inv_up is not None:
+        inv_digest = input_digest(
+            inv_up.getvalue(),
+            precios_up.getvalue() if precios_up is not None else b"",
+            snap.sha256,
+            explotar_subrecetas,
+            factor_merma,
+            costo_activo,
+        )
+    if st.session_state.get("produccion") is not None and st.session_state.produccion[-1] != inv_digest:
+        del st.session_state["produccion"]
+        if inv_up is not None:
+            st.info("Cambiaron el stock, los precios, los costos, el BOM o la merma: vuelve a calcular la producción.")
+
+    if inv_up is not None and st.button("Calcular producción posible"):
+        try:
+            inv_bom = bom_flat if explotar_subrecetas else bom_matrix
+            inv_stock = stock_vector(inv_bom, pd.read_csv(inv_up))
+            margen = demanda = None
+            if precios_up is not None:
+                precios = pd.read_csv(precios_up)
+                precios["Producto"] = precios["Producto"].astype(str).str.strip()
+                precios = precios.drop_duplicates("Producto", keep="last").set_index("Producto").reindex(inv_bom.productos)
+                if "Precio_venta" in precios.columns:
+                    # El mismo costo por unidad que la sección de costos (fuente y sucursal del sidebar)
+                    margen = pd.to_numeric(precios["Precio_venta"], errors="coerce").to_numpy() - costo_activo
+                if "Demanda" in precios.columns:
+                    demanda = pd.to_numeric(precios["Demanda"], errors="coerce").to_numpy()
+            with prof.stage("0_inverso.calc") as etapa:
+                st.session_state.produccion = (
+                    *production_mix(inv_bom, inv_stock, margen, demanda, factor_merma),
+                    inv_digest,
+                )
+                etapa.rows = len(inv_bom.productos)
+        except (ValueError, KeyError) as e:
+            st.error(f"No pude calcular la producción: {e}")
+
+    if inv_up is not None and "produccion" in st.session_state:
+        plan, uso_inv, estado, _ = st.session_state.produccion
+        plan = plan.merge(productos_df[["Producto", "Nombre_prod"]].drop_duplicates("Producto"), on="Producto", how="left")
+        st.caption(
+            f"Método: **{estado}** · consumo con merma objetivo (factor {factor_merma:.3f})"
+            f" · margen con costo de **{fuente_costo}**"
+        )
+        p1, p2 = st.columns(2)
+        with p1:
+            st.metric("Unidades a producir", f"{plan['Producir'].sum():,.0f}")
+        with p2:
+            st.metric("Margen total", f"${plan['Margen_total'].sum():,.2f} MXN" if plan["Margen_total"].notna().any() else "—")
+        render_table(
+            plan,
+            "produccion",
+            columnas=["Producto", "Nombre_prod", "Max_individual", "Producir", "Margen_unit", "Margen_total"],
+            orden="Producir",
+            ascendente=False,
+        )
+        st.markdown("##### Uso del inventario")
+        render_table(uso_inv, "uso_inventario", orden="Restante")
+
+# =========================
+# 0b) PROYECCIÓN POR PRONÓSTICO DE DEMANDA
+# =========================
+with st.expander("📈 Proyección de requerimientos por pronóstico de demanda", expanded=False):
+    st.caption(
+        "Sube el historial de ventas diarias (**Fecha, Producto, Cantidad**; CSV o Parquet). "
+        "Se pronostica cada producto y el pronóstico se explota por el BOM para obtener "
+        "el requerimiento diario de insumos con la merma objetivo."
+    )
+    ventas_up = st.file_uploader("Historial de ventas", type=["csv", "parquet"], key="ventas_up")
+    f1, f2 = st.columns(2)
+    with f1:
+        horizonte = int(st.number_input("Horizonte (días)", min_value=1, max_value=120, value=DEFAULT_HORIZON, step=1))
+    with f2:
+        metodo_fc = st.selectbox("Método", list(FORECAST_METHODS), format_func=FORECAST_METHODS.get)
+
+    fc_actual = input_digest(ventas_up.getvalue(), horizonte, metodo_fc) if ventas_up is not None else None
+    if st.session_state.get("pronostico") is not None and st.session_state.pronostico[-1] != fc_actual:
+        del st.session_state["pronostico"]
+        if ventas_up is not None:
+            st.info("Cambiaron el historial, el horizonte o el método: vuelve a pronosticar.")
+
+    if ventas_up is not None and st.button("Pronosticar y proyectar"):
+        try:
+            with prof.stage("0b_pronostico.lectura") as etapa:
+                ventas = read_sales(ventas_up)
+                hist_fechas, hist_productos, Y = sales_matrix(ventas)
+                etapa.rows = len(ventas)
+            with prof.stage("0b_pronostico.ajuste") as etapa:
+                pronostico = fit_forecast(hist_fechas, hist_productos, Y, horizonte, metodo_fc)
+                etapa.rows = Y.size
+            st.session_state.pronostico = (
+                pronostico,
+                forecast_summary(pronostico, Y),
+                fc_actual,
+            )
+        except (ValueError, KeyError) as e:
+            st.error(f"No pude pronosticar: {e}")
+
+    if ventas_up is not None and "pronostico" in st.session_state:
+        pronostico, resumen_fc, fc_digest = st.session_state.pronostico
+        fc_bom = bom_flat if explotar_subrecetas else bom_matrix
+        with prof.stage("0b_pronostico.proyeccion") as etapa:
+            diario = project_requirements(fc_bom, pronostico, factor_merma)
+            totales_fc = requirement_totals(diario)
+            etapa.rows = len(diario)
+        entrada_fc = (snap.sha256, explotar_subrecetas, fc_digest, factor_merma)
+
+        st.caption(
+            f"{len(pronostico.productos):,} productos · {pronostico.fechas[0]:%Y-%m-%d} a "
+            f"{pronostico.fechas[-1]:%Y-%m-%d} · merma objetivo (factor {factor_merma:.3f}) · BOM {snap.label}"
+        )
+        sin_bom_fc = products_without_bom(fc_bom, pronostico)
+        if len(sin_bom_fc):
+            st.warning(f"{len(sin_bom_fc)} producto(s) del historial sin BOM (se ignoran): {', '.join(sin_bom_fc[:10])}")
+
+        demanda_dia = pd.DataFrame({"Fecha": pronostico.fechas, "Unidades": pronostico.valores.sum(axis=1)})
+        st.altair_chart(
+            alt.Chart(demanda_dia).mark_line(point=True).encode(x="Fecha:T", y="Unidades:Q"),
+            use_container_width=True,
+        )
+        st.markdown("##### Requerimiento del horizonte por insumo")
+        render_table(totales_fc, "pronostico_totales", orden="Cant_total_objetivo_final", ascendente=False, entrada=entrada_fc)
+        st.markdown("##### Requerimiento diario")
+        render_table(diario, "pronostico_diario", entrada=entrada_fc)
+        st.markdown("##### Pronóstico por producto")
+        render_table(resumen_fc, "pronostico_productos", orden="Pronostico_total", ascendente=False, top_por="MAE_validacion")
+        st.download_button(
+            "⬇️ Descargar proyección (CSV)",
+            data=export_cache.deferred("csv", lambda df=diario: {"proyeccion": df}),
+            file_name="proyeccion_insumos.csv",
+            mime="text/csv",
+        )
+
+# =========================
+# 0c) CONSOLIDADO MULTI-SUCURSAL
+# =========================
+with st.expander("🏬 Requerimiento consolidado por sucursal", expanded=False):
+    st.caption(
+        "Sube el plan por sucursal (**Sucursal, Producto, Cantidad**). Cada sucursal se explota con sus "
+        f"ajustes de receta y merma (`{sucursales_path}`; las que no tienen ajustes usan el BOM base y la "
+        "merma del sidebar) y todas se calculan en una sola pasada."
+    )
+    plan_up = st.file_uploader("Plan por sucursal (CSV)", type=["csv"], key="plan_sucursales_up")
+    if plan_up is not None:
+        try:
+            plan_df = pd.read_csv(plan_up)
+            plan_df = plan_df.rename(columns={c: c.strip().capitalize() for c in plan_df.columns})
+            faltan = {"Sucursal", "Producto", "Cantidad"} - set(plan_df.columns)
+            if faltan:
+                raise ValueError(f"Faltan columnas: {', '.join(sorted(faltan))}")
+            with prof.stage("0c_sucursales.calc") as etapa:
+                por_sucursal = explode_branches(
+                    bom_flat if explotar_subrecetas else bom_matrix,
+                    modelo_sucursales,
+                    plan_df,
+                    merma_obj,
+                    plano=explotar_subrecetas,
+                    reglas=reglas_merma,
+                )
+                consolidado = consolidate_branches(por_sucursal)
+                etapa.rows = len(por_sucursal)
+        except (ValueError, KeyError) as e:
+            st.error(f"No pude calcular el consolidado: {e}")
+        else:
+            entrada_plan = (snap.sha256, explotar_subrecetas, plan_df, merma_obj, sucursales_mtime, mermas_mtime)
+            st.caption(f"{por_sucursal['Sucursal'].nunique()} sucursal(es) · BOM {snap.label}")
+            s1, s2 = st.tabs(["Consolidado", "Por sucursal"])
+            with s1:
+                render_table(consolidado, "sucursales_consolidado", orden="Nombre_comp", entrada=entrada_plan)
+            with s2:
+                render_table(por_sucursal, "sucursales_detalle", orden="Sucursal", entrada=entrada_plan)
+            st.download_button(
+                "⬇️ Descargar consolidado (XLSX)",
+                data=export_cache.deferred(
+                    "xlsx", lambda c=consolidado, d=por_sucursal: {"consolidado": c, "por_sucursal": d}
+                ),
+                file_name=file_name("consolidado_sucursales", "xlsx"),
+                mime=mime_type("xlsx"),
+            )
+    if modelo_sucursales is not None and not modelo_sucursales.ignorados.empty:
+        st.warning(f"{len(modelo_sucursales.ignorados)} ajuste(s) con productos o componentes que no están en el BOM:")
+        st.dataframe(modelo_sucursales.ignorados, use_container_width=True, hide_index=True)
+
 # =========================
 # 1) SELECCIÓN PRODUCTOS
 # =========================
 st.subheader("1️⃣ Selecciona productos del pedido")
-productos_sel = st.multiselect(
-    "Productos a preparar:",
-    options=productos_df["Producto"].tolist(),
-    format_func=format_producto,
-)
+with prof.stage("1_seleccion") as etapa:
+    modo_captura = st.radio(
+        "Modo de captura",
+        ["Buscar productos", "Pegar lista de SKUs"],
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+    seleccion_actual = st.session_state.get("productos_sel", [])
+
+    if modo_captura == "Pegar lista de SKUs":
+        lista_skus = st.text_area(
+            "Pega un SKU por renglón (opcional: cantidad después de un espacio, coma o tab)",
+            placeholder="MB-ASADA 12\nB-NORTEÑO, 4",
+        )
+        if st.button("Agregar al pedido"):
+            agregados, no_encontrados, invalidos = indice_productos.parse_bulk(lista_skus)
+            for prod, qty in agregados.itertuples(index=False):
+                if qty > 0:
+                    st.session_state[f"qty_{prod}"] = int(qty)
+            seleccion_actual = list(dict.fromkeys(seleccion_actual + agregados["Producto"].tolist()))
+            st.session_state.productos_sel = seleccion_actual
+            if no_encontrados:
+                st.warning(f"SKUs no encontrados en el BOM: {', '.join(no_encontrados)}")
+            if invalidos:
+                st.warning(f"Renglones con cantidad inválida (se omitieron): {'; '.join(invalidos)}")
+            st.caption(f"Agregados {len(agregados)} producto(s).")
+        opciones = seleccion_actual
+    else:
+        busqueda = st.text_input("Buscar por código o nombre (sin importar acentos)", key="busqueda_producto")
+        # Solo se mandan al multiselect la selección actual y los primeros resultados
+        opciones = list(dict.fromkeys(seleccion_actual + indice_productos.search(busqueda)))
+
+    productos_sel = st.multiselect(
+        "Productos a preparar:",
+        options=opciones,
+        format_func=format_producto,
+        key="productos_sel",
+    )
+    etapa.rows = len(productos_sel)
 
 if not productos_sel:
     st.info("Selecciona al menos un producto para comenzar.")
-    st.stop()
+    stop_rerun()
 
 # =========================
 # 2) CAPTURA CANTIDADES
 # =========================
 st.subheader("2️⃣ Ingresa las cantidades a preparar")
 
-pedido_rows = []
-cols = st.columns(min(len(productos_sel), 4))
-for idx, prod in enumerate(productos_sel):
-    col = cols[idx % 4]
-    with col:
-        nombre = format_producto(prod)
-        qty = st.number_input(
-            f"Cantidad de\n**{nombre}**",
-            min_value=0,
-            step=1,
-            value=0,
-            key=f"qty_{prod}",
-        )
-        pedido_rows.append({"Producto": prod, "Cantidad_pedida": qty})
-
-pedido_df = pd.DataFrame(pedido_rows)
-pedido_df = pedido_df[pedido_df["Cantidad_pedida"] > 0]
+with prof.stage("2_cantidades") as etapa:
+    pedido_rows = []
+    cols = st.columns(min(len(productos_sel), 4))
+    for idx, prod in enumerate(productos_sel):
+        col = cols[idx % 4]
+        with col:
+            nombre = format_producto(prod)
+            qty = st.number_input(
+                f"Cantidad de\n**{nombre}**",
+                min_value=0,
+                step=1,
+                value=0,
+                key=f"qty_{prod}",
+            )
+            pedido_rows.append({"Producto": prod, "Cantidad_pedida": qty})
+
+    pedido_df = pd.DataFrame(pedido_rows)
+    pedido_df = pedido_df[pedido_df["Cantidad_pedida"] > 0]
+    etapa.rows = len(pedido_df)
 
 if pedido_df.empty:
     st.warning("Ingresa cantidades mayores a 0 para al menos un producto.")
-    st.stop()
+    stop_rerun()
 
 st.markdown("### 🧾 Resumen de productos del pedido")
-st.dataframe(pedido_df.merge(productos_df, on="Producto", how="left"), use_container_width=True)
+with prof.stage("2_cantidades.render"):
+    st.dataframe(pedido_df.merge(productos_df, on="Producto", how="left"), use_container_width=True)
 
 # =========================
 # 3) INSUMOS TEÓRICOS + OBJETIVO
 # =========================
 st.subheader("3️⃣ Consumo total de insumos (Teórico vs Objetivo con merma)")
 
-detalle = pedido_df.merge(
-    bom_df[["Producto", "Componente", "Nombre_comp", "Cantidad_comp", "Unidad_comp"]],
-    on="Producto",
-    how="left",
-)
-
-detalle["Cant_total_comp_teorico"] = detalle["Cantidad_pedida"] * detalle["Cantidad_comp"]
-detalle["Cant_total_comp_objetivo"] = detalle["Cant_total_comp_teorico"] * factor_merma
+# Totales incrementales: solo se aplica el delta de las cantidades que cambiaron
+with prof.stage("3_insumos.calc") as etapa:
+    bom_activo = bom_flat if explotar_subrecetas else bom_matrix
+    totales_inc = st.session_state.get("totales_inc")
+    if (
+        totales_inc is None
+        or totales_inc.bom is not bom_activo
+        or not np.array_equal(totales_inc.costo_receta, costo_activo)
+    ):
+        totales_inc = IncrementalTotals(bom_activo, costo_activo)
+        st.session_state.totales_inc = totales_inc
+    totales_inc.apply(pedido_df)
+
+    # La sucursal suma su delta sobre los totales de la base (sin copiar el BOM)
+    rama = None
+    if sucursal_activa != BASE:
+        rama = modelo_sucursales.delta(sucursal_activa, plano=explotar_subrecetas)
+    factor_resumen = factor_insumos
+    if reglas_merma.por_producto:
+        # Reglas por producto: + Cᵀ · q sobre la matriz activa y el delta de la sucursal
+        q_activo = totales_inc.q
+        factor_resumen = reglas_merma.factor(
+            totales_inc.teorico if rama is None else totales_inc.teorico + rama.delta_t @ q_activo,
+            q_activo,
+            [bom_activo.matriz] if rama is None else [bom_activo.matriz, rama.delta],
+            merma_obj,
+            merma_comp_suc,
+        )
+    resumen = convert_to_base_units(
+        branch_summary(bom_activo, rama, totales_inc.teorico, totales_inc.tocados, totales_inc.q, factor_resumen)
+    )
+    # El BOM es un objeto compartido (cache_resource) que vive todo el proceso
+    entrada_resumen = (
+        snap.sha256, explotar_subrecetas, pedido_df, factor_merma, sucursal_activa, sucursales_mtime, mermas_mtime
+    )
+    etapa.rows = len(resumen)
 
-resumen = (
-    detalle.groupby(["Componente", "Nombre_comp", "Unidad_comp"], as_index=False)[
-        ["Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
-    ]
-    .sum()
-    .sort_values("Nombre_comp")
-    .reset_index(drop=True)
-)
+if verificar_matriz:
+    with prof.stage("3_insumos.verificar"):
+        diff_inc = totales_inc.max_abs_diff()
+        if diff_inc <= 1e-6:
+            st.success(f"Totales incrementales = recálculo completo ({totales_inc.actualizaciones} actualizaciones).")
+        else:
+            st.error(f"Totales incrementales difieren del recálculo completo (máx. {diff_inc:.6g}).")
 
-# ✅ NUEVO: convertir a kg/lt cuando aplique
-resumen = convert_to_base_units(resumen)
+        diferencias = compare_with_merge(bom_matrix, bom_compact.to_frame(), pedido_df, factor_merma)
+        if diferencias.empty:
+            st.success("Motor matricial = merge/groupby (sin diferencias, un nivel).")
+        else:
+            st.error(f"Motor matricial difiere del merge/groupby en {len(diferencias)} componente(s).")
+            st.dataframe(diferencias, use_container_width=True)
 
 st.markdown("#### 📋 Requerimiento total por componente (convertido a kg/lt si aplica)")
-st.dataframe(
-    resumen[
-        [
+st.caption(f"Calculado con BOM {snap.label}" + (f" · sucursal **{sucursal_activa}**" if sucursal_activa != BASE else ""))
+with prof.stage("3_insumos.render"):
+    render_table(
+        resumen,
+        "resumen",
+        columnas=[
             "Componente",
             "Nombre_comp",
             "Unidad_comp",
@@ -402,57 +939,177 @@ st.dataframe(
             "Unidad_final",
             "Cant_total_teorico_final",
             "Cant_total_objetivo_final",
-        ]
-    ],
-    use_container_width=True,
-)
+        ],
+        orden="Nombre_comp",
+        entrada=entrada_resumen,
+    )
+
+with st.expander("🛒 Lista de compra sugerida (presentaciones, MOQ y stock)", expanded=False):
+    st.caption(
+        "Catálogo de proveedores con columnas **Componente, Proveedor, Presentacion, Precio** "
+        "y opcionales **MOQ** (paquetes mínimos), **Lead_time_dias** y **Unidad_presentacion**. "
+        f"Si no subes uno, se usa `{SUPPLIERS_PATH}` cuando existe. "
+        "La presentación se interpreta en la misma unidad final (kg/lt/unidades) salvo que indiques Unidad_presentacion."
+    )
+    c1, c2 = st.columns(2)
+    with c1:
+        catalogo_up = st.file_uploader("Catálogo de proveedores (CSV)", type=["csv"], key="catalogo_up")
+    with c2:
+        stock_up = st.file_uploader("Stock en mano (CSV: Componente, Stock)", type=["csv"], key="stock_up")
+    lead_max = st.number_input("Lead time máximo (días, 0 = sin límite)", min_value=0, step=1, value=0)
+
+    catalogo_df = None
+    try:
+        if catalogo_up is not None:
+            catalogo_df = pd.read_csv(catalogo_up)
+        elif SUPPLIERS_PATH.exists():
+            catalogo_df = pd.read_csv(SUPPLIERS_PATH)
+        stock_df = pd.read_csv(stock_up) if stock_up is not None else None
+    except Exception as e:
+        st.error(f"No pude leer el CSV: {e}")
+        catalogo_df = None
+
+    if catalogo_df is None:
+        st.info("Sube el catálogo de proveedores para calcular la compra.")
+    else:
+        try:
+            with prof.stage("3_compra.calc") as etapa:
+                compra_df, sin_proveedor = optimize_purchase(
+                    resumen, catalogo_df, stock_df, max_lead_time=lead_max or None
+                )
+                etapa.rows = len(compra_df)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            st.dataframe(compra_df, use_container_width=True, hide_index=True)
+            st.metric("Costo de la compra", f"${compra_df['Costo'].sum():,.2f} MXN")
+            if not sin_proveedor.empty:
+                st.warning(f"{len(sin_proveedor)} componente(s) sin proveedor en el catálogo (o fuera del lead time).")
+                st.dataframe(sin_proveedor, use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar lista de compra (CSV)",
+                data=export_cache.deferred("csv", lambda df=compra_df: {"compra": df}),
+                file_name="lista_compra.csv",
+                mime="text/csv",
+            )
 
 # =========================
 # 4) COSTO TEÓRICO + OBJETIVO (opcional)
 # =========================
+costo_df = None
+kpi_df = None
 if mostrar_costos:
     st.subheader("4️⃣ Costo (Teórico vs Objetivo con merma)")
 
-    costo_df = pedido_df.merge(
-        productos_df[["Producto", "Nombre_prod", "Costo_receta", "PU"]],
-        on="Producto",
-        how="left",
-    )
-
-    costo_df["Costo_total_teorico"] = costo_df["Cantidad_pedida"] * costo_df["Costo_receta"]
-    costo_df["PU_teorico"] = costo_df["Costo_receta"] / costo_df["PU"].replace(0, np.nan)
-
-    if aplicar_merma_a_costos:
-        costo_df["Costo_total_objetivo"] = costo_df["Costo_total_teorico"] * factor_merma
-        total_costo_teo = float(costo_df["Costo_total_teorico"].sum())
-        total_costo_obj = float(costo_df["Costo_total_objetivo"].sum())
-    else:
-        costo_df["Costo_total_objetivo"] = np.nan
-        total_costo_teo = float(costo_df["Costo_total_teorico"].sum())
-        total_costo_obj = np.nan
-
-    st.dataframe(
-        costo_df[
-            [
+    with prof.stage("4_costos.calc") as etapa:
+        factor_costos = factor_merma
+        if usa_reglas:
+            # Factor por producto: (M ∘ F) · p / M · p sobre el BOM aplanado (y el de la sucursal)
+            plano_suc = modelo_sucursales.delta(sucursal_activa, plano=True) if sucursal_activa != BASE else None
+            factor_costos = reglas_merma.product_factors(
+                [bom_flat.matriz] if plano_suc is None else [bom_flat.matriz, plano_suc.delta],
+                precio_comp,
+                merma_obj,
+                merma_comp_suc,
+            )
+        costo_df, _, _ = order_costs(
+            pedido_df,
+            productos_costo,
+            pd.Series(factor_costos, index=bom_matrix.productos) if usa_reglas else factor_merma,
+            aplicar_merma_a_costos,
+        )
+        total_costo_teo, total_costo_obj = totales_inc.costs(factor_costos, aplicar_merma_a_costos)
+        etapa.rows = len(costo_df)
+
+    with prof.stage("4_costos.render"):
+        render_table(
+            costo_df,
+            "costos",
+            columnas=[
                 "Producto",
                 "Nombre_prod",
                 "Cantidad_pedida",
                 "Costo_receta",
                 "Costo_total_teorico",
                 "Costo_total_objetivo",
-            ]
-        ],
-        use_container_width=True,
-    )
+            ],
+            orden="Costo_total_objetivo",
+            ascendente=False,
+            entrada=(
+                pedido_df,
+                costo_activo,
+                precio_comp,
+                factor_costos,
+                aplicar_merma_a_costos,
+                sucursal_activa,
+                sucursales_mtime,
+                mermas_mtime,
+            ),
+        )
 
-    c1, c2 = st.columns(2)
-    with c1:
-        st.metric("Costo total teórico", f"${total_costo_teo:,.2f} MXN")
-    with c2:
-        if aplicar_merma_a_costos:
-            st.metric("Costo objetivo (con merma)", f"${total_costo_obj:,.2f} MXN")
-        else:
-            st.metric("Costo objetivo (con merma)", "—")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.metric("Costo total teórico", f"${total_costo_teo:,.2f} MXN")
+        with c2:
+            if aplicar_merma_a_costos:
+                st.metric("Costo objetivo (con merma)", f"${total_costo_obj:,.2f} MXN")
+            else:
+                st.metric("Costo objetivo (con merma)", "—")
+
+    with st.expander("💲 Costos por componente y simulación de precios", expanded=False):
+        faltan_precio = missing_prices(bom_flat, precio_comp)
+        if not faltan_precio.empty:
+            st.warning(f"{len(faltan_precio)} insumo(s) sin precio (cuentan como 0).")
+
+        factor_u, unidad_u = UNITS.gather(bom_flat.componentes["Unidad_comp"])
+        usados = np.diff(bom_flat.matriz_t.indptr) > 0
+        precios_tabla = pd.DataFrame({
+            "Componente": bom_flat.componentes["Componente"].to_numpy(),
+            "Nombre_comp": bom_flat.componentes["Nombre_comp"].to_numpy(),
+            "Unidad_final": unidad_u,
+            "Precio_base": precio_comp / factor_u,
+            "Cambio_pct": 0.0,
+        })[usados]
+        st.caption("Precio por unidad final (kg/lt/unidades). Edita **Cambio_pct** para simular.")
+        precios_edit = st.data_editor(
+            precios_tabla,
+            disabled=["Componente", "Nombre_comp", "Unidad_final", "Precio_base"],
+            use_container_width=True,
+            hide_index=True,
+            key="precios_whatif",
+        )
+
+        with prof.stage("4_costos.whatif") as etapa:
+            precio_sim = precio_comp.copy()
+            cambio = pd.to_numeric(precios_edit["Cambio_pct"], errors="coerce").fillna(0.0).to_numpy()
+            precio_sim[np.flatnonzero(usados)] *= 1.0 + cambio / 100.0
+            catalogo_costos = pd.DataFrame({
+                "Producto": bom_flat.productos,
+                "Costo_excel": costo_receta,
+                "Costo_componentes": rollup_costs(bom_flat, precio_comp),
+                "Costo_simulado": rollup_costs(bom_flat, precio_sim),
+            })
+            catalogo_costos["Cambio_pct"] = (
+                catalogo_costos["Costo_simulado"] / catalogo_costos["Costo_componentes"].replace(0, np.nan) - 1
+            ) * 100
+            etapa.rows = len(catalogo_costos)
+
+        st.markdown("##### Costo por unidad de todo el catálogo")
+        render_table(
+            catalogo_costos.merge(productos_df[["Producto", "Nombre_prod"]].drop_duplicates("Producto"), on="Producto", how="left"),
+            "catalogo_costos",
+            orden="Cambio_pct",
+            ascendente=False,
+            top_por="Cambio_pct",
+            entrada=(costo_receta, precio_comp, precio_sim),
+        )
+
+        prod_desglose = st.selectbox(
+            "Desglose por componente de:",
+            pedido_df["Producto"].tolist(),
+            format_func=format_producto,
+        )
+        st.dataframe(cost_breakdown(bom_flat, precio_sim, [prod_desglose]), use_container_width=True, hide_index=True)
 
 # =========================
 # 5) KPI MERMA REAL (requiere consumo real)
@@ -470,8 +1127,11 @@ st.markdown(
 )
 
 with st.expander("📥 Cargar consumo real (CSV) o pegar tabla", expanded=True):
-    st.caption("Estructura mínima: columnas **Componente** y **Cant_real** (numérica).")
-    up = st.file_uploader("Sube CSV de consumo real", type=["csv"])
+    st.caption(
+        "Estructura mínima: columnas **Componente** y **Cant_real** (numérica). "
+        "Archivos grandes (uno por movimiento) se leen por bloques; también acepta .csv.gz."
+    )
+    up = st.file_uploader("Sube CSV de consumo real", type=["csv", "gz"])
 
     if "real_editor_df" not in st.session_state:
         st.session_state.real_editor_df = pd.DataFrame(
@@ -487,9 +1147,22 @@ with st.expander("📥 Cargar consumo real (CSV) o pegar tabla", expanded=True):
 
     real_df = None
     if up is not None:
+        barra = st.progress(0.0, text="Leyendo consumo real…")
+
+        def _avance(fraccion: float, filas: int) -> None:
+            barra.progress(fraccion, text=f"Leyendo consumo real… {filas:,} filas")
+
         try:
-            real_df = pd.read_csv(up)
+            with prof.stage("5_kpi.lectura") as etapa:
+                real_df = read_real_consumption(
+                    up,
+                    progress=_avance,
+                    compression="gzip" if up.name.lower().endswith(".gz") else None,
+                )
+                etapa.rows = len(real_df)
+            barra.empty()
         except Exception as e:
+            barra.empty()
             st.error(f"No pude leer el CSV: {e}")
             real_df = None
     else:
@@ -498,54 +1171,39 @@ with st.expander("📥 Cargar consumo real (CSV) o pegar tabla", expanded=True):
 if real_df is None or real_df.empty:
     st.info("Carga o pega consumo real para calcular el KPI.")
 else:
-    # Normalizar columnas
-    real_df = real_df.rename(columns={c: c.strip() for c in real_df.columns})
-    rename_map = {}
-    for c in real_df.columns:
-        cl = c.strip().lower()
-        if cl in ["cant_real", "cantidad_real", "consumo_real", "real"]:
-            rename_map[c] = "Cant_real"
-        if cl in ["componente", "component", "sku", "insumo"]:
-            rename_map[c] = "Componente"
-    real_df = real_df.rename(columns=rename_map)
-
-    if "Componente" not in real_df.columns or "Cant_real" not in real_df.columns:
-        st.error("El consumo real debe tener columnas: **Componente** y **Cant_real**.")
-        st.stop()
-
-    real_df["Componente"] = real_df["Componente"].astype(str).str.strip()
-    real_df["Cant_real"] = pd.to_numeric(real_df["Cant_real"], errors="coerce").fillna(0.0)
-    real_df = real_df.groupby("Componente", as_index=False)["Cant_real"].sum()
-
-    # Merge KPI con resumen
-    kpi_df = resumen.merge(real_df, on="Componente", how="left")
-    kpi_df["Cant_real"] = kpi_df["Cant_real"].fillna(0.0)
+    try:
+        real_df = aggregate_real(real_df)
+    except ValueError as e:
+        st.error(str(e))
+        stop_rerun()
 
     # ⚠️ NOTA: aquí NO convierto Cant_real automáticamente porque no sabemos si tu real viene en gr/ml o kg/lt.
-    # Si tu real SIEMPRE viene en la misma unidad que Unidad_comp (gr/ml), activa esta conversión:
+    # Si tu real SIEMPRE viene en la misma unidad que Unidad_comp, activa esta conversión:
     convertir_real_mismo_origen = st.checkbox(
-        "Mi consumo real está en la misma unidad original (gr/ml) y quiero convertirlo a kg/lt también",
+        "Mi consumo real está en la misma unidad original (Unidad_comp) y quiero convertirlo a kg/lt también",
         value=False
     )
-    if convertir_real_mismo_origen:
-        unit = kpi_df["Unidad_comp"].astype(str).str.strip().str.lower()
-        factor = np.where(unit.eq("gr"), 1/1000, np.where(unit.eq("ml"), 1/1000, 1.0))
-        kpi_df["Cant_real_final"] = kpi_df["Cant_real"] * factor
-    else:
-        kpi_df["Cant_real_final"] = kpi_df["Cant_real"]
 
     # KPI (si convertiste, compáralo en la misma base final)
-    denom = kpi_df["Cant_total_teorico_final"].replace(0, np.nan)
-    kpi_df["Merma_real_pct"] = (kpi_df["Cant_real_final"] - kpi_df["Cant_total_teorico_final"]) / denom
-    kpi_df["Gap_vs_teorico"] = kpi_df["Cant_real_final"] - kpi_df["Cant_total_teorico_final"]
-    kpi_df["Gap_vs_objetivo"] = kpi_df["Cant_real_final"] - kpi_df["Cant_total_objetivo_final"]
-
-    total_teo = float(kpi_df["Cant_total_teorico_final"].sum())
-    total_real = float(kpi_df["Cant_real_final"].sum())
-    total_obj = float(kpi_df["Cant_total_objetivo_final"].sum())
-
-    merma_global = (total_real - total_teo) / (total_teo if total_teo != 0 else np.nan)
-    gap_global_obj = total_real - total_obj
+    with prof.stage("5_kpi.calc") as etapa:
+        kpi_df = merma_kpi(resumen, real_df, convertir_real_mismo_origen)
+        totales = kpi_totals(kpi_df)
+        etapa.rows = len(kpi_df)
+    with prof.stage("5_kpi.anomalias") as etapa:
+        sucursal_defecto = sucursal_activa if sucursal_activa != BASE else "General"
+        sucursal_hist = str(st.session_state.get("kpi_sucursal", sucursal_defecto)).strip() or "General"
+        version_hist = kpi_store.stamp()
+        # Las columnas de score dependen del histórico: va en la llave de ambas tablas
+        entrada_kpi = (*entrada_resumen, real_df, convertir_real_mismo_origen, version_hist, sucursal_hist)
+        kpi_df = score_kpi(
+            kpi_df,
+            load_merma_stats(version_hist, sucursal_hist, kpi_store),
+            en_real=kpi_df["Componente"].isin(real_df["Componente"]).to_numpy(),
+        )
+        conteo_diag = diagnosis_counts(kpi_df)
+        etapa.rows = len(kpi_df)
+    merma_global = totales["merma_global"]
+    gap_global_obj = totales["gap_global_obj"]
 
     m1, m2, m3 = st.columns(3)
     with m1:
@@ -556,6 +1214,7 @@ else:
         st.metric("Merma objetivo", f"{(merma_obj*100):.2f}%")
 
     st.markdown("#### 📌 KPI por componente (en kg/lt si aplica)")
+    st.caption(f"Calculado con BOM {snap.label}")
     show_cols = [
         "Componente",
         "Nombre_comp",
@@ -566,38 +1225,215 @@ else:
         "Merma_real_pct",
         "Gap_vs_teorico",
         "Gap_vs_objetivo",
+        "Score_anomalia",
+        "Diagnostico",
     ]
-    st.dataframe(kpi_df[show_cols].sort_values("Merma_real_pct", ascending=False), use_container_width=True)
+    with prof.stage("5_kpi.render"):
+        render_table(
+            kpi_df,
+            "kpi",
+            columnas=show_cols,
+            orden="Merma_real_pct",
+            ascendente=False,
+            top_por="Gap_vs_objetivo",
+            entrada=entrada_kpi,
+        )
 
-    st.download_button(
-        "Descargar KPI (CSV)",
-        data=kpi_df[show_cols].to_csv(index=False).encode("utf-8-sig"),
-        file_name="kpi_merma_real.csv",
-        mime="text/csv",
+        st.download_button(
+            "Descargar KPI (CSV)",
+            data=export_cache.deferred("csv", lambda df=kpi_df[show_cols]: {"kpi": df}),
+            file_name="kpi_merma_real.csv",
+            mime="text/csv",
+        )
+
+    st.markdown("#### 🚨 Anomalías")
+    st.caption(
+        "z robusto (mediana/MAD) de la merma de cada componente contra su historia en la sucursal "
+        f"(**{sucursal_hist}**; o todas si tiene pocos días) o, sin historia, contra los demás componentes. "
+        "Los diagnósticos de captura (faltante, unidad ×1000, negativo, desviación desproporcionada) "
+        "se separan de la merma o sobrante atípicos."
     )
+    a_cols = st.columns(4)
+    for col, (etiqueta, diags) in zip(a_cols, [
+        ("Faltan en consumo real", DIAGNOSTICOS[:1]),
+        ("Posibles errores de captura", DIAGNOSTICOS[1:5]),
+        ("Merma atípica", DIAGNOSTICOS[5:6]),
+        ("Sobrante atípico", DIAGNOSTICOS[6:7]),
+    ]):
+        with col:
+            st.metric(etiqueta, f"{sum(conteo_diag[d] for d in diags):,}")
+    anomalias = kpi_df[kpi_df["Diagnostico"] != DIAGNOSTICOS[-1]]
+    if anomalias.empty:
+        st.caption("Sin anomalías en este cálculo.")
+    else:
+        render_table(
+            anomalias,
+            "kpi_anomalias",
+            columnas=[*show_cols[:3], "Cant_total_teorico_final", "Cant_real_final", "Merma_real_pct",
+                      "Z_historia", "Z_pares", "Score_anomalia", "Diagnostico"],
+            orden="Diagnostico",
+            top_por="Score_anomalia",
+            entrada=entrada_kpi,
+        )
+
+    st.markdown("#### 💾 Guardar en el histórico")
+    h1, h2, h3 = st.columns([1, 1, 1])
+    with h1:
+        fecha_kpi = st.date_input("Fecha del consumo", key="kpi_fecha")
+    with h2:
+        sucursal_kpi = st.text_input(
+            "Sucursal", value=sucursal_activa if sucursal_activa != BASE else "General", key="kpi_sucursal"
+        )
+    with h3:
+        st.write("")
+        if st.button("Guardar KPI en histórico"):
+            with prof.stage("5_kpi.guardar") as etapa:
+                etapa.rows = kpi_store.save(kpi_records(kpi_df, fecha_kpi, sucursal_kpi, snap.tag))
+            st.success(f"KPI guardado ({fecha_kpi:%Y-%m-%d}, {sucursal_kpi.strip() or 'General'}).")
+
+# Tendencia desde los rollups (no re-escanea el histórico crudo)
+with st.expander("📈 Tendencia de merma (histórico)", expanded=False):
+    sucursales = kpi_store.branches()
+    if not sucursales:
+        st.caption("Aún no hay KPI guardados. Usa **Guardar KPI en histórico** después de calcular el KPI.")
+    else:
+        t1, t2, t3 = st.columns(3)
+        with t1:
+            grano = st.selectbox(
+                "Periodo",
+                GRAINS,
+                index=1,
+                format_func={"dia": "Diario", "semana": "Semanal", "mes": "Mensual"}.get,
+            )
+        with t2:
+            sucursal_sel = st.selectbox("Sucursal", ["Todas"] + sucursales)
+        with t3:
+            componente_sel = st.text_input("Componente (opcional)", value="")
+
+        with prof.stage("5_kpi.tendencia") as etapa:
+            serie = kpi_store.trend(
+                grano,
+                sucursal=None if sucursal_sel == "Todas" else sucursal_sel,
+                componente=componente_sel.strip() or None,
+            )
+            etapa.rows = len(serie)
+
+        if serie.empty:
+            st.info("Sin datos para ese filtro.")
+        else:
+            largo = serie.melt(
+                id_vars="periodo",
+                value_vars=["Merma_real_pct", "Merma_objetivo_pct"],
+                var_name="Serie",
+                value_name="Merma",
+            )
+            largo["Serie"] = largo["Serie"].map({"Merma_real_pct": "Real", "Merma_objetivo_pct": "Objetivo"})
+            chart = (
+                alt.Chart(largo)
+                .mark_line(point=True)
+                .encode(
+                    x=alt.X("periodo:T", title="Periodo"),
+                    y=alt.Y("Merma:Q", title="Merma vs teórico", axis=alt.Axis(format="%")),
+                    color=alt.Color("Serie:N", title=None),
+                    tooltip=[
+                        alt.Tooltip("periodo:T", title="Periodo"),
+                        "Serie:N",
+                        alt.Tooltip("Merma:Q", format=".2%"),
+                    ],
+                )
+                .properties(height=320)
+            )
+            st.altair_chart(chart, use_container_width=True)
+
+        st.markdown("##### 🚨 Días atípicos en el histórico")
+        with prof.stage("5_kpi.anomalias_hist") as etapa:
+            atipicos = load_history_anomalies(kpi_store.stamp(), kpi_store)
+            if sucursal_sel != "Todas":
+                atipicos = atipicos[atipicos["sucursal"] == sucursal_sel]
+            if componente_sel.strip():
+                atipicos = atipicos[atipicos["Componente"] == componente_sel.strip()]
+            etapa.rows = len(atipicos)
+        if atipicos.empty:
+            st.caption("Sin días atípicos para ese filtro.")
+        else:
+            render_table(
+                atipicos,
+                "hist_anomalias",
+                columnas=["periodo", "sucursal", "Componente", "Unidad_final", "teorico", "real",
+                          "Merma_real_pct", "Z_historia", "Z_pares", "Diagnostico"],
+                orden="periodo",
+                ascendente=False,
+                top_por="Z_historia",
+                entrada=(kpi_store.stamp(), sucursal_sel, componente_sel.strip()),
+            )
 
 # =========================
 # 6) DESCARGAS ORIGINALES
 # =========================
 st.subheader("6️⃣ Descargar resultados")
 
-tab1, tab2 = st.tabs(["Insumos (Teórico/Objetivo)", "Detalle BOM × pedido"])
+# Las descargas se arman al hacer clic (en otro hilo) y se cachean por hash del contenido.
+# Se atan a la versión del BOM de este rerun, aunque al hacer clic ya haya otra.
+# Con reglas de merma, el detalle lleva el factor de cada arista producto × componente
+def detalle_frame(
+    pedido=pedido_df,
+    factor=reglas_merma.entry_factors(snap.bom.matriz, merma_obj, merma_comp_suc) if usa_reglas else factor_merma,
+    version=snap,
+) -> pd.DataFrame:
+    detalle = explode_detail(version.bom, pedido, factor)
+    return detalle.merge(version.productos[["Producto", "Nombre_prod"]], on="Producto", how="left")
+
+
+def libro_frames(
+    pedido=pedido_df,
+    insumos=resumen,
+    costos=costo_df,
+    kpi=kpi_df,
+    version=snap,
+) -> dict:
+    return {
+        "pedido": pedido.merge(version.productos, on="Producto", how="left"),
+        "insumos": insumos,
+        "costos": costos,
+        "kpi": kpi,
+        "detalle": detalle_frame(),
+        "bom": version.info_frame(),
+    }
+
+
+tab1, tab2, tab3 = st.tabs(["Insumos (Teórico/Objetivo)", "Detalle BOM × pedido", "Libro completo"])
 
-with tab1:
+with tab1, prof.stage("6_descargas.insumos"):
     st.download_button(
         label="⬇️ Descargar insumos (CSV)",
-        data=resumen.to_csv(index=False).encode("utf-8-sig"),
+        data=export_cache.deferred("csv", lambda df=resumen: {"insumos": df}),
         file_name="insumos_pedido.csv",
         mime="text/csv",
     )
 
-with tab2:
-    detalle_export = detalle.merge(productos_df[["Producto", "Nombre_prod"]], on="Producto", how="left")
+with tab2, prof.stage("6_descargas.detalle"):
     st.download_button(
         label="⬇️ Descargar detalle BOM × pedido (CSV)",
-        data=detalle_export.to_csv(index=False).encode("utf-8-sig"),
+        data=export_cache.deferred("csv", lambda: {"detalle": detalle_frame()}),
         file_name="detalle_bom_pedido.csv",
         mime="text/csv",
     )
 
-st.success("Listo. Totales convertidos a kg/lt cuando Unidad_comp es gr/ml.")
+with tab3, prof.stage("6_descargas.libro"):
+    st.caption("Hojas: pedido, insumos, costos, KPI (si hay consumo real), detalle y versión del BOM.")
+    formato = st.radio(
+        "Formato",
+        ["xlsx", "parquet", "csv.gz"],
+        horizontal=True,
+        format_func={"xlsx": "Excel (XLSX)", "parquet": "Parquet (.zip)", "csv.gz": "CSV.gz (.zip)"}.get,
+    )
+    st.download_button(
+        label=f"⬇️ Descargar libro completo ({FORMATS[formato][0]})",
+        data=export_cache.deferred(formato, libro_frames),
+        file_name=file_name("calculadora_insumos", formato),
+        mime=mime_type(formato),
+    )
+
+st.success("Listo. Totales convertidos a kg/lt según el registro de unidades (gr, ml, oz, lb, cucharada, …).")
+
+render_diagnostics()
@@ -0,0 +1,131 @@
+"""
+Benchmarks por etapa: carga, explosión, conversión de unidades, costo y KPI.
+
+Requiere pytest-benchmark. Uso (desde la raíz del repo):
+    python -m pytest benchmarks/ --benchmark-autosave          # guarda JSON en benchmarks/baseline/
+    python -m pytest benchmarks/ --benchmark-compare --benchmark-compare-fail=median:25%
+    BENCH_TIERS=chico,mediano,grande python -m pytest benchmarks/
+"""
+import numpy as np
+import pandas as pd
+
+from calculadora.core import (
+    aggregate_real,
+    convert_to_base_units,
+    merma_kpi,
+    order_costs,
+    products_table,
+    requirements,
+)
+from calculadora.anomaly import score_kpi
+from calculadora.branches import compile_branches, explode_branches, read_overrides
+from calculadora.compact import compact_bom
+from calculadora.forecast import fit_forecast, project_requirements
+from calculadora.loader import load_bom_cached, read_bom_excel
+from calculadora.matrix import build_bom_matrix, explode, explode_merge
+from calculadora.mermas import compile_rules, read_rules
+from calculadora.multilevel import flatten_bom, product_yields
+from calculadora.production import production_mix, stock_groups
+from calculadora.views import ViewSpec, row_positions
+from synthetic import synthetic_merma_rules, synthetic_overrides, synthetic_real, synthetic_sales_matrix
+
+FACTOR = 1.10
+
+
+def test_load_excel(benchmark, workbook):
+    benchmark.pedantic(read_bom_excel, args=(workbook,), rounds=3, iterations=1)
+
+
+def test_load_cache(benchmark, workbook, tmp_path):
+    load_bom_cached(workbook, tmp_path)  # calienta la caché
+    benchmark(load_bom_cached, workbook, tmp_path)
+
+
+def test_compact_bom(benchmark, bom_df):
+    benchmark(compact_bom, bom_df)
+
+
+def test_build_matrix(benchmark, bom_df):
+    benchmark(build_bom_matrix, bom_df)
+
+
+def test_explode_matrix(benchmark, bom, pedido_df):
+    benchmark(explode, bom, pedido_df, FACTOR)
+
+
+def test_explode_merge(benchmark, bom_df, pedido_df):
+    benchmark(explode_merge, bom_df, pedido_df, FACTOR)
+
+
+def test_convert_to_base_units(benchmark, bom, pedido_df):
+    resumen = explode(bom, pedido_df, FACTOR)
+    benchmark(convert_to_base_units, resumen)
+
+
+def test_cost_merge(benchmark, bom_df, pedido_df):
+    productos_df = products_table(bom_df)
+    benchmark(order_costs, pedido_df, productos_df, FACTOR, True)
+
+
+def test_kpi_merge(benchmark, bom, pedido_df):
+    resumen = requirements(bom, pedido_df, FACTOR)
+    real_df = aggregate_real(synthetic_real(resumen))
+    benchmark(merma_kpi, resumen, real_df, False)
+
+
+def test_production_mix(benchmark, bom):
+    rng = np.random.default_rng(0)
+    stock = rng.uniform(0, 20, len(stock_groups(bom)[1]))
+    margen = rng.uniform(5, 50, bom.shape[0])
+    benchmark.pedantic(production_mix, args=(bom, stock, margen), rounds=3, iterations=1)
+
+
+def test_view_rows(benchmark, bom, pedido_df):
+    """Filtro + top-N + orden de la vista paginada del KPI (sin caché)."""
+    resumen = requirements(bom, pedido_df, FACTOR)
+    kpi_df = merma_kpi(resumen, aggregate_real(synthetic_real(resumen)), False)
+    spec = ViewSpec(filtro="a", top_n=100, top_por="Gap_vs_objetivo", orden="Merma_real_pct", ascendente=False)
+    benchmark(row_positions, kpi_df, spec)
+
+
+def test_anomaly_score(benchmark, bom, pedido_df):
+    """z robusto vs pares + diagnóstico sobre el KPI (corre en cada cálculo del KPI)."""
+    resumen = requirements(bom, pedido_df, FACTOR)
+    kpi_df = merma_kpi(resumen, aggregate_real(synthetic_real(resumen)), False)
+    benchmark(score_kpi, kpi_df)
+
+
+def test_forecast_fit(benchmark, bom):
+    """Pronóstico automático (validación + reajuste) de todo el catálogo, un año de historia."""
+    Y = synthetic_sales_matrix(len(bom.productos))
+    fechas = pd.date_range("2025-01-01", periods=Y.shape[0], freq="D")
+    benchmark.pedantic(fit_forecast, args=(fechas, bom.productos, Y, 28), rounds=3, iterations=1)
+
+
+def test_forecast_projection(benchmark, bom):
+    Y = synthetic_sales_matrix(len(bom.productos))
+    fechas = pd.date_range("2025-01-01", periods=Y.shape[0], freq="D")
+    pronostico = fit_forecast(fechas, bom.productos, Y, 28, "naive_estacional")
+    benchmark(project_requirements, bom, pronostico, FACTOR)
+
+
+def test_branch_explode(benchmark, bom, bom_df, pedido_df, tmp_path):
+    """Plan de 20 sucursales con ajustes propios, explotado en una pasada."""
+    rendimientos = product_yields(bom, bom_df[["Producto", "Cantidad_prod", "Unidad_prod"]])
+    archivo = tmp_path / "sucursales.csv"
+    synthetic_overrides(bom).to_csv(archivo, index=False)
+    modelo = compile_branches(bom, flatten_bom(bom, rendimientos), rendimientos, read_overrides(archivo))
+    plan = pd.concat(
+        [pedido_df.rename(columns={"Cantidad_pedida": "Cantidad"}).assign(Sucursal=s) for s in modelo.sucursales],
+        ignore_index=True,
+    )
+    benchmark(explode_branches, bom, modelo, plan, FACTOR - 1.0)
+
+
+def test_merma_rules(benchmark, bom, pedido_df, tmp_path):
+    """Factor por componente con reglas de todos los niveles (incluidas las de producto)."""
+    archivo = tmp_path / "mermas.csv"
+    synthetic_merma_rules(bom).to_csv(archivo, index=False)
+    reglas = compile_rules(bom, read_rules(archivo))
+    q = bom.order_vector(pedido_df)
+    benchmark(reglas.factor, bom.matriz_t @ q, q, [bom.matriz], FACTOR - 1.0)
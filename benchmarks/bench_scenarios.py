@@ -0,0 +1,67 @@
+"""
+Benchmark del corredor de escenarios: serie vs ProcessPoolExecutor.
+
+Genera pedidos sintéticos (sucursales × días) sobre el BOM real y mide
+run_scenarios con distintos números de workers.
+
+Uso:
+    python benchmarks/bench_scenarios.py [--sucursales 20] [--dias 90] [--lineas 40] [--workers 1 2 4] [--detalle]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from calculadora.core import products_table, recipe_cost_vector  # noqa: E402
+from calculadora.loader import load_bom_cached  # noqa: E402
+from calculadora.matrix import build_bom_matrix  # noqa: E402
+from calculadora.scenarios import run_scenarios  # noqa: E402
+
+
+def synthetic_plans(productos, sucursales: int, dias: int, lineas: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = sucursales * dias * lineas
+    return pd.DataFrame({
+        "sucursal": np.repeat([f"S{i:03d}" for i in range(sucursales)], dias * lineas),
+        "dia": np.tile(np.repeat(pd.date_range("2026-01-01", periods=dias).strftime("%Y-%m-%d"), lineas), sucursales),
+        "Producto": rng.choice(np.asarray(productos), n),
+        "Cantidad": rng.integers(1, 50, n),
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bom", type=Path, default=Path("data") / "bom_recetas.xlsx")
+    parser.add_argument("--sucursales", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--lineas", type=int, default=40)
+    parser.add_argument("--bloques", type=int, default=None, help="Tareas (default: 4 por worker)")
+    parser.add_argument("--detalle", action="store_true", help="Incluir el requerimiento por plan")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    bom_df = load_bom_cached(args.bom)
+    bom = build_bom_matrix(bom_df)
+    costo = recipe_cost_vector(bom, products_table(bom_df))
+    pedidos = synthetic_plans(bom.productos, args.sucursales, args.dias, args.lineas)
+    mermas = {"0%": 1.0, "5%": 1.05, "10%": 1.10}
+
+    print(f"{args.sucursales * args.dias:,} planes, {len(pedidos):,} líneas, {len(mermas)} escenarios de merma, "
+          f"{os.cpu_count()} CPU")
+    base = None
+    for w in args.workers:
+        t0 = time.perf_counter()
+        run_scenarios(bom, costo, pedidos, mermas, workers=w, bloques=args.bloques, detalle=args.detalle)
+        t = time.perf_counter() - t0
+        base = base or t
+        print(f"  workers={w:<3d} {t * 1000:9.1f} ms   aceleración {base / t:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
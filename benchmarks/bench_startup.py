@@ -0,0 +1,52 @@
+"""
+Benchmark de arranque en frío: parsear el Excel vs leer la caché binaria.
+
+Uso:
+    python benchmarks/bench_startup.py [--path data/bom_recetas.xlsx] [--repeat 5]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from calculadora.loader import load_bom_cached, read_bom_excel  # noqa: E402
+
+
+def _best_of(fn, repeat: int) -> float:
+    tiempos = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return min(tiempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", type=Path, default=Path("data") / "bom_recetas.xlsx")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp)
+
+        t_excel = _best_of(lambda: read_bom_excel(args.path), args.repeat)
+
+        t0 = time.perf_counter()
+        df = load_bom_cached(args.path, cache_dir)
+        t_primera = time.perf_counter() - t0
+
+        t_cache = _best_of(lambda: load_bom_cached(args.path, cache_dir), args.repeat)
+
+    print(f"BOM: {args.path} ({len(df):,} filas)")
+    print(f"  Excel (openpyxl)          : {t_excel * 1000:9.1f} ms")
+    print(f"  Primera carga + escritura : {t_primera * 1000:9.1f} ms")
+    print(f"  Caché Arrow (memory-map)  : {t_cache * 1000:9.1f} ms")
+    print(f"  Aceleración               : {t_excel / t_cache:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
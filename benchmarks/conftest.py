@@ -0,0 +1,61 @@
+"""
+Fixtures de la suite de benchmarks (pytest-benchmark).
+
+Niveles de tamaño (productos en el catálogo), seleccionables con
+BENCH_TIERS=chico,mediano,grande. Los workbooks sintéticos se generan una
+vez por sesión en un directorio temporal.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+TIERS = {
+    "chico": 300,
+    "mediano": 3_000,
+    "grande": 30_000,
+}
+ORDER_LINES = 200
+
+
+def _selected_tiers() -> list:
+    raw = os.environ.get("BENCH_TIERS", "chico,mediano")
+    return [t.strip() for t in raw.split(",") if t.strip() in TIERS]
+
+
+@pytest.fixture(scope="session", params=_selected_tiers())
+def tier(request) -> str:
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def workbook(tier, tmp_path_factory) -> Path:
+    from synthetic import write_synthetic_workbook
+
+    path = tmp_path_factory.mktemp(f"bom_{tier}") / "bom_recetas.xlsx"
+    return write_synthetic_workbook(path, n_productos=TIERS[tier])
+
+
+@pytest.fixture(scope="session")
+def bom_df(workbook):
+    from calculadora.loader import read_bom_excel
+
+    return read_bom_excel(workbook)
+
+
+@pytest.fixture(scope="session")
+def bom(bom_df):
+    from calculadora.matrix import build_bom_matrix
+
+    return build_bom_matrix(bom_df)
+
+
+@pytest.fixture(scope="session")
+def pedido_df(bom):
+    from synthetic import synthetic_order
+
+    return synthetic_order(bom.productos, ORDER_LINES)
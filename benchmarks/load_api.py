@@ -0,0 +1,160 @@
+"""
+Prueba de carga de la API local (calculadora.api): latencia p50/p99 y throughput.
+
+Cada hilo mantiene una conexión HTTP keep-alive (http.client) y manda
+peticiones seguidas; con --modo batch cada petición lleva --pedidos pedidos
+y la respuesta NDJSON se lee completa antes de medir.
+
+Uso:
+    python -m calculadora.api --port 8000 &
+    python benchmarks/load_api.py [--modo single|batch] [--conexiones 4] [--peticiones 200]
+
+    # o levantando el servidor desde el script:
+    python benchmarks/load_api.py --spawn
+"""
+import argparse
+import http.client
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from calculadora.core import products_table  # noqa: E402
+from calculadora.loader import load_bom_cached  # noqa: E402
+
+
+def _order_lines(rng, productos, n_lineas: int) -> list:
+    elegidos = rng.choice(productos, size=min(n_lineas, len(productos)), replace=False)
+    return [{"Producto": str(p), "Cantidad": int(rng.integers(1, 20))} for p in elegidos]
+
+
+def build_payloads(productos, modo: str, n: int, pedidos: int, lineas: int, merma: str, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for i in range(n):
+        if modo == "single":
+            body = {"lineas": _order_lines(rng, productos, lineas), "merma": merma}
+        else:
+            body = {
+                "pedidos": [
+                    {"order_id": f"{i}-{k}", "lineas": _order_lines(rng, productos, lineas)}
+                    for k in range(pedidos)
+                ],
+                "merma": merma,
+            }
+        payloads.append(json.dumps(body).encode())
+    return payloads
+
+
+def _worker(host, port, path, payloads, latencias, errores):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    headers = {"Content-Type": "application/json"}
+    for body in payloads:
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status != 200:
+                errores.append(resp.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errores.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=60)
+            continue
+        latencias.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def wait_ready(host: str, port: int, timeout: float = 60.0) -> dict:
+    limite = time.monotonic() + timeout
+    while True:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            conn.request("GET", "/health")
+            resp = conn.getresponse()
+            if resp.status == 200:
+                return json.loads(resp.read())
+        except OSError:
+            if time.monotonic() > limite:
+                raise
+        time.sleep(0.2)
+
+
+def run_load(url: str, payloads: list, path: str, conexiones: int) -> dict:
+    u = urlsplit(url)
+    latencias, errores = [], []
+    partes = [payloads[i::conexiones] for i in range(conexiones)]
+    hilos = [
+        threading.Thread(target=_worker, args=(u.hostname, u.port or 80, path, p, latencias, errores))
+        for p in partes
+    ]
+    t0 = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - t0
+
+    lat = np.array(latencias) * 1000
+    return {
+        "ok": len(latencias),
+        "errores": len(errores),
+        "segundos": total,
+        "req_s": len(latencias) / total if total else float("nan"),
+        "p50_ms": float(np.percentile(lat, 50)) if lat.size else float("nan"),
+        "p99_ms": float(np.percentile(lat, 99)) if lat.size else float("nan"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--bom", type=Path, default=Path("data") / "bom_recetas.xlsx")
+    parser.add_argument("--modo", choices=["single", "batch"], default="single")
+    parser.add_argument("--conexiones", type=int, default=4)
+    parser.add_argument("--peticiones", type=int, default=400, help="Total de peticiones")
+    parser.add_argument("--pedidos", type=int, default=100, help="Pedidos por petición (modo batch)")
+    parser.add_argument("--lineas", type=int, default=5, help="Líneas por pedido")
+    parser.add_argument("--merma", default="5%")
+    parser.add_argument("--spawn", action="store_true", help="Levantar el servidor en un subproceso")
+    args = parser.parse_args()
+
+    u = urlsplit(args.url)
+    servidor = None
+    if args.spawn:
+        servidor = subprocess.Popen([
+            sys.executable, "-m", "calculadora.api",
+            "--bom", str(args.bom), "--host", u.hostname, "--port", str(u.port or 80),
+        ])
+    try:
+        info = wait_ready(u.hostname, u.port or 80)
+        productos = products_table(load_bom_cached(args.bom))["Producto"].to_numpy()
+        payloads = build_payloads(productos, args.modo, args.peticiones, args.pedidos, args.lineas, args.merma)
+        path = "/v1/explode" if args.modo == "single" else "/v1/explode/batch"
+
+        # Calentamiento: una petición por conexión fuera de la medición
+        run_load(args.url, payloads[:args.conexiones], path, args.conexiones)
+        r = run_load(args.url, payloads, path, args.conexiones)
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+    pedidos = r["ok"] * (args.pedidos if args.modo == "batch" else 1)
+    print(f"BOM: {info['productos']} productos × {info['componentes']} componentes")
+    print(f"Modo {args.modo}: {args.conexiones} conexiones, {r['ok']} ok, {r['errores']} errores en {r['segundos']:.2f} s")
+    print(f"  p50 {r['p50_ms']:.1f} ms | p99 {r['p99_ms']:.1f} ms")
+    print(f"  {r['req_s']:.1f} req/s | {pedidos / r['segundos']:.0f} pedidos/s")
+
+
+if __name__ == "__main__":
+    main()
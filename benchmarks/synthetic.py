@@ -0,0 +1,125 @@
+"""
+Generador de BOM sintéticos con el mismo layout que data/bom_recetas.xlsx.
+
+Cada producto ocupa un renglón de cabecera (Producto … PU + primer
+componente) seguido de renglones de componente con la cabecera vacía.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculadora.loader import EXPECTED_COLS
+
+UNIDADES = np.array(["gr", "ml", "Unidades"])
+
+
+def synthetic_bom_frame(
+    n_productos: int,
+    comps_por_producto: int = 6,
+    n_componentes: int = None,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    DataFrame "crudo" (antes de read_bom_excel) con n_productos recetas.
+    """
+    rng = np.random.default_rng(seed)
+    n_componentes = n_componentes or max(50, n_productos // 2)
+
+    largo = rng.integers(max(1, comps_por_producto - 3), comps_por_producto + 4, n_productos)
+    n = int(largo.sum())
+    producto = np.repeat(np.arange(n_productos), largo)
+    es_cabecera = np.r_[True, producto[1:] != producto[:-1]]
+
+    comp = rng.integers(0, n_componentes, n)
+    unidad_comp = UNIDADES[comp % len(UNIDADES)]
+    cantidad = np.where(unidad_comp == "Unidades", rng.integers(1, 3, n), rng.integers(5, 250, n))
+
+    codigos = np.char.add("P-", np.arange(n_productos).astype(str))
+    df = pd.DataFrame({
+        "Producto": np.where(es_cabecera, codigos[producto], None),
+        "Nombre_prod": np.where(es_cabecera, np.char.add("Producto ", np.arange(n_productos).astype(str))[producto], None),
+        "Cantidad_prod": np.where(es_cabecera, 1.0, 0.0),
+        "Unidad_prod": np.where(es_cabecera, "Unidad", None),
+        "Referencia": np.nan,
+        "Tipo_BOM": np.where(es_cabecera, "Fabricación", None),
+        "Costo_receta": np.where(es_cabecera, rng.uniform(10, 90, n).round(2), 0.0),
+        "PU": rng.uniform(0.1, 40, n).round(4),
+        "Componente": np.char.add("C-", comp.astype(str)),
+        "Nombre_comp": np.char.add("Insumo ", comp.astype(str)),
+        "Cantidad_comp": cantidad,
+        "Unidad_comp": unidad_comp,
+    }, columns=EXPECTED_COLS)
+    return df
+
+
+def write_synthetic_workbook(path: Path, **kwargs) -> Path:
+    """Escribe el BOM sintético como xlsx (openpyxl)."""
+    synthetic_bom_frame(**kwargs).to_excel(path, index=False, engine="openpyxl")
+    return path
+
+
+def synthetic_order(productos, n_lineas: int, seed: int = 0) -> pd.DataFrame:
+    """pedido_df (Producto, Cantidad_pedida) con n_lineas productos distintos."""
+    rng = np.random.default_rng(seed)
+    prods = rng.choice(np.asarray(productos), size=min(n_lineas, len(productos)), replace=False)
+    return pd.DataFrame({"Producto": prods, "Cantidad_pedida": rng.integers(1, 100, len(prods))})
+
+
+def synthetic_real(resumen: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Consumo real (Componente, Cant_real) alrededor del teórico, con ±15% de ruido."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Componente": resumen["Componente"].to_numpy(),
+        "Cant_real": resumen["Cant_total_comp_teorico"].to_numpy() * rng.uniform(0.85, 1.15, len(resumen)),
+    })
+
+
+def synthetic_sales_matrix(n_productos: int, n_dias: int = 365, seed: int = 0) -> np.ndarray:
+    """Venta diaria (días × productos) Poisson con estacionalidad semanal."""
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 5.0, n_productos)
+    semana = 1.0 + 0.3 * np.sin(2 * np.pi * np.arange(n_dias) / 7)
+    return rng.poisson(base[None, :] * semana[:, None]).astype(np.float64)
+
+
+def synthetic_overrides(bom, n_sucursales: int = 20, n_cambios: int = 50, seed: int = 0) -> pd.DataFrame:
+    """
+    Ajustes por sucursal (formato de data/sucursales.csv): n_cambios
+    coeficientes cambiados por sucursal más una merma propia.
+    """
+    rng = np.random.default_rng(seed)
+    filas, cols = bom.matriz.nonzero()
+    filas_out = []
+    for k in range(n_sucursales):
+        sel = rng.choice(len(filas), size=min(n_cambios, len(filas)), replace=False)
+        filas_out.append(pd.DataFrame({
+            "Sucursal": f"S{k:03d}",
+            "Producto": bom.productos[filas[sel]],
+            "Componente": bom.componentes["Componente"].to_numpy()[cols[sel]],
+            "Cantidad_comp": rng.uniform(0.5, 2.0, len(sel)).round(3),
+        }))
+        filas_out.append(pd.DataFrame({"Sucursal": [f"S{k:03d}"], "Merma": [f"{rng.integers(1, 10)}%"]}))
+    return pd.concat(filas_out, ignore_index=True)
+
+
+def synthetic_merma_rules(bom, n_reglas: int = 200, seed: int = 0) -> pd.DataFrame:
+    """
+    Reglas de merma (formato de data/mermas.csv): una por categoría y
+    n_reglas de cada nivel por componente, producto y producto + componente.
+    """
+    rng = np.random.default_rng(seed)
+    codigos = bom.componentes["Componente"].astype(str).to_numpy()
+    categorias = pd.unique(pd.Series(codigos).str.split("-", n=1).str[0])
+    filas, cols = bom.matriz.nonzero()
+    pares = rng.choice(len(filas), size=min(n_reglas, len(filas)), replace=False)
+
+    def _merma(n: int) -> list:
+        return [f"{v}%" for v in rng.integers(0, 30, n)]
+
+    return pd.concat([
+        pd.DataFrame({"Categoria": categorias, "Merma": _merma(len(categorias))}),
+        pd.DataFrame({"Componente": rng.choice(codigos, n_reglas), "Merma": _merma(n_reglas)}),
+        pd.DataFrame({"Producto": rng.choice(bom.productos, n_reglas), "Merma": _merma(n_reglas)}),
+        pd.DataFrame({"Producto": bom.productos[filas[pares]], "Componente": codigos[cols[pares]], "Merma": _merma(len(pares))}),
+    ], ignore_index=True).reindex(columns=["Producto", "Categoria", "Componente", "Merma"])
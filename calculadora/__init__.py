@@ -0,0 +1,6 @@
+"""
+Motor de cálculo de la Calculadora de Insumos (BOM).
+
+Los módulos de este paquete no dependen de Streamlit, de modo que pueden
+usarse desde app.py, scripts y benchmarks.
+"""
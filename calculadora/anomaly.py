@@ -0,0 +1,179 @@
+"""
+Detección de anomalías en la merma real por componente.
+
+Ordenar por Merma_real_pct mezcla merma genuina con errores de captura: un
+Cant_real tecleado en gr en vez de kg, o un componente que no vino en el
+consumo real (merma_kpi lo rellena con 0 → −100%). Aquí cada componente se
+compara contra:
+  - su propia historia (rollup diario del KpiStore, por sucursal y, si hay
+    pocos días, de todas las sucursales), y
+  - sus pares del mismo cálculo (los demás componentes),
+con z-scores robustos  z = 0.6745 · (x − mediana) / MAD.  Mediana y MAD se
+calculan agrupadas de una vez (groupby de pandas), sin ciclos por componente.
+Reglas explícitas separan lo que parece error de captura de la pérdida real.
+"""
+import numpy as np
+import pandas as pd
+
+Z_ALERTA = 3.5
+# Real / teórico fuera de [1/3, 3] en un renglón atípico: demasiado para ser merma
+RATIO_CAPTURA = 3.0
+MIN_HISTORIA = 5
+# MAD mínima (proporción): evita z infinitos con historias casi constantes
+MAD_MIN = 0.01
+K_MAD = 0.6745
+# Real / teórico cerca de 1000 o 1/1000: unidad equivocada (gr↔kg, ml↔lt)
+FACTOR_UNIDAD = 1000.0
+TOL_UNIDAD = 0.35  # en log10
+
+HIST_KEYS = ["Componente", "Unidad_final"]
+DIAGNOSTICOS = (
+    "Falta en consumo real",
+    "Real negativo",
+    "Posible unidad equivocada (×1000)",
+    "Posible unidad equivocada (÷1000)",
+    "Posible error de captura",
+    "Merma atípica",
+    "Sobrante atípico",
+    "Normal",
+)
+
+
+def merma_pct(teorico: np.ndarray, real: np.ndarray) -> np.ndarray:
+    """(real − teórico) / teórico; NaN donde el teórico es 0."""
+    teorico = np.asarray(teorico, dtype=np.float64)
+    real = np.asarray(real, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(teorico > 0, (real - teorico) / teorico, np.nan)
+
+
+def robust_z(valores, grupos=None) -> np.ndarray:
+    """
+    z robusto por grupo (una sola pasada de groupby; grupos es una lista de
+    llaves del mismo largo que valores); sin grupos, sobre todo el vector.
+    Los NaN no cuentan para la mediana y quedan en NaN.
+    """
+    s = pd.Series(np.asarray(valores, dtype=np.float64))
+    if grupos is None:
+        med = s.median()
+        mad = (s - med).abs().median()
+    else:
+        grupos = [np.asarray(g) for g in grupos]
+        med = s.groupby(grupos, sort=False).transform("median")
+        mad = (s - med).abs().groupby(grupos, sort=False).transform("median")
+    return (K_MAD * (s - med) / np.maximum(mad, MAD_MIN)).to_numpy()
+
+
+def _z_against(valores: np.ndarray, referencia: np.ndarray) -> np.ndarray:
+    """z robusto de `valores` contra la mediana y MAD de `referencia`."""
+    ref = referencia[np.isfinite(referencia)]
+    if ref.size == 0:
+        return np.full(len(valores), np.nan)
+    med = np.median(ref)
+    return K_MAD * (valores - med) / max(np.median(np.abs(ref - med)), MAD_MIN)
+
+
+def history_stats(historia: pd.DataFrame, sucursal: str = None) -> pd.DataFrame:
+    """
+    Mediana, MAD y días de historia de la merma diaria por Componente ×
+    Unidad_final, a partir del rollup "dia" del KpiStore. Con sucursal, usa su
+    historia si tiene al menos MIN_HISTORIA días y si no la de todas.
+    """
+    cols = [*HIST_KEYS, "Mediana_hist", "MAD_hist", "Dias_hist"]
+    if historia.empty:
+        return pd.DataFrame(columns=cols)
+    df = historia.assign(merma=merma_pct(historia["teorico"], historia["real"])).dropna(subset=["merma"])
+
+    def _stats(d: pd.DataFrame) -> pd.DataFrame:
+        g = d.groupby(HIST_KEYS, sort=False)["merma"]
+        med = g.median().rename("Mediana_hist")
+        desv = (d["merma"] - d[HIST_KEYS].join(med, on=HIST_KEYS)["Mediana_hist"]).abs()
+        mad = desv.groupby([d[k] for k in HIST_KEYS], sort=False).median().rename("MAD_hist")
+        return pd.concat([med, mad, g.size().rename("Dias_hist")], axis=1)
+
+    total = _stats(df)
+    if sucursal:
+        propia = _stats(df[df["sucursal"] == sucursal])
+        propia = propia[propia["Dias_hist"] >= MIN_HISTORIA]
+        total = pd.concat([propia, total[~total.index.isin(propia.index)]])
+    return total.reset_index()[cols]
+
+
+def classify(teorico, real, score, en_real=None) -> np.ndarray:
+    """
+    Diagnóstico por renglón (ver DIAGNOSTICOS). en_real indica si el
+    componente venía en el consumo real; sin él, real == 0 cuenta como faltante.
+    """
+    teorico = np.asarray(teorico, dtype=np.float64)
+    real = np.asarray(real, dtype=np.float64)
+    score = np.asarray(score, dtype=np.float64)
+    en_real = real != 0 if en_real is None else np.asarray(en_real, dtype=bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        escala = np.log10(real / teorico)
+    con_teorico = teorico > 0
+    condiciones = [
+        con_teorico & ~en_real,
+        real < 0,
+        con_teorico & (np.abs(escala - np.log10(FACTOR_UNIDAD)) < TOL_UNIDAD),
+        con_teorico & (np.abs(escala + np.log10(FACTOR_UNIDAD)) < TOL_UNIDAD),
+        con_teorico & (np.abs(score) >= Z_ALERTA) & (np.abs(escala) >= np.log10(RATIO_CAPTURA)),
+        score >= Z_ALERTA,
+        score <= -Z_ALERTA,
+    ]
+    return np.select(condiciones, DIAGNOSTICOS[:-1], default=DIAGNOSTICOS[-1])
+
+
+def score_kpi(kpi_df: pd.DataFrame, stats: pd.DataFrame = None, en_real=None) -> pd.DataFrame:
+    """
+    Agrega a la salida de merma_kpi: Z_historia (vs la historia del mismo
+    componente, NaN si tiene menos de MIN_HISTORIA días), Z_pares (vs los
+    demás componentes del cálculo), Score_anomalia (el de historia si existe)
+    y Diagnostico.
+    """
+    out = kpi_df.copy()
+    teorico = out["Cant_total_teorico_final"].to_numpy(dtype=np.float64)
+    real = out["Cant_real_final"].to_numpy(dtype=np.float64)
+    merma = merma_pct(teorico, real)
+
+    # Los pares solo con renglones que sí traen real (los faltantes sesgan la mediana)
+    out["Z_pares"] = _z_against(merma, merma[real > 0])
+
+    z_hist = np.full(len(out), np.nan)
+    if stats is not None and not stats.empty:
+        llaves = out[HIST_KEYS].astype(str)
+        h = llaves.merge(stats.astype({k: str for k in HIST_KEYS}), on=HIST_KEYS, how="left")
+        ok = (h["Dias_hist"] >= MIN_HISTORIA).to_numpy()
+        z_hist[ok] = (
+            K_MAD * (merma[ok] - h["Mediana_hist"].to_numpy(dtype=np.float64)[ok])
+            / np.maximum(h["MAD_hist"].to_numpy(dtype=np.float64)[ok], MAD_MIN)
+        )
+    out["Z_historia"] = z_hist
+
+    out["Score_anomalia"] = np.where(np.isnan(z_hist), out["Z_pares"].to_numpy(), z_hist)
+    out["Diagnostico"] = classify(teorico, real, out["Score_anomalia"].to_numpy(), en_real)
+    return out
+
+
+def score_history(historia: pd.DataFrame) -> pd.DataFrame:
+    """
+    Puntúa todo el histórico de una vez (rollup diario: periodo × sucursal ×
+    componente): z contra la historia del mismo componente y sucursal, y contra
+    los pares del mismo día y sucursal.
+    """
+    df = historia.copy()
+    df["Merma_real_pct"] = merma_pct(df["teorico"], df["real"])
+    con_real = df["Merma_real_pct"].where(df["real"] > 0)
+    df["Z_historia"] = robust_z(df["Merma_real_pct"], [df[k] for k in ["sucursal", *HIST_KEYS]])
+    df["Z_pares"] = robust_z(con_real, [df["periodo"], df["sucursal"]])
+    df.loc[df["Merma_real_pct"].isna(), "Z_pares"] = np.nan
+    dias = df.groupby(["sucursal", *HIST_KEYS], sort=False)["Merma_real_pct"].transform("count")
+    df["Score_anomalia"] = np.where(dias >= MIN_HISTORIA, df["Z_historia"], df["Z_pares"])
+    df["Diagnostico"] = classify(df["teorico"], df["real"], df["Score_anomalia"])
+    return df
+
+
+def diagnosis_counts(scored: pd.DataFrame) -> dict:
+    """Renglones por diagnóstico, en el orden de DIAGNOSTICOS."""
+    conteo = scored["Diagnostico"].value_counts()
+    return {d: int(conteo.get(d, 0)) for d in DIAGNOSTICOS}
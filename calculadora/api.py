@@ -0,0 +1,410 @@
+"""
+API HTTP/JSON local (Starlette + uvicorn) con el BOM compilado en memoria.
+
+Expone la misma explosión, costo y KPI que app.py para el POS / ERP:
+  GET  /health                estado y tamaño del BOM cargado
+  POST /v1/explode            un pedido  → insumos (kg/lt) y costo
+  POST /v1/explode/batch      muchos pedidos → NDJSON, una línea por pedido
+  POST /v1/kpi                pedido + consumo real → KPI de merma
+
+El BOM se carga y compila al arrancar (lifespan) y un BomWatcher lo recarga
+en caliente cuando cambia el Excel; cada petición toma una sola versión y
+la reporta en "bom_version". El cálculo corre en el threadpool de Starlette
+para no bloquear el event loop, y el batch se explota por bloques de pedidos
+con un solo producto disperso por bloque mientras la respuesta se va enviando.
+
+Uso:
+    python -m calculadora.api --port 8000
+"""
+import argparse
+import json
+import math
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from calculadora.core import (
+    aggregate_real,
+    convert_to_base_units,
+    kpi_totals,
+    merma_kpi,
+    parse_merma,
+)
+from calculadora.matrix import COMP_KEYS, BomMatrix, explode, explode_orders
+from calculadora.snapshot import BomSnapshot, BomWatcher
+from calculadora.units import UNITS
+
+DEFAULT_BOM = Path("data") / "bom_recetas.xlsx"
+# Pedidos por producto disperso en el endpoint batch
+BATCH_BLOCK = 2000
+# Decimales de las cantidades en las respuestas (double_precision de to_json,
+# que es el máximo de pandas): /v1/explode redondea igual que el batch
+DECIMALS = 15
+
+INSUMO_COLS = [
+    "Componente",
+    "Nombre_comp",
+    "Unidad_final",
+    "Cant_total_teorico_final",
+    "Cant_total_objetivo_final",
+]
+
+
+class ApiError(ValueError):
+    """Error de validación del cuerpo de la petición (→ HTTP 400)."""
+
+
+def _quantity(valor) -> float:
+    """Cantidad de una línea: 0 si no es numérica; ApiError si es inf o NaN."""
+    try:
+        cantidad = float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+    if not math.isfinite(cantidad):
+        raise ApiError(f"Cantidad no finita: {valor!r}.")
+    return cantidad
+
+
+class CompiledBom:
+    """
+    BomMatrix preparado para pedidos chicos sin pasar por pandas: índice
+    producto → fila en un dict, filas CSR (valores y patrón), factor y unidad
+    final por componente y el orden de salida de explode() precalculado.
+    Da el mismo resultado que convert_to_base_units(explode(...)).
+    """
+
+    def __init__(self, bom: BomMatrix):
+        self.bom = bom
+        self.fila = {p: i for i, p in enumerate(bom.productos)}
+        self.matriz = bom.matriz
+        self.patron = bom.patron_t.T.tocsr()
+        self.factor, unidad = UNITS.gather(bom.componentes["Unidad_comp"])
+        comps = bom.componentes
+        orden = comps.sort_values(COMP_KEYS).sort_values("Nombre_comp", kind="stable").index.to_numpy()
+        self.rango = np.empty(len(comps), dtype=np.int64)
+        self.rango[orden] = np.arange(len(comps))
+        self.componente = comps["Componente"].astype(str).to_numpy(dtype=object)
+        self.nombre = comps["Nombre_comp"].astype(str).to_numpy(dtype=object)
+        self.unidad = np.asarray(unidad, dtype=object)
+
+    def order(self, lineas: list) -> tuple:
+        """[{Producto, Cantidad}] → (filas, cantidades, sin_bom), sumando repetidos."""
+        q = {}
+        sin_bom = []
+        for linea in lineas:
+            if not isinstance(linea, dict):
+                raise ApiError("Cada línea debe ser {Producto, Cantidad}.")
+            producto = str(linea.get("Producto", "")).strip()
+            cantidad = _quantity(linea.get("Cantidad", 0))
+            if not cantidad > 0:
+                continue
+            i = self.fila.get(producto)
+            if i is None:
+                sin_bom.append(producto)
+            else:
+                q[i] = q.get(i, 0.0) + cantidad
+        return np.fromiter(q.keys(), np.int64, len(q)), np.fromiter(q.values(), np.float64, len(q)), sin_bom
+
+    def _gather(self, m: sparse.csr_matrix, filas: np.ndarray, pesos: np.ndarray) -> tuple:
+        largo = m.indptr[filas + 1] - m.indptr[filas]
+        pos = np.repeat(m.indptr[filas] - np.cumsum(largo) + largo, largo) + np.arange(largo.sum())
+        return m.indices[pos], m.data[pos] * np.repeat(pesos, largo)
+
+    def insumos(self, filas: np.ndarray, cantidades: np.ndarray, factor_merma: float) -> list:
+        """Registros INSUMO_COLS del pedido, en el orden de explode()."""
+        cols, valores = self._gather(self.matriz, filas, cantidades)
+        teorico = np.bincount(cols, weights=valores, minlength=len(self.factor))
+        tocados = np.unique(self._gather(self.patron, filas, cantidades)[0])
+        tocados = tocados[np.argsort(self.rango[tocados])]
+        teo = (teorico[tocados] * self.factor[tocados]).tolist()
+        # Mismo orden de operaciones que explode() + convert_to_base_units
+        obj = (teorico[tocados] * factor_merma * self.factor[tocados]).tolist()
+        return [
+            {
+                "Componente": c,
+                "Nombre_comp": n,
+                "Unidad_final": u,
+                "Cant_total_teorico_final": None if t != t else round(t, DECIMALS),
+                "Cant_total_objetivo_final": None if o != o else round(o, DECIMALS),
+            }
+            for c, n, u, t, o in zip(self.componente[tocados], self.nombre[tocados], self.unidad[tocados], teo, obj)
+        ]
+
+
+class BomService:
+    """Una versión del BOM (uno y multinivel) compilada para la API, de solo lectura."""
+
+    def __init__(self, snapshot: BomSnapshot):
+        self.snapshot = snapshot
+        self.un_nivel = snapshot.bom
+        self.multinivel = snapshot.flat
+        # flatten_bom conserva la indexación de productos: un solo vector de costo
+        self.costo = snapshot.costo_receta
+        self.compilado = {False: CompiledBom(self.un_nivel), True: CompiledBom(self.multinivel)}
+
+    def bom(self, multinivel: bool):
+        return self.multinivel if multinivel else self.un_nivel
+
+
+def _flag(body: dict, nombre: str, defecto: bool) -> bool:
+    """Opción booleana del cuerpo; "false" (texto) no cuenta como booleano."""
+    valor = body.get(nombre, defecto)
+    if not isinstance(valor, bool):
+        raise ApiError(f"'{nombre}' debe ser true o false.")
+    return valor
+
+
+def _factor(body: dict) -> float:
+    try:
+        return 1.0 + parse_merma(str(body.get("merma", "0")))
+    except ValueError as e:
+        raise ApiError(str(e)) from e
+
+
+def _lines_frame(lineas) -> pd.DataFrame:
+    """[{Producto, Cantidad}] → pedido_df (Producto, Cantidad_pedida)."""
+    if not isinstance(lineas, list):
+        raise ApiError("'lineas' debe ser una lista de {Producto, Cantidad}.")
+    try:
+        df = pd.DataFrame(lineas, columns=["Producto", "Cantidad"])
+    except (TypeError, ValueError) as e:
+        raise ApiError(f"'lineas' inválidas: {e}") from e
+    df["Producto"] = df["Producto"].astype(str).str.strip()
+    df["Cantidad"] = np.array([_quantity(v) for v in df["Cantidad"]], dtype=np.float64)
+    df = df[df["Cantidad"] > 0]
+    return df.groupby("Producto", as_index=False, sort=False)["Cantidad"].sum().rename(
+        columns={"Cantidad": "Cantidad_pedida"}
+    )
+
+
+def _real_frame(real) -> pd.DataFrame:
+    """[{Componente, Cant_real}] (o sus alias) → consumo real sumado por Componente."""
+    if not isinstance(real, list) or not real or not all(isinstance(r, dict) for r in real):
+        raise ApiError("'real' debe ser una lista no vacía de {Componente, Cant_real}.")
+    try:
+        agregado = aggregate_real(pd.DataFrame(real))
+    except (TypeError, ValueError, AttributeError, KeyError) as e:
+        raise ApiError(f"'real' inválido: {e}") from e
+    if not np.isfinite(agregado["Cant_real"].to_numpy()).all():
+        raise ApiError("'real' tiene cantidades no finitas (inf).")
+    return agregado
+
+
+def _records(df: pd.DataFrame) -> list:
+    """Registros JSON-serializables (NaN → null)."""
+    return json.loads(df.to_json(orient="records", force_ascii=False, double_precision=DECIMALS))
+
+
+def explode_one(service: BomService, body: dict) -> dict:
+    factor = _factor(body)
+    lineas = body.get("lineas")
+    if not isinstance(lineas, list):
+        raise ApiError("'lineas' debe ser una lista de {Producto, Cantidad}.")
+    bom = service.compilado[_flag(body, "multinivel", True)]
+    filas, cantidades, sin_bom = bom.order(lineas)
+    costo = float(cantidades @ service.costo[filas])
+    return {
+        "insumos": bom.insumos(filas, cantidades, factor),
+        "costo_teorico": costo,
+        "costo_objetivo": costo * factor,
+        "sin_bom": sin_bom,
+        "bom_version": service.snapshot.tag,
+    }
+
+
+def _batch_frame(pedidos) -> tuple:
+    """
+    [{order_id, lineas: [...]}] → (ordenes_df (order_id, Producto, Cantidad),
+    order_ids en el orden recibido, incluidos los pedidos sin líneas).
+    """
+    if not isinstance(pedidos, list):
+        raise ApiError("'pedidos' debe ser una lista de {order_id, lineas}.")
+    orden_ids, ids, prods, cants = [], [], [], []
+    for i, p in enumerate(pedidos):
+        if not isinstance(p, dict) or not isinstance(p.get("lineas"), list):
+            raise ApiError(f"Pedido #{i} inválido: se espera {{order_id, lineas}}.")
+        oid = str(p.get("order_id", i))
+        orden_ids.append(oid)
+        for linea in p["lineas"]:
+            if not isinstance(linea, dict):
+                raise ApiError(f"Pedido {oid}: cada línea debe ser {{Producto, Cantidad}}.")
+            ids.append(oid)
+            prods.append(str(linea.get("Producto", "")).strip())
+            try:
+                cants.append(_quantity(linea.get("Cantidad", 0)))
+            except ApiError as e:
+                raise ApiError(f"Pedido {oid}: {e}") from e
+    ordenes = pd.DataFrame({
+        "order_id": ids,
+        "Producto": prods,
+        "Cantidad": np.array(cants, dtype=np.float64),
+    })
+    return ordenes, pd.unique(np.array(orden_ids, dtype=object))
+
+
+def explode_batch_lines(service: BomService, body: dict):
+    """
+    Generador NDJSON: un bloque de líneas (una por pedido, con insumos y
+    costo) cada BATCH_BLOCK pedidos, en el orden recibido. Los pedidos sin
+    líneas válidas salen con insumos vacíos. Los insumos de todo el bloque se
+    serializan de una vez con to_json y se reparten por pedido.
+    """
+    factor = _factor(body)
+    bom = service.bom(_flag(body, "multinivel", True))
+    ordenes, orden_ids = _batch_frame(body.get("pedidos"))
+    version = json.dumps(service.snapshot.tag)
+
+    for inicio in range(0, len(orden_ids), BATCH_BLOCK):
+        bloque_ids = orden_ids[inicio:inicio + BATCH_BLOCK]
+        bloque = ordenes[ordenes["order_id"].isin(bloque_ids)]
+
+        cantidad = bloque["Cantidad"].to_numpy()
+        idx = service.un_nivel.productos.get_indexer(bloque["Producto"])
+        linea_costo = np.where((idx >= 0) & (cantidad > 0), service.costo[np.maximum(idx, 0)] * cantidad, 0.0)
+        costos = pd.Series(linea_costo).groupby(bloque["order_id"].to_numpy()).sum().to_dict()
+
+        r = convert_to_base_units(explode_orders(bom, bloque, factor))
+        filas = r[INSUMO_COLS].to_json(
+            orient="records", lines=True, force_ascii=False, double_precision=DECIMALS
+        ).splitlines() if len(r) else []
+        oid = r["order_id"].to_numpy()
+        limites = np.flatnonzero(np.r_[True, oid[1:] != oid[:-1], True]) if len(oid) else np.array([0])
+        rangos = {oid[a]: (a, b) for a, b in zip(limites[:-1].tolist(), limites[1:].tolist())}
+
+        salida = []
+        for o in bloque_ids:
+            a, b = rangos.get(o, (0, 0))
+            costo = float(costos.get(o, 0.0))
+            salida.append(
+                f'{{"order_id":{json.dumps(o, ensure_ascii=False)},"insumos":[{",".join(filas[a:b])}],'
+                f'"costo_teorico":{json.dumps(costo)},"costo_objetivo":{json.dumps(costo * factor)},'
+                f'"bom_version":{version}}}\n'
+            )
+        yield "".join(salida)
+
+
+def kpi_one(service: BomService, body: dict) -> dict:
+    factor = _factor(body)
+    pedido = _lines_frame(body.get("lineas"))
+    real = _real_frame(body.get("real"))
+    bom = service.bom(_flag(body, "multinivel", True))
+    resumen = convert_to_base_units(explode(bom, pedido, factor))
+    kpi = merma_kpi(resumen, real, _flag(body, "convertir_real", False))
+    return {
+        "kpi": _records(kpi[[*INSUMO_COLS, "Cant_real_final", "Merma_real_pct", "Gap_vs_teorico", "Gap_vs_objetivo"]]),
+        "totales": {k: (None if v != v else v) for k, v in kpi_totals(kpi).items()},
+        "bom_version": service.snapshot.tag,
+    }
+
+
+async def _body(request: Request) -> dict:
+    try:
+        body = await request.json()
+    except ValueError as e:
+        raise ApiError(f"JSON inválido: {e}") from e
+    if not isinstance(body, dict):
+        raise ApiError("El cuerpo debe ser un objeto JSON.")
+    return body
+
+
+async def _service(app) -> BomService:
+    """
+    Servicio de la versión publicada del BOM. Si el watcher publicó otra, se
+    compila (fuera del event loop) y se reemplaza con una sola asignación.
+    """
+    snapshot = app.state.watcher.current()
+    service = app.state.service
+    if service.snapshot is not snapshot:
+        service = await run_in_threadpool(BomService, snapshot)
+        app.state.service = service
+    return service
+
+
+def _json_endpoint(fn):
+    async def endpoint(request: Request):
+        try:
+            body = await _body(request)
+            service = await _service(request.app)
+            return JSONResponse(await run_in_threadpool(fn, service, body))
+        except ApiError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+    return endpoint
+
+
+async def health(request: Request):
+    watcher = request.app.state.watcher
+    snapshot = watcher.current()
+    n_prod, n_comp = snapshot.bom.shape
+    return JSONResponse({
+        "status": "ok",
+        "bom": str(snapshot.path),
+        "bom_version": snapshot.tag,
+        "version": snapshot.version,
+        "cargado": snapshot.cargado.isoformat(timespec="seconds"),
+        "productos": n_prod,
+        "componentes": n_comp,
+        "error_recarga": watcher.error.mensaje if watcher.error is not None else None,
+    })
+
+
+async def explode_batch(request: Request):
+    try:
+        body = await _body(request)
+        service = await _service(request.app)
+        lineas = explode_batch_lines(service, body)
+        # Valida y calcula el primer bloque antes de abrir el stream
+        primera = await run_in_threadpool(next, lineas, None)
+    except ApiError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    def contenido():
+        if primera is not None:
+            yield primera
+            yield from lineas
+
+    return StreamingResponse(contenido(), media_type="application/x-ndjson")
+
+
+def create_app(bom_path: Path = DEFAULT_BOM) -> Starlette:
+    @asynccontextmanager
+    async def lifespan(app):
+        watcher = await run_in_threadpool(BomWatcher, bom_path)
+        app.state.watcher = watcher.start()
+        app.state.service = await run_in_threadpool(BomService, watcher.current())
+        yield
+        watcher.stop()
+
+    return Starlette(
+        routes=[
+            Route("/health", health, methods=["GET"]),
+            Route("/v1/explode", _json_endpoint(explode_one), methods=["POST"]),
+            Route("/v1/explode/batch", explode_batch, methods=["POST"]),
+            Route("/v1/kpi", _json_endpoint(kpi_one), methods=["POST"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+def main(argv=None) -> int:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m calculadora.api", description="API local de la calculadora.")
+    parser.add_argument("--bom", type=Path, default=DEFAULT_BOM)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    uvicorn.run(create_app(args.bom), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
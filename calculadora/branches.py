@@ -0,0 +1,363 @@
+"""
+Modo multi-sucursal: un BOM base compartido más ajustes dispersos por sucursal.
+
+El archivo de ajustes (data/sucursales.csv) tiene una fila por ajuste:
+  Sucursal, Producto, Componente, Cantidad_comp, Sustituto, Factor, Merma
+  - Producto + Componente + Cantidad_comp: otra cantidad en la receta de
+    esa sucursal (0 = quitar el componente).
+  - Componente + Sustituto (Producto opcional; vacío = todos los productos):
+    se usa Sustituto en lugar de Componente, Factor × la cantidad original,
+    convertida a la columna del sustituto de la misma dimensión (kg, lt o
+    conteo); si el sustituto no tiene esa dimensión, la fila se ignora.
+  - Componente + Merma: merma objetivo propia de ese componente.
+  - Solo Merma: merma objetivo de la sucursal (en lugar de la del sidebar).
+
+Cada sucursal se compila a una matriz delta Δ (producto × componente, casi
+vacía) sobre el BOM de un nivel y sobre el aplanado, de modo que
+    teórico_sucursal = (M + Δ)ᵀ · q = Mᵀ · q + Δᵀ · q
+y nunca se copia la matriz base. El consolidado de varias sucursales es un
+producto sobre la base y otro sobre las Δ apiladas.
+"""
+from dataclasses import dataclass, replace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from calculadora.core import parse_merma
+from calculadora.matrix import COMP_KEYS, BomMatrix, summary_frame
+from calculadora.mermas import MermaRules
+from calculadora.multilevel import ProductYields, flatten_bom
+from calculadora.units import UNITS
+
+BASE = "Base"
+OVERRIDE_COLS = ["Sucursal", "Producto", "Componente", "Cantidad_comp", "Sustituto", "Factor", "Merma"]
+# Diferencias menores se consideran ruido de punto flotante al aplanar
+_TOL = 1e-12
+
+
+@dataclass(frozen=True)
+class BranchDelta:
+    """
+    Ajuste de una sucursal sobre un BomMatrix:
+      - delta: CSR producto × componente (rama − base)
+      - delta_t: su transpuesta (para Δᵀ · q)
+      - agrega_t / quita_t: patrones (componente × producto) de aristas que la
+        sucursal agrega o quita respecto a la base, para los componentes tocados
+    """
+    delta: sparse.csr_matrix
+    delta_t: sparse.csr_matrix
+    agrega_t: sparse.csr_matrix
+    quita_t: sparse.csr_matrix
+
+    @property
+    def nnz(self) -> int:
+        return self.delta.nnz
+
+
+@dataclass(frozen=True)
+class BranchModel:
+    """
+    Ajustes compilados de todas las sucursales contra una versión del BOM.
+    merma: merma objetivo por sucursal (NaN = la del sidebar)
+    merma_comp: sucursal → vector por componente (NaN = la de la sucursal)
+    ignorados: filas del archivo con productos o componentes que no están en el BOM
+    """
+    sucursales: tuple
+    un_nivel: dict
+    plano: dict
+    merma: dict
+    merma_comp: dict
+    ignorados: pd.DataFrame
+
+    def delta(self, sucursal: str, plano: bool) -> BranchDelta:
+        """Ajuste de la sucursal (None para la base o sucursales sin ajustes)."""
+        return (self.plano if plano else self.un_nivel).get(sucursal)
+
+    def target(self, sucursal: str, merma_defecto: float) -> float:
+        """Merma objetivo de la sucursal (la de por defecto si no tiene propia)."""
+        merma = self.merma.get(sucursal, np.nan)
+        return merma_defecto if np.isnan(merma) else merma
+
+    def factor(self, sucursal: str, merma: float):
+        """
+        Factor (1 + merma) de la sucursal con la merma objetivo dada: escalar
+        si no tiene mermas por componente, vector alineado con
+        bom.componentes si las tiene.
+        """
+        por_comp = self.merma_comp.get(sucursal)
+        if por_comp is None:
+            return 1.0 + merma
+        return 1.0 + np.where(np.isnan(por_comp), merma, por_comp)
+
+
+def default_branch_path(data_path: Path) -> Path:
+    return data_path.parent / "sucursales.csv"
+
+
+def read_overrides(source) -> pd.DataFrame:
+    """Lee el CSV de ajustes; las columnas que falten se agregan vacías."""
+    df = pd.read_csv(source, dtype=str)
+    df.columns = [str(c).strip() for c in df.columns]
+    if "Sucursal" not in df.columns:
+        raise ValueError("El archivo de sucursales debe tener la columna **Sucursal**.")
+    df = df.reindex(columns=OVERRIDE_COLS)
+    for c in ["Sucursal", "Producto", "Componente", "Sustituto"]:
+        # Una columna que falta (o viene toda vacía) llega como float
+        df[c] = df[c].astype(object).str.strip().replace("", np.nan)
+    for c in ["Cantidad_comp", "Factor"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df.dropna(subset=["Sucursal"]).reset_index(drop=True)
+
+
+def _pattern_t(rows: np.ndarray, cols: np.ndarray, shape: tuple, pesos: np.ndarray = None) -> sparse.csr_matrix:
+    pesos = np.ones(len(rows)) if pesos is None else pesos
+    return sparse.csr_matrix((pesos, (cols, rows)), shape=(shape[1], shape[0]))
+
+
+def _values_at(m: sparse.csr_matrix, filas: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    valores = m[filas, cols]
+    return np.asarray(valores.todense() if sparse.issparse(valores) else valores).ravel()
+
+
+def _branch_delta(base: BomMatrix, rama: sparse.csr_matrix) -> BranchDelta:
+    # Se trabaja sobre copias: varias operaciones de scipy (tolil, indexar)
+    # suman duplicados en su lugar y la matriz base es compartida
+    delta = (rama - base.matriz.copy()).tocsr()
+    delta.data[np.abs(delta.data) <= _TOL] = 0.0
+    delta.eliminate_zeros()
+
+    # Aristas que cambian de existencia: en la rama y no en la base, o al
+    # revés. patron_t cuenta los renglones duplicados del Excel, así que las
+    # que se quitan llevan ese conteo.
+    coo = delta.tocoo()
+    aristas = base.patron_t.copy().T.tocsr()
+    aristas.sum_duplicates()
+    en_base = _values_at(aristas, coo.row, coo.col)
+    en_rama = np.abs(_values_at(rama, coo.row, coo.col)) > _TOL
+    agrega = (en_base == 0) & en_rama
+    quita = (en_base > 0) & ~en_rama
+    return BranchDelta(
+        delta=delta,
+        delta_t=delta.T.tocsr(),
+        agrega_t=_pattern_t(coo.row[agrega], coo.col[agrega], rama.shape),
+        quita_t=_pattern_t(coo.row[quita], coo.col[quita], rama.shape, en_base[quita]),
+    )
+
+
+def _apply_overrides(bom: BomMatrix, filas: pd.DataFrame) -> tuple:
+    """
+    Matriz de un nivel de la sucursal (LIL de trabajo, solo al compilar) y
+    las filas que no se pudieron aplicar.
+    """
+    rama = bom.matriz.copy().tolil()
+    codigos = bom.componentes["Componente"].astype(str)
+    factor_u, _ = UNITS.gather(bom.componentes["Unidad_comp"])
+    dimension = UNITS.dimension(bom.componentes["Unidad_comp"])
+    columnas = pd.Series(np.arange(len(codigos))).groupby(codigos.to_numpy()).agg(list).to_dict()
+    ignorados = []
+
+    for fila in filas.itertuples(index=False):
+        cols = columnas.get(fila.Componente)
+        p = bom.productos.get_indexer([fila.Producto])[0] if pd.notna(fila.Producto) else -1
+        if cols is None or (pd.notna(fila.Producto) and p < 0):
+            ignorados.append(fila._asdict())
+            continue
+
+        if pd.notna(fila.Sustituto):
+            # Columna del sustituto con la misma dimensión que cada columna original
+            destino = {}
+            for d in columnas.get(fila.Sustituto, []):
+                destino.setdefault(dimension[d], d)
+            if not destino or any(dimension[c] not in destino for c in cols):
+                ignorados.append(fila._asdict())
+                continue
+            factor = 1.0 if pd.isna(fila.Factor) else fila.Factor
+            productos = [p] if p >= 0 else np.unique(rama.tocsc()[:, cols].nonzero()[0])
+            for prod in productos:
+                cantidades = [(c, rama[prod, c]) for c in cols]
+                for c, _ in cantidades:
+                    rama[prod, c] = 0.0
+                for c, cantidad in cantidades:
+                    if cantidad:
+                        d = destino[dimension[c]]
+                        rama[prod, d] += factor * cantidad * factor_u[c] / factor_u[d]
+        elif pd.notna(fila.Cantidad_comp) and p >= 0:
+            # La cantidad va a la primera columna que la receta ya usa (o a la primera del código)
+            usadas = [c for c in cols if rama[p, c] != 0]
+            objetivo = (usadas or cols)[0]
+            for c in cols:
+                rama[p, c] = 0.0
+            rama[p, objetivo] = fila.Cantidad_comp
+    return rama.tocsr(), ignorados
+
+
+def compile_branches(
+    bom: BomMatrix,
+    plano_base: BomMatrix,
+    rendimientos: ProductYields,
+    overrides: pd.DataFrame,
+) -> BranchModel:
+    """
+    Compila los ajustes (salida de read_overrides) contra el BOM de un nivel
+    y su versión aplanada (plano_base = flatten_bom(bom, rendimientos)).
+    Lanza BomCycleError si una sustitución deja sub-recetas en ciclo (o
+    BomUnitError si las deja consumidas en otra dimensión).
+    """
+    codigos = bom.componentes["Componente"].astype(str)
+    un_nivel, plano, merma, merma_comp, ignorados = {}, {}, {}, {}, []
+
+    for sucursal, filas in overrides.groupby("Sucursal", sort=True):
+        solo_merma = filas["Merma"].notna() & filas["Componente"].isna()
+        merma[sucursal] = parse_merma(filas.loc[solo_merma, "Merma"].iloc[-1]) if solo_merma.any() else np.nan
+
+        por_comp = filas["Merma"].notna() & filas["Componente"].notna() & filas["Producto"].isna() & filas["Sustituto"].isna()
+        if por_comp.any():
+            vector = np.full(len(codigos), np.nan)
+            for comp, valor in filas.loc[por_comp, ["Componente", "Merma"]].itertuples(index=False):
+                cols = np.flatnonzero(codigos.to_numpy() == comp)
+                if cols.size == 0:
+                    ignorados.append({"Sucursal": sucursal, "Componente": comp, "Merma": valor})
+                vector[cols] = parse_merma(valor)
+            merma_comp[sucursal] = vector
+
+        receta = filas[~solo_merma & ~por_comp]
+        if receta.empty:
+            continue
+        rama, fuera = _apply_overrides(bom, receta)
+        ignorados.extend(fuera)
+
+        delta = _branch_delta(bom, rama)
+        if delta.nnz == 0:
+            continue
+        un_nivel[sucursal] = delta
+        # flatten_bom solo lee la matriz de un nivel; la transpuesta no hace falta
+        rama_bom = replace(bom, matriz=rama, matriz_t=None, patron_t=None)
+        plano[sucursal] = _branch_delta(plano_base, flatten_bom(rama_bom, rendimientos).matriz)
+
+    return BranchModel(
+        sucursales=tuple(sorted(overrides["Sucursal"].unique())),
+        un_nivel=un_nivel,
+        plano=plano,
+        merma=merma,
+        merma_comp=merma_comp,
+        ignorados=pd.DataFrame(ignorados, columns=OVERRIDE_COLS),
+    )
+
+
+# =========================
+# EXPLOSIÓN
+# =========================
+def branch_summary(
+    bom: BomMatrix,
+    rama: BranchDelta,
+    teorico_base: np.ndarray,
+    conteo_base: np.ndarray,
+    q: np.ndarray,
+    factor_merma=1.0,
+) -> pd.DataFrame:
+    """
+    Resumen por componente de la sucursal a partir del resultado de la base
+    (teórico Mᵀ · q y cuántos productos pedidos tocan cada componente, p. ej.
+    los de IncrementalTotals). Sin rama es el resumen de la base.
+    """
+    if rama is None:
+        return summary_frame(bom, teorico_base, conteo_base > 0, factor_merma)
+    pedidos = (q > 0).astype(np.float64)
+    teorico = teorico_base + rama.delta_t @ q
+    conteo = conteo_base + rama.agrega_t @ pedidos - rama.quita_t @ pedidos
+    teorico[np.abs(teorico) <= _TOL] = 0.0
+    return summary_frame(bom, teorico, (conteo > 0) | (teorico != 0), factor_merma)
+
+
+def explode_branch(bom: BomMatrix, rama: BranchDelta, pedido_df: pd.DataFrame, factor_merma=1.0) -> pd.DataFrame:
+    """explode() de una sucursal: el mismo formato, con sus ajustes y su merma."""
+    q = bom.order_vector(pedido_df)
+    conteo = bom.patron_t @ (q > 0).astype(np.float64)
+    return branch_summary(bom, rama, bom.matriz_t @ q, conteo, q, factor_merma)
+
+
+def explode_branches(
+    bom: BomMatrix,
+    modelo: BranchModel,
+    pedidos_df: pd.DataFrame,
+    merma_defecto: float = 0.0,
+    plano: bool = True,
+    reglas: MermaRules = None,
+) -> pd.DataFrame:
+    """
+    Requerimiento de varias sucursales en una pasada.
+    pedidos_df: Sucursal, Producto, Cantidad. Sucursales sin ajustes (o todas,
+    si modelo es None) usan la base y merma_defecto. Con reglas de merma,
+    cada sucursal las aplica sobre su merma objetivo y sus mermas por componente.
+    Devuelve una fila por sucursal × componente con teórico y objetivo ya en
+    unidad final (kg/lt/unidades).
+    """
+    cantidad = pd.to_numeric(pedidos_df["Cantidad"], errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    idx = bom.productos.get_indexer(pedidos_df["Producto"].astype(str).str.strip())
+    ok = (idx >= 0) & (cantidad > 0)
+    suc_codes, sucursales = pd.factorize(pedidos_df["Sucursal"].astype(str).str.strip().to_numpy()[ok])
+    n_suc, n_prod = len(sucursales), len(bom.productos)
+
+    q = sparse.csr_matrix((cantidad[ok], (suc_codes, idx[ok])), shape=(n_suc, n_prod))
+    teorico = (q @ bom.matriz).toarray()
+
+    # Δ de todas las sucursales apiladas: la fila (k · productos + p) es el
+    # ajuste de la k-ésima sucursal con ajustes para el producto p
+    ramas = [] if modelo is None else [(i, modelo.delta(s, plano)) for i, s in enumerate(sucursales)]
+    ramas = [(i, r) for i, r in ramas if r is not None]
+    if ramas:
+        bloque = np.full(n_suc, -1)
+        bloque[[i for i, _ in ramas]] = np.arange(len(ramas))
+        con_rama = bloque[suc_codes] >= 0
+        q_ramas = sparse.csr_matrix(
+            (cantidad[ok][con_rama], (suc_codes[con_rama], bloque[suc_codes[con_rama]] * n_prod + idx[ok][con_rama])),
+            shape=(n_suc, len(ramas) * n_prod),
+        )
+        teorico += (q_ramas @ sparse.vstack([r.delta for _, r in ramas], format="csr")).toarray()
+
+    objetivo = teorico * (1.0 + merma_defecto)
+    for i, s in enumerate(sucursales):
+        merma = merma_defecto if modelo is None else modelo.target(s, merma_defecto)
+        merma_comp = None if modelo is None else modelo.merma_comp.get(s)
+        if reglas is None:
+            if modelo is not None:
+                objetivo[i] = teorico[i] * modelo.factor(s, merma)
+            continue
+        objetivo[i] = teorico[i] * reglas.vector(merma, merma_comp)
+        if reglas.por_producto:
+            # Reglas por producto: + Cᵀ · q de la sucursal (solo filas con reglas)
+            rama = None if modelo is None else modelo.delta(s, plano)
+            q_i = q[i].toarray().ravel()
+            for m in [bom.matriz] if rama is None else [bom.matriz, rama.delta]:
+                objetivo[i] += q_i @ reglas.corrections(m, merma, merma_comp)
+    unidad, destino = UNITS.gather(bom.componentes["Unidad_comp"])
+    fila, col = np.nonzero(teorico)
+
+    out = bom.componentes.iloc[col].reset_index(drop=True)
+    out.insert(0, "Sucursal", np.asarray(sucursales)[fila])
+    out["Cant_total_comp_teorico"] = teorico[fila, col]
+    out["Cant_total_comp_objetivo"] = objetivo[fila, col]
+    out["Unidad_final"] = destino[col]
+    out["Cant_total_teorico_final"] = out["Cant_total_comp_teorico"].to_numpy() * unidad[col]
+    out["Cant_total_objetivo_final"] = out["Cant_total_comp_objetivo"].to_numpy() * unidad[col]
+    return out.sort_values(["Sucursal", "Nombre_comp"], kind="stable").reset_index(drop=True)
+
+
+def consolidate_branches(por_sucursal: pd.DataFrame) -> pd.DataFrame:
+    """Total de todas las sucursales por componente (unidad final)."""
+    return (
+        por_sucursal.groupby([*COMP_KEYS, "Unidad_final"], observed=True, as_index=False)
+        [["Cant_total_teorico_final", "Cant_total_objetivo_final"]].sum()
+        .sort_values("Nombre_comp", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def branch_costs(modelo: BranchModel, sucursal: str, precio: np.ndarray) -> np.ndarray:
+    """Cambio en el costo por unidad de cada producto por los ajustes de la sucursal: Δ_plano · p."""
+    rama = modelo.delta(sucursal, plano=True)
+    if rama is None:
+        return 0.0
+    return rama.delta @ np.nan_to_num(precio)
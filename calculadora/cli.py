@@ -0,0 +1,248 @@
+"""
+CLI por lotes: explota un archivo de pedidos (CSV o Parquet) sin Streamlit.
+
+Columnas de entrada: order_id, Producto, Cantidad.
+Lee el archivo en bloques, explota cada bloque con un solo producto
+disperso y escribe:
+  - requerimiento_por_orden.csv  (una fila por pedido y componente)
+  - requerimiento_total.csv      (agregado de todos los pedidos)
+
+La memoria queda acotada por --chunksize. Las líneas de un mismo pedido
+deben venir contiguas (como en los exports del POS); si no, ese pedido
+aparece en más de una fila del archivo por orden.
+
+Subcomando escenarios: planes por sucursal × día (sucursal, dia, Producto,
+Cantidad) contra varios escenarios de merma, repartidos en procesos
+(calculadora.scenarios). Escribe escenarios_total.csv, escenarios_costos.csv
+y, con --detalle, escenarios_por_plan.csv.
+
+Uso:
+    python -m calculadora.cli pedidos.csv --out-dir salida --merma 10%
+    python -m calculadora.cli escenarios planes.csv --merma 0% --merma 10% --workers 4
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from calculadora.core import convert_to_base_units, parse_merma, products_table, recipe_cost_vector, requirements
+from calculadora.loader import load_bom_cached
+from calculadora.matrix import build_bom_matrix, explode_orders
+from calculadora.multilevel import flatten_bom, product_yields
+from calculadora.scenarios import PLAN_KEYS, consolidate, run_scenarios
+
+ORDER_COLS = ["order_id", "Producto", "Cantidad"]
+ORDER_DTYPES = {"order_id": "string", "Producto": "string", "Cantidad": "float64"}
+
+
+def read_orders(path: Path, chunksize: int):
+    """
+    Itera el archivo de pedidos en bloques de ~chunksize filas,
+    leyendo solo las columnas necesarias.
+    """
+    if path.suffix.lower() == ".parquet":
+        import pyarrow.parquet as pq
+
+        archivo = pq.ParquetFile(path)
+        for batch in archivo.iter_batches(batch_size=chunksize, columns=ORDER_COLS):
+            yield batch.to_pandas().astype(ORDER_DTYPES)
+    else:
+        yield from pd.read_csv(path, usecols=ORDER_COLS, dtype=ORDER_DTYPES, chunksize=chunksize)
+
+
+def contiguous_orders(chunks):
+    """
+    Re-corta los bloques en fronteras de pedido: las filas del último
+    order_id de cada bloque se retienen y se unen al bloque siguiente.
+    """
+    pendiente = None
+    for chunk in chunks:
+        chunk["Producto"] = chunk["Producto"].str.strip()
+        if pendiente is not None:
+            chunk = pd.concat([pendiente, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        cola = chunk["order_id"].eq(chunk["order_id"].iloc[-1])
+        pendiente = chunk[cola]
+        listo = chunk[~cola]
+        if not listo.empty:
+            yield listo
+    if pendiente is not None and not pendiente.empty:
+        yield pendiente
+
+
+def run(
+    orders_path: Path,
+    out_dir: Path,
+    bom_path: Path,
+    factor_merma: float,
+    multinivel: bool = True,
+    chunksize: int = 200_000,
+) -> dict:
+    """
+    Explota todos los pedidos y escribe los CSV de salida. Devuelve estadísticas.
+    """
+    bom_df = load_bom_cached(bom_path)
+    bom = build_bom_matrix(bom_df)
+    if multinivel:
+        bom = flatten_bom(bom, product_yields(bom, bom_df))
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    por_orden_path = out_dir / "requerimiento_por_orden.csv"
+    total_path = out_dir / "requerimiento_total.csv"
+
+    q_total = np.zeros(len(bom.productos), dtype=np.float64)
+    stats = {"lineas": 0, "pedidos": 0, "lineas_sin_bom": 0}
+    writer = schema = None
+
+    for chunk in contiguous_orders(read_orders(orders_path, chunksize)):
+        chunk = chunk[chunk["Cantidad"].fillna(0) > 0]
+        idx = bom.productos.get_indexer(chunk["Producto"])
+        stats["lineas"] += len(chunk)
+        stats["lineas_sin_bom"] += int((idx < 0).sum())
+        stats["pedidos"] += chunk["order_id"].nunique()
+
+        ok = idx >= 0
+        q_total += np.bincount(idx[ok], weights=chunk["Cantidad"].to_numpy()[ok], minlength=len(q_total))
+
+        # pyarrow escribe el CSV en streaming y mucho más rápido que to_csv
+        por_orden = convert_to_base_units(explode_orders(bom, chunk, factor_merma))
+        tabla = pa.Table.from_pandas(por_orden, preserve_index=False)
+        if writer is None:
+            schema = tabla.schema
+            writer = pacsv.CSVWriter(por_orden_path, schema)
+        writer.write_table(tabla.cast(schema))
+
+    if writer is None:
+        # Archivo vacío: dejar al menos los encabezados
+        vacio = pd.DataFrame({c: pd.Series(dtype=t) for c, t in ORDER_DTYPES.items()})
+        convert_to_base_units(explode_orders(bom, vacio, factor_merma)).to_csv(por_orden_path, index=False)
+    else:
+        writer.close()
+
+    pedido_total = pd.DataFrame({"Producto": bom.productos, "Cantidad_pedida": q_total})
+    pedido_total = pedido_total[pedido_total["Cantidad_pedida"] > 0]
+    requirements(bom, pedido_total, factor_merma).to_csv(total_path, index=False)
+
+    return stats
+
+
+def run_plans(
+    plans_path: Path,
+    out_dir: Path,
+    bom_path: Path,
+    mermas: dict,
+    multinivel: bool = True,
+    workers: int = None,
+    detalle: bool = False,
+) -> dict:
+    """
+    Corre los escenarios de merma sobre los planes y escribe los CSV de
+    salida. Devuelve estadísticas.
+    """
+    bom_df = load_bom_cached(bom_path)
+    bom = build_bom_matrix(bom_df)
+    costo = recipe_cost_vector(bom, products_table(bom_df))
+    if multinivel:
+        bom = flatten_bom(bom, product_yields(bom, bom_df))
+
+    cols = [*PLAN_KEYS, "Producto", "Cantidad"]
+    if plans_path.suffix.lower() == ".parquet":
+        planes = pd.read_parquet(plans_path, columns=cols)
+    else:
+        planes = pd.read_csv(plans_path, usecols=cols, dtype={"sucursal": "string", "dia": "string", "Producto": "string"})
+    planes["Producto"] = planes["Producto"].str.strip()
+    planes["Cantidad"] = pd.to_numeric(planes["Cantidad"], errors="coerce").fillna(0.0)
+
+    resultado = run_scenarios(bom, costo, planes, mermas, workers=workers, detalle=detalle)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    consolidate(resultado).to_csv(out_dir / "escenarios_total.csv", index=False)
+    resultado.costos.to_csv(out_dir / "escenarios_costos.csv", index=False)
+    if detalle:
+        resultado.insumos.to_csv(out_dir / "escenarios_por_plan.csv", index=False)
+
+    return {
+        "lineas": len(planes),
+        "planes": len(resultado.costos) // max(len(mermas), 1),
+        "lineas_sin_bom": int((bom.productos.get_indexer(planes["Producto"]) < 0).sum()),
+    }
+
+
+def scenarios_main(argv) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m calculadora.cli escenarios",
+        description="Planes por sucursal × día (sucursal, dia, Producto, Cantidad) con varios escenarios de merma.",
+    )
+    parser.add_argument("plans", type=Path, help="CSV o Parquet de planes")
+    parser.add_argument("--out-dir", type=Path, default=Path("salida"))
+    parser.add_argument("--bom", type=Path, default=Path("data") / "bom_recetas.xlsx")
+    parser.add_argument(
+        "--merma", action="append", default=None,
+        help="Escenario de merma (repetible): 0%%, 5%%, 0.10. Default: 0%%",
+    )
+    parser.add_argument("--un-nivel", action="store_true", help="No explotar sub-recetas")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos (default: uno por CPU; 1 = en serie)")
+    parser.add_argument("--detalle", action="store_true", help="Escribir también el requerimiento por plan")
+    args = parser.parse_args(argv)
+
+    try:
+        mermas = {raw: 1.0 + parse_merma(raw) for raw in (args.merma or ["0%"])}
+    except ValueError as e:
+        parser.error(str(e))
+
+    t0 = time.perf_counter()
+    stats = run_plans(
+        args.plans, args.out_dir, args.bom, mermas, not args.un_nivel, args.workers, args.detalle
+    )
+    elapsed = time.perf_counter() - t0
+
+    print(
+        f"{stats['planes']:,} planes × {len(mermas)} escenario(s), {stats['lineas']:,} líneas "
+        f"({stats['lineas_sin_bom']:,} sin BOM) en {elapsed:.2f} s → {args.out_dir}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == "escenarios":
+        return scenarios_main(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        prog="python -m calculadora.cli",
+        description="Explota pedidos (order_id, Producto, Cantidad) contra el BOM.",
+    )
+    parser.add_argument("orders", type=Path, help="CSV o Parquet de pedidos")
+    parser.add_argument("--out-dir", type=Path, default=Path("salida"))
+    parser.add_argument("--bom", type=Path, default=Path("data") / "bom_recetas.xlsx")
+    parser.add_argument("--merma", default="0", help="Merma objetivo: 0.10, .30, 30%%")
+    parser.add_argument("--un-nivel", action="store_true", help="No explotar sub-recetas")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    try:
+        factor_merma = 1.0 + parse_merma(args.merma)
+    except ValueError as e:
+        parser.error(str(e))
+
+    t0 = time.perf_counter()
+    stats = run(args.orders, args.out_dir, args.bom, factor_merma, not args.un_nivel, args.chunksize)
+    elapsed = time.perf_counter() - t0
+
+    print(
+        f"{stats['pedidos']:,} pedidos, {stats['lineas']:,} líneas "
+        f"({stats['lineas_sin_bom']:,} sin BOM) en {elapsed:.2f} s → {args.out_dir}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Representación compacta y normalizada del BOM cargado.
+
+En el DataFrame de load_bom las columnas de cabecera (Producto, Nombre_prod,
+…) se repiten en cada renglón de componente por el ffill. Aquí el BOM se
+guarda como:
+  - cabeceras: combinaciones únicas de las columnas de texto de cabecera
+  - componentes: combinaciones únicas de COMP_KEYS (Unidad_comp categórica)
+  - aristas: arreglos int32 (cabecera, componente) y los numéricos por
+    renglón en float32 cuando la conversión no pierde precisión
+
+Pensado para vivir en st.cache_resource (una sola copia de solo lectura por
+proceso); to_frame() reconstruye las columnas que se pidan del DataFrame
+original.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from calculadora.loader import EXPECTED_COLS
+from calculadora.matrix import COMP_KEYS
+
+HEAD_KEYS = ["Producto", "Nombre_prod", "Unidad_prod", "Referencia", "Tipo_BOM"]
+EDGE_NUMS = ["Cantidad_prod", "Costo_receta", "PU", "Cantidad_comp"]
+
+
+def _compact_float(values) -> np.ndarray:
+    """float32 si el round-trip es exacto; si no, float64."""
+    values = np.asarray(values, dtype=np.float64)
+    f32 = values.astype(np.float32)
+    if np.array_equal(f32.astype(np.float64), values, equal_nan=True):
+        return f32
+    return values
+
+
+def _categorize(df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas de texto repetidas como categóricas."""
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_string_dtype(out[col]):
+            if out[col].nunique(dropna=False) < len(out):
+                out[col] = out[col].astype("category")
+    return out
+
+
+@dataclass(frozen=True)
+class CompactBom:
+    cabeceras: pd.DataFrame
+    componentes: pd.DataFrame
+    cabecera: np.ndarray
+    componente: np.ndarray
+    numericos: dict
+
+    def __len__(self) -> int:
+        return len(self.cabecera)
+
+    def to_frame(self, columns=None) -> pd.DataFrame:
+        """
+        Reconstruye (solo) las columnas pedidas del BOM en formato largo, en el
+        orden original de renglones. Las categóricas vuelven a texto.
+        """
+        columns = list(columns or EXPECTED_COLS)
+        data = {}
+        for col in columns:
+            if col in self.numericos:
+                data[col] = self.numericos[col].astype(np.float64)
+            elif col in HEAD_KEYS:
+                data[col] = self.cabeceras[col].take(self.cabecera).to_numpy()
+            elif col in COMP_KEYS:
+                data[col] = self.componentes[col].take(self.componente).to_numpy()
+            else:
+                raise KeyError(col)
+        df = pd.DataFrame(data, columns=columns)
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(df[col].cat.categories.dtype)
+        return df
+
+    def nbytes(self) -> int:
+        """Bytes en memoria (tablas con deep=True + arreglos)."""
+        total = int(self.cabeceras.memory_usage(deep=True).sum())
+        total += int(self.componentes.memory_usage(deep=True).sum())
+        total += self.cabecera.nbytes + self.componente.nbytes
+        total += sum(a.nbytes for a in self.numericos.values())
+        return total
+
+
+def compact_bom(bom_df: pd.DataFrame) -> CompactBom:
+    """
+    Normaliza la salida de load_bom. Lanza ValueError si hay más renglones de
+    los que caben en int32.
+    """
+    if len(bom_df) >= np.iinfo(np.int32).max:
+        raise ValueError("El BOM tiene demasiados renglones para índices int32.")
+
+    head_codes, cabeceras = pd.MultiIndex.from_frame(bom_df[HEAD_KEYS]).factorize()
+    comp_codes, componentes = pd.MultiIndex.from_frame(bom_df[COMP_KEYS]).factorize()
+
+    # factorize de MultiIndex devuelve object; se restauran los dtypes originales
+    cabeceras = cabeceras.to_frame(index=False, name=HEAD_KEYS).astype(bom_df[HEAD_KEYS].dtypes.to_dict())
+    componentes = componentes.to_frame(index=False, name=COMP_KEYS).astype(bom_df[COMP_KEYS].dtypes.to_dict())
+
+    return CompactBom(
+        cabeceras=_categorize(cabeceras),
+        componentes=_categorize(componentes),
+        cabecera=head_codes.astype(np.int32),
+        componente=comp_codes.astype(np.int32),
+        numericos={col: _compact_float(bom_df[col]) for col in EDGE_NUMS},
+    )
+
+
+def memory_report(bom_df: pd.DataFrame, compact: CompactBom, usuarios=(1, 10, 50)) -> pd.DataFrame:
+    """
+    Memoria del BOM como DataFrame por sesión (una copia por usuario, como
+    con st.cache_data) vs la forma compacta compartida (una sola copia).
+    """
+    por_sesion = int(bom_df.memory_usage(deep=True).sum())
+    compartido = compact.nbytes()
+    filas = []
+    for n in usuarios:
+        filas.append({
+            "Usuarios": n,
+            "DataFrame por sesión (KB)": round(por_sesion * n / 1024, 1),
+            "Compacto compartido (KB)": round(compartido / 1024, 1),
+            "Ahorro (KB)": round((por_sesion * n - compartido) / 1024, 1),
+        })
+    return pd.DataFrame(filas)
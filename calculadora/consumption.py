@@ -0,0 +1,95 @@
+"""
+Lectura en streaming del consumo real (exports de POS / inventario).
+
+El CSV se lee por bloques con solo las dos columnas necesarias y se agrega
+Cant_real por Componente sobre la marcha, así que la memoria depende del
+número de componentes distintos y no del número de movimientos.
+"""
+import pandas as pd
+
+from calculadora.core import REAL_ALIASES
+
+DEFAULT_CHUNKSIZE = 500_000
+# Cada cuántos bloques se compactan los parciales
+COMPACT_EVERY = 32
+
+
+def detect_real_columns(columns) -> dict:
+    """
+    Mapea los nombres del encabezado a Componente / Cant_real usando los alias
+    conocidos. Lanza ValueError si falta alguno.
+    """
+    encontrados = {}
+    for c in columns:
+        cl = str(c).strip().lower()
+        for target, aliases in REAL_ALIASES.items():
+            if cl in aliases:
+                encontrados[target] = c
+    if "Componente" not in encontrados or "Cant_real" not in encontrados:
+        raise ValueError("El consumo real debe tener columnas: **Componente** y **Cant_real**.")
+    return encontrados
+
+
+def _size_of(source) -> int:
+    try:
+        pos = source.tell()
+        source.seek(0, 2)
+        size = source.tell()
+        source.seek(pos)
+        return size
+    except (AttributeError, OSError):
+        return 0
+
+
+def _compact(partes: list) -> pd.Series:
+    return pd.concat(partes).groupby(level=0, sort=False).sum()
+
+
+def read_real_consumption(
+    source,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    progress=None,
+    compression: str = "infer",
+) -> pd.DataFrame:
+    """
+    Lee un CSV (ruta o archivo binario) por bloques y devuelve Componente,
+    Cant_real ya agregado. `progress(fraccion, filas)` se llama tras cada
+    bloque si se indica.
+    """
+    es_archivo = hasattr(source, "read")
+    if es_archivo:
+        source.seek(0)
+    header = pd.read_csv(source, nrows=0, compression=compression)
+    cols = detect_real_columns(header.columns)
+    if es_archivo:
+        source.seek(0)
+    size = _size_of(source) if es_archivo else 0
+
+    comp_col, cant_col = cols["Componente"], cols["Cant_real"]
+    lector = pd.read_csv(
+        source,
+        usecols=[comp_col, cant_col],
+        dtype={comp_col: str, cant_col: str},
+        chunksize=chunksize,
+        compression=compression,
+    )
+
+    partes, filas = [], 0
+    for chunk in lector:
+        comp = chunk[comp_col].astype(str).str.strip()
+        cant = pd.to_numeric(chunk[cant_col], errors="coerce").fillna(0.0)
+        partes.append(cant.groupby(comp, sort=False).sum())
+        if len(partes) >= COMPACT_EVERY:
+            partes = [_compact(partes)]
+
+        filas += len(chunk)
+        if progress is not None:
+            fraccion = min(source.tell() / size, 1.0) if size else 0.0
+            progress(fraccion, filas)
+
+    if not partes:
+        return pd.DataFrame({"Componente": pd.Series(dtype=str), "Cant_real": pd.Series(dtype=float)})
+
+    total = _compact(partes)
+    total.index.name = "Componente"
+    return total.rename("Cant_real").reset_index()
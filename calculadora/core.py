@@ -0,0 +1,199 @@
+"""
+Cálculos de la calculadora sin dependencia de Streamlit:
+merma, conversión de unidades, requerimiento, costos y KPI de merma real.
+"""
+import numpy as np
+import pandas as pd
+
+from calculadora.matrix import BomMatrix, explode
+from calculadora.units import UNITS, UnitRegistry
+
+REAL_ALIASES = {
+    "Cant_real": ["cant_real", "cantidad_real", "consumo_real", "real"],
+    "Componente": ["componente", "component", "sku", "insumo"],
+}
+
+
+def parse_merma(raw: str) -> float:
+    """
+    Acepta: '0.1', '.30', '0.30', '30%', '0,3'
+    Devuelve proporción float >= 0
+    """
+    if raw is None:
+        return 0.0
+    s = str(raw).strip()
+    if s == "":
+        return 0.0
+    s = s.replace(",", ".")
+    is_pct = False
+    if s.endswith("%"):
+        is_pct = True
+        s = s[:-1].strip()
+    if s.startswith("."):
+        s = "0" + s
+    try:
+        v = float(s)
+    except Exception:
+        raise ValueError("Merma inválida. Usa por ejemplo: 0.10, .30, 0.30, 30%")
+    if is_pct:
+        v = v / 100.0
+    if v < 0:
+        raise ValueError("La merma no puede ser negativa.")
+    return v
+
+
+def convert_to_base_units(df: pd.DataFrame, registry: UnitRegistry = UNITS) -> pd.DataFrame:
+    """
+    Convierte la cantidad final a la unidad base del registro (calculadora/units.py):
+    - masa -> kg (gr, mg, oz, lb, ...)
+    - volumen -> lt (ml, cucharada, taza, ...)
+    - conteo (Unidades, pz, ...) se mantiene igual
+    Lanza UnknownUnitError si hay unidades sin registrar.
+    Espera columnas:
+      - Unidad_comp
+      - Cant_total_comp_teorico
+      - Cant_total_comp_objetivo
+    Agrega:
+      - Unidad_final
+      - Cant_total_teorico_final
+      - Cant_total_objetivo_final
+    """
+    out = df.copy()
+
+    factor, unidad_final = registry.gather(out["Unidad_comp"])
+
+    out["Unidad_final"] = unidad_final
+    out["Cant_total_teorico_final"] = out["Cant_total_comp_teorico"].to_numpy() * factor
+    out["Cant_total_objetivo_final"] = out["Cant_total_comp_objetivo"].to_numpy() * factor
+
+    return out
+
+
+def products_table(bom_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Catálogo de productos (una fila por Producto) con costo de receta y PU.
+    """
+    return (
+        bom_df[bom_df["Tipo_BOM"].notna()][["Producto", "Nombre_prod", "Costo_receta", "PU"]]
+        .drop_duplicates(subset=["Producto", "Nombre_prod"])
+        .sort_values("Producto")
+        .reset_index(drop=True)
+    )
+
+
+def recipe_cost_vector(bom: BomMatrix, productos_df: pd.DataFrame) -> np.ndarray:
+    """
+    Costo_receta de products_table alineado con las filas de bom.
+    """
+    costo = productos_df.groupby("Producto")["Costo_receta"].first().reindex(bom.productos)
+    return costo.fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def requirements(bom: BomMatrix, pedido_df: pd.DataFrame, factor_merma: float) -> pd.DataFrame:
+    """
+    Requerimiento por componente (teórico y objetivo) convertido a kg/lt si aplica.
+    """
+    return convert_to_base_units(explode(bom, pedido_df, factor_merma))
+
+
+def order_costs(
+    pedido_df: pd.DataFrame,
+    productos_df: pd.DataFrame,
+    factor_merma: float,
+    aplicar_merma: bool = True,
+) -> tuple:
+    """
+    Costo teórico y objetivo por producto del pedido.
+    factor_merma es un escalar o una Series de factores indexada por Producto
+    (reglas de merma). Devuelve (costo_df, total_costo_teo, total_costo_obj);
+    el objetivo es NaN si no se aplica merma a costos.
+    """
+    costo_df = pedido_df.merge(
+        productos_df[["Producto", "Nombre_prod", "Costo_receta", "PU"]],
+        on="Producto",
+        how="left",
+    )
+
+    costo_df["Costo_total_teorico"] = costo_df["Cantidad_pedida"] * costo_df["Costo_receta"]
+    costo_df["PU_teorico"] = costo_df["Costo_receta"] / costo_df["PU"].replace(0, np.nan)
+
+    if aplicar_merma:
+        if isinstance(factor_merma, pd.Series):
+            factor_merma = costo_df["Producto"].map(factor_merma).to_numpy(dtype=np.float64)
+        costo_df["Costo_total_objetivo"] = costo_df["Costo_total_teorico"] * factor_merma
+        total_costo_teo = float(costo_df["Costo_total_teorico"].sum())
+        total_costo_obj = float(costo_df["Costo_total_objetivo"].sum())
+    else:
+        costo_df["Costo_total_objetivo"] = np.nan
+        total_costo_teo = float(costo_df["Costo_total_teorico"].sum())
+        total_costo_obj = np.nan
+
+    return costo_df, total_costo_teo, total_costo_obj
+
+
+def normalize_real_columns(real_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Renombra alias conocidos a Componente / Cant_real.
+    Lanza ValueError si faltan.
+    """
+    real_df = real_df.rename(columns={c: c.strip() for c in real_df.columns})
+    rename_map = {}
+    for c in real_df.columns:
+        cl = c.strip().lower()
+        for target, aliases in REAL_ALIASES.items():
+            if cl in aliases:
+                rename_map[c] = target
+    real_df = real_df.rename(columns=rename_map)
+
+    if "Componente" not in real_df.columns or "Cant_real" not in real_df.columns:
+        raise ValueError("El consumo real debe tener columnas: **Componente** y **Cant_real**.")
+    return real_df
+
+
+def aggregate_real(real_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza columnas y suma Cant_real por Componente.
+    """
+    real_df = normalize_real_columns(real_df)
+    real_df["Componente"] = real_df["Componente"].astype(str).str.strip()
+    real_df["Cant_real"] = pd.to_numeric(real_df["Cant_real"], errors="coerce").fillna(0.0)
+    return real_df.groupby("Componente", as_index=False)["Cant_real"].sum()
+
+
+def merma_kpi(resumen: pd.DataFrame, real_df: pd.DataFrame, convertir_real: bool = False) -> pd.DataFrame:
+    """
+    KPI de merma real por componente.
+    real_df: salida de aggregate_real. Si convertir_real, Cant_real viene en
+    Unidad_comp y se convierte a la misma base que Unidad_final.
+    """
+    kpi_df = resumen.merge(real_df, on="Componente", how="left")
+    kpi_df["Cant_real"] = kpi_df["Cant_real"].fillna(0.0)
+
+    if convertir_real:
+        factor, _ = UNITS.gather(kpi_df["Unidad_comp"])
+        kpi_df["Cant_real_final"] = kpi_df["Cant_real"].to_numpy() * factor
+    else:
+        kpi_df["Cant_real_final"] = kpi_df["Cant_real"]
+
+    denom = kpi_df["Cant_total_teorico_final"].replace(0, np.nan)
+    kpi_df["Merma_real_pct"] = (kpi_df["Cant_real_final"] - kpi_df["Cant_total_teorico_final"]) / denom
+    kpi_df["Gap_vs_teorico"] = kpi_df["Cant_real_final"] - kpi_df["Cant_total_teorico_final"]
+    kpi_df["Gap_vs_objetivo"] = kpi_df["Cant_real_final"] - kpi_df["Cant_total_objetivo_final"]
+    return kpi_df
+
+
+def kpi_totals(kpi_df: pd.DataFrame) -> dict:
+    """
+    Totales globales del KPI: teórico, real, objetivo, merma global y gap vs objetivo.
+    """
+    total_teo = float(kpi_df["Cant_total_teorico_final"].sum())
+    total_real = float(kpi_df["Cant_real_final"].sum())
+    total_obj = float(kpi_df["Cant_total_objetivo_final"].sum())
+
+    return {
+        "total_teo": total_teo,
+        "total_real": total_real,
+        "total_obj": total_obj,
+        "merma_global": (total_real - total_teo) / (total_teo if total_teo != 0 else np.nan),
+        "gap_global_obj": total_real - total_obj,
+    }
@@ -0,0 +1,125 @@
+"""
+Costo de receta desde precios por componente.
+
+En el Excel, PU es el costo de cada renglón (Σ PU ≈ Costo_receta), así que
+PU / Cantidad_comp da el precio unitario implícito de cada componente. Ese
+precio base se puede sobrescribir con un archivo local de precios
+(data/precios_insumos.csv). Con el BOM aplanado (sub-recetas ya explotadas
+a insumos crudos), el costo de todo el catálogo es un solo producto
+matriz–vector:  costo = F · p
+y el desglose por componente de un producto es su fila de F ⊙ p.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculadora.matrix import COMP_KEYS, BomMatrix
+from calculadora.units import UNITS
+
+PRICE_ALIASES = {
+    "Componente": {"componente", "component", "insumo", "sku", "codigo", "código"},
+    "Precio": {"precio", "precio_unitario", "price", "costo_unitario"},
+    "Unidad_precio": {"unidad_precio", "unidad", "unit"},
+}
+
+
+def workbook_prices(bom: BomMatrix, bom_df: pd.DataFrame) -> np.ndarray:
+    """
+    Precio por Unidad_comp implícito en el Excel (mediana de PU / Cantidad_comp),
+    alineado con bom.componentes. NaN si el componente no tiene renglones con cantidad.
+    """
+    df = bom_df.loc[bom_df["Cantidad_comp"] > 0, [*COMP_KEYS, "PU", "Cantidad_comp"]]
+    unit = (
+        df.assign(Precio=df["PU"] / df["Cantidad_comp"])
+        .groupby(COMP_KEYS, as_index=False)["Precio"]
+        .median()
+    )
+    comps = bom.componentes[COMP_KEYS].astype({"Unidad_comp": str})
+    return comps.merge(unit, on=COMP_KEYS, how="left")["Precio"].to_numpy(dtype=np.float64)
+
+
+def read_price_file(source) -> pd.DataFrame:
+    """
+    Lee el archivo de precios (Componente, Precio y opcionalmente Unidad_precio).
+    """
+    precios = pd.read_csv(source)
+    rename = {}
+    for c in precios.columns:
+        cl = str(c).strip().lower()
+        for target, aliases in PRICE_ALIASES.items():
+            if cl in aliases or c == target:
+                rename[c] = target
+    precios = precios.rename(columns=rename)
+    if "Componente" not in precios.columns or "Precio" not in precios.columns:
+        raise ValueError("El archivo de precios debe tener columnas: **Componente** y **Precio**.")
+    precios["Componente"] = precios["Componente"].astype(str).str.strip()
+    precios["Precio"] = pd.to_numeric(precios["Precio"], errors="coerce")
+    return precios.dropna(subset=["Precio"]).drop_duplicates("Componente", keep="last")
+
+
+def price_vector(bom: BomMatrix, precios_df: pd.DataFrame = None, base: np.ndarray = None) -> np.ndarray:
+    """
+    Precio por Unidad_comp alineado con bom.componentes.
+    precios_df trae Precio por Unidad_precio (si falta, por la unidad final
+    kg/lt/unidades del componente); lo que no venga se toma de `base`.
+    Si un Componente aparece con unidades de otra dimensión (p. ej. gr y ml),
+    el precio solo se aplica a las columnas compatibles con Unidad_precio.
+    """
+    factor_comp, destino = UNITS.gather(bom.componentes["Unidad_comp"])
+    precio = np.full(len(bom.componentes), np.nan) if base is None else np.array(base, dtype=np.float64)
+    if precios_df is None or precios_df.empty:
+        return precio
+
+    # Un mismo Componente puede aparecer en varias columnas (distinta unidad o nombre)
+    pos = (
+        bom.componentes[["Componente"]].astype(str).reset_index(names="col")
+        .merge(precios_df, on="Componente")
+    )
+    col = pos["col"].to_numpy()
+    valor = pos["Precio"].to_numpy(dtype=np.float64, copy=True)
+
+    ok = np.ones(len(pos), dtype=bool)
+    if "Unidad_precio" in pos.columns and pos["Unidad_precio"].notna().any():
+        con_unidad = pos["Unidad_precio"].notna().to_numpy()
+        f_precio, d_precio = UNITS.gather(pos.loc[con_unidad, "Unidad_precio"].astype(str))
+        ok[con_unidad] = d_precio == destino[col[con_unidad]]
+        # precio por unidad final = precio / factor(unidad_precio)
+        valor[con_unidad] = valor[con_unidad] / f_precio
+
+    precio[col[ok]] = valor[ok] * factor_comp[col[ok]]
+    return precio
+
+
+def rollup_costs(bom: BomMatrix, precio: np.ndarray) -> np.ndarray:
+    """Costo por unidad de cada producto: F · p (precios faltantes cuentan 0)."""
+    return bom.matriz @ np.nan_to_num(precio)
+
+
+def missing_prices(bom: BomMatrix, precio: np.ndarray) -> pd.DataFrame:
+    """Componentes usados por el BOM que no tienen precio."""
+    usados = np.diff(bom.matriz_t.indptr) > 0
+    return bom.componentes[usados & np.isnan(precio)].reset_index(drop=True)
+
+
+def cost_breakdown(bom: BomMatrix, precio: np.ndarray, productos) -> pd.DataFrame:
+    """
+    Desglose por componente de los productos dados (una fila por producto ×
+    componente): cantidad por unidad, precio, costo y participación.
+    """
+    filas = bom.productos.get_indexer(pd.Index(productos))
+    filas = filas[filas >= 0]
+    sub = bom.matriz[filas].tocoo()
+
+    df = bom.componentes.iloc[sub.col].reset_index(drop=True)
+    df.insert(0, "Producto", bom.productos[filas][sub.row])
+    df["Cantidad_por_unidad"] = sub.data
+    df["Precio_unitario"] = precio[sub.col]
+    df["Costo"] = sub.data * np.nan_to_num(precio[sub.col])
+    total = df.groupby("Producto")["Costo"].transform("sum")
+    df["Participacion"] = df["Costo"] / total.replace(0, np.nan)
+    return df.sort_values(["Producto", "Costo"], ascending=[True, False]).reset_index(drop=True)
+
+
+def default_price_path(data_path: Path) -> Path:
+    return data_path.parent / "precios_insumos.csv"
@@ -0,0 +1,170 @@
+"""
+Instrumentación por etapa de cada rerun: tiempo, pico de memoria
+(tracemalloc) y filas procesadas.
+
+Cada rerun produce un reporte que se emite como una línea JSON en el logger
+"calculadora.diagnostics". Si la variable de entorno CALCULADORA_DIAG_LOG
+apunta a un archivo, las líneas se agregan ahí (JSON Lines) para comparar
+reruns en el tiempo.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+logger = logging.getLogger("calculadora.diagnostics")
+LOG_ENV = "CALCULADORA_DIAG_LOG"
+
+# tracemalloc es de todo el proceso y lo comparten las sesiones: se cuenta
+# cuántos perfiladores lo usan y solo el último en soltarlo lo detiene, y
+# solo si lo arrancó este módulo (no si ya venía activo, p. ej. -X tracemalloc).
+_TRACE_LOCK = threading.Lock()
+_trace_users = 0
+_trace_started = False
+
+
+def _acquire_tracing() -> None:
+    global _trace_users, _trace_started
+    with _TRACE_LOCK:
+        if _trace_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _trace_started = True
+        _trace_users += 1
+
+
+def _release_tracing() -> None:
+    global _trace_users, _trace_started
+    with _TRACE_LOCK:
+        _trace_users -= 1
+        if _trace_users == 0 and _trace_started:
+            tracemalloc.stop()
+            _trace_started = False
+
+
+def configure_json_log(path: str = None) -> None:
+    """
+    Agrega (una sola vez) un FileHandler JSON Lines al logger de diagnóstico.
+    Sin path, usa CALCULADORA_DIAG_LOG; si tampoco existe, no hace nada.
+    """
+    path = path or os.environ.get(LOG_ENV)
+    if not path:
+        return
+    for h in logger.handlers:
+        if isinstance(h, logging.FileHandler) and h.baseFilename == os.path.abspath(path):
+            return
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Stage:
+    """Resultado de una etapa; `rows` se puede fijar dentro del with."""
+
+    __slots__ = ("name", "ms", "peak_kb", "rows")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ms = 0.0
+        self.peak_kb = None
+        self.rows = None
+
+    def as_dict(self) -> dict:
+        return {"stage": self.name, "ms": round(self.ms, 3), "peak_kb": self.peak_kb, "rows": self.rows}
+
+
+class Profiler:
+    """
+    Perfilador de un rerun. Con memory=True usa tracemalloc para el pico de
+    memoria por etapa (tiene costo; solo activarlo desde el panel). El trazo
+    se suelta en emit() o, si el rerun se corta antes, cuando el perfilador
+    se recolecta. Con varias sesiones midiendo a la vez, el pico de una etapa
+    incluye lo que asignen las otras.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = datetime.now(timezone.utc)
+        self.memory = memory
+        self.stages = []
+        self._t0 = time.perf_counter()
+        self._release = None
+        if memory:
+            _acquire_tracing()
+            self._release = weakref.finalize(self, _release_tracing)
+
+    def close(self) -> None:
+        """Suelta tracemalloc (idempotente); las etapas posteriores no miden memoria."""
+        if self._release is not None:
+            self._release()
+        self.memory = False
+
+    @contextmanager
+    def stage(self, name: str, rows: int = None):
+        s = Stage(name)
+        s.rows = rows
+        medir = self.memory
+        if medir:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.ms = (time.perf_counter() - t0) * 1000
+            if medir and tracemalloc.is_tracing():
+                s.peak_kb = round((tracemalloc.get_traced_memory()[1] - base) / 1024, 1)
+            self.stages.append(s)
+
+    def timed(self, name: str = None):
+        """Decorador: mide cada llamada como una etapa."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or fn.__name__):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def report(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "ts": self.started.isoformat(timespec="seconds"),
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "memory": self.memory,
+            "stages": [s.as_dict() for s in self.stages],
+        }
+
+    def emit(self) -> dict:
+        """Emite el reporte como una línea JSON y lo devuelve."""
+        rep = self.report()
+        self.close()
+        logger.info(json.dumps(rep, ensure_ascii=False))
+        return rep
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame([s.as_dict() for s in self.stages], columns=["stage", "ms", "peak_kb", "rows"])
+
+
+def history_frame(reports: list) -> pd.DataFrame:
+    """
+    Reruns anteriores como tabla: una fila por rerun, una columna (ms) por etapa.
+    """
+    if not reports:
+        return pd.DataFrame()
+    filas = []
+    for rep in reports:
+        fila = {"ts": rep["ts"], "total_ms": rep["total_ms"]}
+        fila.update({s["stage"]: s["ms"] for s in rep["stages"]})
+        filas.append(fila)
+    return pd.DataFrame(filas)
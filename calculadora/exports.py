@@ -0,0 +1,170 @@
+"""
+Exportación diferida de resultados (XLSX multi-hoja, Parquet, CSV.gz, CSV).
+
+Las descargas se generan solo cuando se piden: el botón recibe una función
+que arma las tablas, calcula un hash del contenido y busca el archivo en una
+caché LRU por (hash, formato). Si no está, lo escribe un ThreadPoolExecutor
+(fuera del hilo del script; dos clics simultáneos esperan el mismo Future).
+
+El XLSX se escribe con xlsxwriter en modo constant_memory (renglón por
+renglón, cada hoja pasa por un archivo temporal), así que la memoria no
+crece con el tamaño del libro. Una tabla con más renglones de los que caben
+en una hoja de Excel se reparte en varias hojas ("kpi (1)", "kpi (2)", …).
+"""
+import gzip
+import hashlib
+import io
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+
+import pandas as pd
+import xlsxwriter
+
+FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("parquet.zip", "application/zip"),
+    "csv.gz": ("csv.zip", "application/zip"),
+    "csv": ("csv", "text/csv"),
+}
+MAX_CACHED = 16
+# Nombres de hoja: máx. 31 caracteres y sin []:*?/\ (regla de Excel)
+_BAD_SHEET_CHARS = str.maketrans({c: "_" for c in "[]:*?/\\"})
+# Renglones por hoja de Excel, encabezado incluido
+XLSX_MAX_ROWS = 1_048_576
+
+
+def frames_digest(frames: dict) -> str:
+    """sha256 de nombres, columnas, dtypes y contenido de las tablas."""
+    h = hashlib.sha256()
+    for nombre, df in frames.items():
+        h.update(str(nombre).encode())
+        h.update(repr(list(map(str, df.columns))).encode())
+        h.update(repr([str(t) for t in df.dtypes]).encode())
+        h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _cell_rows(df: pd.DataFrame):
+    """Renglones como listas de valores de Python (NaN → celda vacía)."""
+    cols = []
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_datetime64_any_dtype(s):
+            s = s.dt.strftime("%Y-%m-%d %H:%M:%S")
+        arr = s.to_numpy(dtype=object)
+        arr[pd.isna(arr)] = None
+        cols.append(arr)
+    for fila in zip(*cols):
+        yield fila
+
+
+def write_xlsx(frames: dict, max_rows: int = XLSX_MAX_ROWS) -> bytes:
+    """
+    Una hoja por tabla (o varias si no cabe en max_rows). ±inf se escribe
+    como error de Excel (#DIV/0!) en lugar de tumbar el libro.
+    """
+    buf = io.BytesIO()
+    wb = xlsxwriter.Workbook(buf, {"constant_memory": True, "strings_to_numbers": False, "nan_inf_to_errors": True})
+    negrita = wb.add_format({"bold": True})
+    por_hoja = max_rows - 1
+    for nombre, df in frames.items():
+        base = str(nombre).translate(_BAD_SHEET_CHARS)
+        partes = max(1, -(-len(df) // por_hoja))
+        filas = _cell_rows(df)
+        for k in range(1, partes + 1):
+            sufijo = f" ({k})" if partes > 1 else ""
+            ws = wb.add_worksheet(base[:31 - len(sufijo)] + sufijo)
+            ws.write_row(0, 0, [str(c) for c in df.columns], negrita)
+            for r, fila in enumerate(islice(filas, por_hoja), start=1):
+                if ws.write_row(r, 0, fila) == -1:
+                    raise ValueError(f"No pude escribir el renglón {r} de la hoja '{ws.name}'.")
+    wb.close()
+    return buf.getvalue()
+
+
+def write_parquet_zip(frames: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for nombre, df in frames.items():
+            parte = io.BytesIO()
+            df.to_parquet(parte, index=False)
+            zf.writestr(f"{nombre}.parquet", parte.getvalue())
+    return buf.getvalue()
+
+
+def write_csv_gz_zip(frames: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for nombre, df in frames.items():
+            zf.writestr(f"{nombre}.csv.gz", gzip.compress(df.to_csv(index=False).encode("utf-8-sig"), 6))
+    return buf.getvalue()
+
+
+def write_csv(frames: dict) -> bytes:
+    """CSV (utf-8-sig, para Excel) de la única tabla."""
+    (df,) = frames.values()
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+WRITERS = {
+    "xlsx": write_xlsx,
+    "parquet": write_parquet_zip,
+    "csv.gz": write_csv_gz_zip,
+    "csv": write_csv,
+}
+
+
+class ExportCache:
+    """
+    Caché de archivos exportados por (hash del contenido, formato), generados
+    en hilos de fondo. Compartida entre sesiones (st.cache_resource).
+    """
+
+    def __init__(self, max_items: int = MAX_CACHED, workers: int = 2):
+        self.max_items = max_items
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export")
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self.hits = 0
+        self.builds = 0
+
+    def submit(self, fmt: str, frames: dict) -> Future:
+        """Future con los bytes del archivo; reutiliza uno igual si ya existe."""
+        if fmt not in WRITERS:
+            raise ValueError(f"Formato de exportación desconocido: {fmt}")
+        frames = {k: v for k, v in frames.items() if v is not None}
+        key = (frames_digest(frames), fmt)
+        with self._lock:
+            fut = self._items.get(key)
+            if fut is not None and not (fut.done() and fut.exception() is not None):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return fut
+            fut = self._pool.submit(WRITERS[fmt], frames)
+            self.builds += 1
+            self._items[key] = fut
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return fut
+
+    def get(self, fmt: str, frames: dict) -> bytes:
+        return self.submit(fmt, frames).result()
+
+    def deferred(self, fmt: str, build_frames):
+        """
+        Función sin argumentos para st.download_button(data=...): arma las
+        tablas con build_frames() solo al hacer clic y devuelve los bytes.
+        """
+        return lambda: self.get(fmt, build_frames())
+
+
+def file_name(base: str, fmt: str) -> str:
+    return f"{base}.{FORMATS[fmt][0]}"
+
+
+def mime_type(fmt: str) -> str:
+    return FORMATS[fmt][1]
+
@@ -0,0 +1,292 @@
+"""
+Proyección de requerimientos a partir de un pronóstico de demanda.
+
+El historial de ventas (Fecha, Producto, Cantidad; CSV o Parquet) se
+acomoda en una matriz días × productos Y. Los métodos de pronóstico se
+ajustan a todos los SKU a la vez: el ciclo es sobre los días y cada paso
+opera sobre vectores de productos (y sobre la rejilla completa de
+parámetros, de la que se elige el mejor por SKU). El pronóstico F
+(horizonte × productos) pasa por el BOM en un solo producto disperso:
+    R = F · M      (días × componentes)
+y después se aplican el factor de unidades y la merma.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculadora.matrix import COMP_KEYS, BomMatrix
+from calculadora.units import UNITS
+
+SALES_ALIASES = {
+    "Fecha": {"fecha", "date", "dia", "día", "day"},
+    "Producto": {"producto", "product", "sku", "codigo", "código"},
+    "Cantidad": {"cantidad", "cantidad_vendida", "unidades", "vendidos", "ventas", "qty"},
+}
+METHODS = {
+    "auto": "Automático (mejor por SKU)",
+    "naive_estacional": "Ingenuo estacional",
+    "suavizado": "Suavizado exponencial simple",
+    "holt_winters": "Suavizado con estacionalidad (Holt-Winters aditivo)",
+}
+SEASON = 7
+DEFAULT_HORIZON = 14
+# Rejillas de parámetros: se prueban todas a la vez y se elige la de menor
+# error un paso adelante por SKU
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+GAMMAS = np.array([0.05, 0.1, 0.2, 0.4])
+
+
+@dataclass(frozen=True)
+class Forecast:
+    """
+    Pronóstico por producto:
+      - fechas: días del horizonte
+      - productos: códigos de Producto (columnas de valores)
+      - valores: matriz horizonte × productos (>= 0)
+      - metodo: método usado por producto
+      - mae: error absoluto medio diario en la validación (NaN sin validación)
+    """
+    fechas: pd.DatetimeIndex
+    productos: pd.Index
+    valores: np.ndarray
+    metodo: np.ndarray
+    mae: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """Formato largo: Fecha, Producto, Pronostico."""
+        h, n = self.valores.shape
+        return pd.DataFrame({
+            "Fecha": np.repeat(self.fechas.to_numpy(), n),
+            "Producto": np.tile(self.productos.to_numpy(), h),
+            "Pronostico": self.valores.ravel(),
+        })
+
+
+def read_sales(source) -> pd.DataFrame:
+    """
+    Lee el historial de ventas (ruta o archivo subido; Parquet si el nombre
+    termina en .parquet, si no CSV) y devuelve Fecha, Producto, Cantidad.
+    """
+    nombre = str(getattr(source, "name", source))
+    ventas = pd.read_parquet(source) if Path(nombre).suffix.lower() == ".parquet" else pd.read_csv(source)
+
+    rename = {}
+    for c in ventas.columns:
+        cl = str(c).strip().lower()
+        for target, aliases in SALES_ALIASES.items():
+            if cl in aliases or c == target:
+                rename[c] = target
+    ventas = ventas.rename(columns=rename)
+    if not {"Fecha", "Producto", "Cantidad"} <= set(ventas.columns):
+        raise ValueError("El historial de ventas debe tener columnas: **Fecha**, **Producto** y **Cantidad**.")
+
+    ventas = pd.DataFrame({
+        "Fecha": pd.to_datetime(ventas["Fecha"], errors="coerce").dt.normalize(),
+        "Producto": ventas["Producto"].astype(str).str.strip(),
+        "Cantidad": pd.to_numeric(ventas["Cantidad"], errors="coerce"),
+    })
+    return ventas.dropna(subset=["Fecha", "Cantidad"]).reset_index(drop=True)
+
+
+def sales_matrix(ventas: pd.DataFrame) -> tuple:
+    """
+    (fechas, productos, Y): Y es días × productos con la venta diaria; los
+    días sin venta de un producto (y los días sin ninguna venta dentro del
+    rango) cuentan 0.
+    """
+    if ventas.empty:
+        raise ValueError("El historial de ventas está vacío.")
+    prod_codes, productos = pd.factorize(ventas["Producto"])
+    inicio = ventas["Fecha"].min()
+    dia = ((ventas["Fecha"] - inicio) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+    n_dias, n_prod = int(dia.max()) + 1, len(productos)
+    plano = np.bincount(
+        dia * n_prod + prod_codes,
+        weights=ventas["Cantidad"].to_numpy(dtype=np.float64),
+        minlength=n_dias * n_prod,
+    )
+    fechas = pd.date_range(inicio, periods=n_dias, freq="D")
+    return fechas, pd.Index(productos), plano.reshape(n_dias, n_prod)
+
+
+# =========================
+# Métodos (vectorizados sobre productos)
+# =========================
+def seasonal_naive(Y: np.ndarray, horizonte: int, periodo: int = SEASON) -> np.ndarray:
+    """Repite la última temporada completa (el último valor si hay menos días que el periodo)."""
+    n_dias = Y.shape[0]
+    if n_dias < periodo:
+        return np.repeat(Y[-1:], horizonte, axis=0)
+    return Y[n_dias - periodo + np.arange(horizonte) % periodo]
+
+
+def exp_smoothing(Y: np.ndarray, horizonte: int, alphas: np.ndarray = ALPHAS) -> np.ndarray:
+    """
+    Suavizado exponencial simple. Corre todos los alphas a la vez (alphas ×
+    productos) y usa, por producto, el de menor error cuadrático un paso adelante.
+    """
+    a = alphas[:, None]
+    nivel = np.repeat(Y[:1], len(alphas), axis=0)
+    sse = np.zeros_like(nivel)
+    for y in Y[1:]:
+        e = y - nivel
+        sse += e * e
+        nivel += a * e
+
+    mejor = np.argmin(sse, axis=0)
+    final = nivel[mejor, np.arange(Y.shape[1])]
+    return np.repeat(final[None, :], horizonte, axis=0)
+
+
+def holt_winters(
+    Y: np.ndarray,
+    horizonte: int,
+    periodo: int = SEASON,
+    alphas: np.ndarray = ALPHAS,
+    gammas: np.ndarray = GAMMAS,
+) -> np.ndarray:
+    """
+    Holt-Winters aditivo sin tendencia (nivel + estacionalidad). La rejilla
+    alpha × gamma se ajusta completa en paralelo sobre todos los productos.
+    Con menos de dos temporadas de historia cae a suavizado simple.
+    """
+    n_dias, n_prod = Y.shape
+    if n_dias < 2 * periodo:
+        return exp_smoothing(Y, horizonte, alphas)
+
+    a = np.repeat(alphas, len(gammas))[:, None]
+    g = np.tile(gammas, len(alphas))[:, None]
+    k = len(a)
+
+    base = Y[:periodo].mean(axis=0)
+    nivel = np.repeat(base[None, :], k, axis=0)
+    estacion = np.repeat((Y[:periodo] - base)[:, None, :], k, axis=1)  # periodo × k × productos
+    sse = np.zeros_like(nivel)
+    for t in range(periodo, n_dias):
+        j = t % periodo
+        e = Y[t] - (nivel + estacion[j])
+        sse += e * e
+        nivel += a * e
+        estacion[j] += g * (1.0 - a) * e
+
+    mejor = np.argmin(sse, axis=0)
+    cols = np.arange(n_prod)
+    dias = (n_dias + np.arange(horizonte)) % periodo
+    return nivel[mejor, cols][None, :] + estacion[dias][:, mejor, cols]
+
+
+_FITTERS = {
+    "naive_estacional": lambda Y, h, m: seasonal_naive(Y, h, m),
+    "suavizado": lambda Y, h, m: exp_smoothing(Y, h),
+    "holt_winters": lambda Y, h, m: holt_winters(Y, h, m),
+}
+
+
+def fit_forecast(
+    fechas: pd.DatetimeIndex,
+    productos: pd.Index,
+    Y: np.ndarray,
+    horizonte: int = DEFAULT_HORIZON,
+    metodo: str = "auto",
+    periodo: int = SEASON,
+) -> Forecast:
+    """
+    Pronostica `horizonte` días para todos los productos de Y.
+    Con metodo="auto" se reservan las últimas dos temporadas como validación,
+    se elige por producto el método de menor MAE y se reajusta con toda la
+    historia.
+    """
+    if metodo != "auto" and metodo not in _FITTERS:
+        raise ValueError(f"Método de pronóstico desconocido: {metodo}")
+    n_dias, n_prod = Y.shape
+    validacion = 2 * periodo
+    candidatos = list(_FITTERS) if metodo == "auto" else [metodo]
+
+    mae = np.full((len(candidatos), n_prod), np.nan)
+    if n_dias > 2 * validacion:
+        real = Y[-validacion:]
+        for i, m in enumerate(candidatos):
+            mae[i] = np.abs(_FITTERS[m](Y[:-validacion], validacion, periodo) - real).mean(axis=0)
+
+    if len(candidatos) == 1:
+        elegido = np.zeros(n_prod, dtype=np.int64)
+    else:
+        # Sin validación posible, Holt-Winters (o su respaldo) para todos
+        elegido = (
+            np.argmin(mae, axis=0) if not np.isnan(mae).all()
+            else np.full(n_prod, candidatos.index("holt_winters"))
+        )
+
+    valores = np.empty((horizonte, n_prod))
+    for i, m in enumerate(candidatos):
+        cols = np.flatnonzero(elegido == i)
+        if cols.size:
+            valores[:, cols] = _FITTERS[m](Y[:, cols], horizonte, periodo)
+
+    return Forecast(
+        fechas=pd.date_range(fechas[-1] + pd.Timedelta(days=1), periods=horizonte, freq="D"),
+        productos=productos,
+        valores=np.clip(valores, 0.0, None),
+        metodo=np.array(candidatos, dtype=object)[elegido],
+        mae=mae[elegido, np.arange(n_prod)],
+    )
+
+
+# =========================
+# Proyección por el BOM
+# =========================
+def project_requirements(bom: BomMatrix, pronostico: Forecast, factor_merma: float = 1.0) -> pd.DataFrame:
+    """
+    Requerimiento diario por componente del horizonte pronosticado:
+    Fecha + COMP_KEYS + Unidad_final + Cant_total_teorico_final +
+    Cant_total_objetivo_final (solo componentes con requerimiento).
+    Productos sin BOM se ignoran (ver products_without_bom).
+    """
+    filas = bom.productos.get_indexer(pronostico.productos)
+    ok = filas >= 0
+    # Un solo producto disperso × denso: (componentes × productos) · (productos × días)
+    teorico = bom.matriz_t[:, filas[ok]] @ pronostico.valores[:, ok].T
+
+    factor, destino = UNITS.gather(bom.componentes["Unidad_comp"])
+    teorico *= factor[:, None]
+    comp, dia = np.nonzero(teorico)
+
+    df = bom.componentes.iloc[comp].reset_index(drop=True)
+    df.insert(0, "Fecha", pronostico.fechas[dia])
+    df["Unidad_final"] = destino[comp]
+    df["Cant_total_teorico_final"] = teorico[comp, dia]
+    df["Cant_total_objetivo_final"] = df["Cant_total_teorico_final"] * factor_merma
+    return df.sort_values(["Fecha", "Nombre_comp"], kind="stable").reset_index(drop=True)
+
+
+def requirement_totals(diario: pd.DataFrame) -> pd.DataFrame:
+    """Total del horizonte y pico diario por componente."""
+    return (
+        diario.groupby([*COMP_KEYS, "Unidad_final"], observed=True, as_index=False)
+        .agg(
+            Cant_total_teorico_final=("Cant_total_teorico_final", "sum"),
+            Cant_total_objetivo_final=("Cant_total_objetivo_final", "sum"),
+            Pico_diario_objetivo=("Cant_total_objetivo_final", "max"),
+        )
+        .sort_values("Nombre_comp", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def forecast_summary(pronostico: Forecast, Y: np.ndarray) -> pd.DataFrame:
+    """Una fila por producto: método, venta diaria histórica, pronóstico y error."""
+    return pd.DataFrame({
+        "Producto": pronostico.productos,
+        "Metodo": pronostico.metodo,
+        "Venta_diaria_hist": Y.mean(axis=0),
+        "Pronostico_diario": pronostico.valores.mean(axis=0),
+        "Pronostico_total": pronostico.valores.sum(axis=0),
+        "MAE_validacion": pronostico.mae,
+    })
+
+
+def products_without_bom(bom: BomMatrix, pronostico: Forecast) -> pd.Index:
+    return pronostico.productos[bom.productos.get_indexer(pronostico.productos) < 0]
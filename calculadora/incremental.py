@@ -0,0 +1,91 @@
+"""
+Totales incrementales del pedido (para st.session_state).
+
+Guarda el vector de cantidades pedidas, el teórico por componente y el
+costo teórico total. Cuando cambia una cantidad solo se aplica
+(nueva − anterior) × la fila del BOM de ese producto, en lugar de
+re-explotar todo el pedido. La merma se aplica al leer, así que cambiarla
+no requiere recálculo.
+"""
+import numpy as np
+import pandas as pd
+
+from calculadora.matrix import BomMatrix, summary_frame
+
+
+class IncrementalTotals:
+    """
+    Totales por componente y costo del pedido actual, actualizados por delta.
+    """
+
+    def __init__(self, bom: BomMatrix, costo_receta: np.ndarray):
+        n_prod, n_comp = bom.shape
+        self.bom = bom
+        self.costo_receta = np.asarray(costo_receta, dtype=np.float64)
+        self.q = np.zeros(n_prod, dtype=np.float64)
+        self.teorico = np.zeros(n_comp, dtype=np.float64)
+        # Cuántos productos pedidos (q > 0) usan cada componente
+        self.tocados = np.zeros(n_comp, dtype=np.int64)
+        self.costo_teo = 0.0
+        self.actualizaciones = 0
+
+    def apply(self, pedido_df: pd.DataFrame) -> int:
+        """
+        Lleva los totales al pedido dado aplicando solo los cambios.
+        Devuelve cuántos productos cambiaron.
+        """
+        q_new = self.bom.order_vector(pedido_df)
+        cambiados = np.flatnonzero(q_new != self.q)
+        if cambiados.size == 0:
+            return 0
+
+        delta = q_new[cambiados] - self.q[cambiados]
+        filas = self.bom.matriz[cambiados]
+        self.teorico += filas.T @ delta
+        self.costo_teo += float(delta @ self.costo_receta[cambiados])
+
+        # Productos que entran (0 → >0) o salen (>0 → 0) del pedido
+        entra = (self.q[cambiados] == 0) & (q_new[cambiados] > 0)
+        sale = (self.q[cambiados] > 0) & (q_new[cambiados] == 0)
+        for mask, signo in ((entra, 1), (sale, -1)):
+            if mask.any():
+                np.add.at(self.tocados, filas[np.flatnonzero(mask)].indices, signo)
+
+        self.q = q_new
+        self.actualizaciones += 1
+
+        # Sin deriva de punto flotante en componentes/pedidos que quedaron vacíos
+        self.teorico[self.tocados == 0] = 0.0
+        if not self.q.any():
+            self.costo_teo = 0.0
+        return int(cambiados.size)
+
+    def summary(self, factor_merma: float = 1.0) -> pd.DataFrame:
+        """
+        Resumen por componente con el mismo formato que explode().
+        """
+        return summary_frame(self.bom, self.teorico, self.tocados > 0, factor_merma)
+
+    def costs(self, factor_merma: float, aplicar_merma: bool = True) -> tuple:
+        """
+        (total_costo_teo, total_costo_obj) como en order_costs. factor_merma
+        puede ser un vector por producto alineado con bom.productos.
+        """
+        if not aplicar_merma:
+            return self.costo_teo, np.nan
+        if np.ndim(factor_merma):
+            return self.costo_teo, float(self.q @ (self.costo_receta * factor_merma))
+        return self.costo_teo, self.costo_teo * factor_merma
+
+    def max_abs_diff(self) -> float:
+        """
+        Diferencia máxima contra un recálculo completo (teórico y costo).
+        Devuelve inf si no coinciden los componentes tocados.
+        """
+        tocados = (self.bom.patron_t @ (self.q > 0).astype(np.float64)) > 0
+        if not np.array_equal(tocados, self.tocados > 0):
+            return float("inf")
+        teorico = self.bom.matriz_t @ self.q
+        costo = float(self.q @ self.costo_receta)
+        diff = np.abs(teorico - self.teorico).max(initial=0.0)
+        return float(max(diff, abs(costo - self.costo_teo)))
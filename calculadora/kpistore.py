@@ -0,0 +1,204 @@
+"""
+Histórico de KPI de merma en Parquet particionado, con rollups incrementales.
+
+Cada cálculo guardado se escribe en raw/fecha=AAAA-MM-DD/sucursal=<s>/kpi.parquet
+(una partición por fecha y sucursal; volver a guardar la misma la reemplaza).
+Además se mantienen tres rollups pequeños (día, semana, mes) con las sumas
+de teórico, objetivo y real por periodo × sucursal × componente. Al guardar
+solo se suma el lote nuevo (y se resta la partición reemplazada, si había),
+así que las gráficas de tendencia leen los rollups y nunca re-escanean raw/.
+"""
+import os
+import threading
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+GRAINS = ("dia", "semana", "mes")
+ROLLUP_KEYS = ["periodo", "sucursal", "Componente", "Unidad_final"]
+SUM_COLS = ["teorico", "objetivo", "real"]
+
+RAW_COLS = [
+    "fecha",
+    "sucursal",
+    "Componente",
+    "Nombre_comp",
+    "Unidad_final",
+    "teorico",
+    "objetivo",
+    "real",
+]
+
+
+# Un candado por directorio: el store se comparte entre sesiones (cache_resource)
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _store_lock(root: Path) -> threading.Lock:
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(Path(root).resolve(), threading.Lock())
+
+
+def default_store_dir(data_path: Path) -> Path:
+    return data_path.parent / "kpi_store"
+
+
+def period_start(fechas: pd.Series, grain: str) -> pd.Series:
+    """Inicio del periodo: el día, el lunes de la semana o el día 1 del mes."""
+    fechas = pd.to_datetime(fechas).dt.normalize()
+    if grain == "dia":
+        return fechas
+    if grain == "semana":
+        return fechas - pd.to_timedelta(fechas.dt.weekday, unit="D")
+    if grain == "mes":
+        return fechas - pd.to_timedelta(fechas.dt.day - 1, unit="D")
+    raise ValueError(f"Granularidad desconocida: {grain}")
+
+
+def kpi_records(kpi_df: pd.DataFrame, fecha, sucursal: str, bom_version: str = None) -> pd.DataFrame:
+    """
+    Renglones para el histórico a partir de la salida de merma_kpi.
+    bom_version (p. ej. BomSnapshot.tag) queda en la partición cruda junto a
+    cada renglón; los rollups no lo usan.
+    """
+    records = pd.DataFrame({
+        "fecha": pd.Timestamp(fecha).normalize(),
+        "sucursal": str(sucursal).strip() or "General",
+        "Componente": kpi_df["Componente"].astype(str).to_numpy(),
+        "Nombre_comp": kpi_df["Nombre_comp"].astype(str).to_numpy(),
+        "Unidad_final": kpi_df["Unidad_final"].astype(str).to_numpy(),
+        "teorico": kpi_df["Cant_total_teorico_final"].to_numpy(dtype=np.float64),
+        "objetivo": kpi_df["Cant_total_objetivo_final"].to_numpy(dtype=np.float64),
+        "real": kpi_df["Cant_real_final"].to_numpy(dtype=np.float64),
+    }, columns=RAW_COLS)
+    if bom_version is not None:
+        records["bom_version"] = str(bom_version)
+    return records
+
+
+def _rollup(records: pd.DataFrame, grain: str, signo: float = 1.0) -> pd.DataFrame:
+    df = records.assign(periodo=period_start(records["fecha"], grain))
+    agg = df.groupby(ROLLUP_KEYS, sort=False, observed=True)[SUM_COLS].sum()
+    agg["n"] = df.groupby(ROLLUP_KEYS, sort=False, observed=True).size()
+    return (agg * signo).reset_index()
+
+
+def _write_atomic(target: Path, table: pa.Table) -> None:
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class KpiStore:
+    """
+    Histórico de KPI en disco. `save` agrega un cálculo; `trend` lee un rollup.
+    Las escrituras (save, rebuild_rollups) se serializan con un candado por
+    directorio: leer-sumar-escribir el rollup no puede intercalarse entre hilos.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._lock = _store_lock(self.root)
+        self.raw_dir = self.root / "raw"
+        self.rollup_dir = self.root / "rollups"
+
+    def _partition(self, fecha: pd.Timestamp, sucursal: str) -> Path:
+        return (
+            self.raw_dir
+            / f"fecha={fecha:%Y-%m-%d}"
+            / f"sucursal={quote(sucursal, safe='')}"
+            / "kpi.parquet"
+        )
+
+    def _rollup_path(self, grain: str) -> Path:
+        return self.rollup_dir / f"{grain}.parquet"
+
+    def stamp(self, grain: str = "dia") -> int:
+        """mtime del rollup (0 si no existe): llave de caché para lo que se derive de él."""
+        path = self._rollup_path(grain)
+        return path.stat().st_mtime_ns if path.exists() else 0
+
+    def read_rollup(self, grain: str) -> pd.DataFrame:
+        path = self._rollup_path(grain)
+        if not path.exists():
+            return pd.DataFrame(columns=ROLLUP_KEYS + SUM_COLS + ["n"])
+        return pq.read_table(path).to_pandas()
+
+    def save(self, records: pd.DataFrame) -> int:
+        """
+        Guarda los renglones (salida de kpi_records) y actualiza los rollups
+        con el delta. Devuelve cuántos renglones se escribieron.
+        """
+        if records.empty:
+            return 0
+        with self._lock:
+            self._save_locked(records)
+        return len(records)
+
+    def _save_locked(self, records: pd.DataFrame) -> None:
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+
+        deltas = [(records, 1.0)]
+        for (fecha, sucursal), grupo in records.groupby(["fecha", "sucursal"], sort=False):
+            destino = self._partition(fecha, sucursal)
+            if destino.exists():
+                # Se reemplaza la partición: restar su aporte a los rollups
+                deltas.append((pq.read_table(destino).to_pandas(), -1.0))
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            _write_atomic(destino, pa.Table.from_pandas(grupo.reset_index(drop=True), preserve_index=False))
+
+        for grain in GRAINS:
+            partes = [self.read_rollup(grain)] + [_rollup(d[RAW_COLS], grain, signo) for d, signo in deltas]
+            partes = [p for p in partes if not p.empty]
+            total = pd.concat(partes, ignore_index=True)
+            total = total.groupby(ROLLUP_KEYS, sort=True)[SUM_COLS + ["n"]].sum().reset_index()
+            total = total[total["n"] > 0]
+            total["n"] = total["n"].astype(np.int64)
+            _write_atomic(self._rollup_path(grain), pa.Table.from_pandas(total, preserve_index=False))
+
+    def branches(self) -> list:
+        return sorted(self.read_rollup("mes")["sucursal"].unique().tolist())
+
+    def trend(self, grain: str = "dia", sucursal: str = None, componente: str = None) -> pd.DataFrame:
+        """
+        Serie por periodo desde el rollup: sumas y merma real / objetivo (%).
+        Sin sucursal o componente se suman todas.
+        """
+        df = self.read_rollup(grain)
+        if sucursal:
+            df = df[df["sucursal"] == sucursal]
+        if componente:
+            df = df[df["Componente"] == componente]
+        serie = df.groupby("periodo", sort=True)[SUM_COLS].sum().reset_index()
+        denom = serie["teorico"].replace(0, np.nan)
+        serie["Merma_real_pct"] = (serie["real"] - serie["teorico"]) / denom
+        serie["Merma_objetivo_pct"] = (serie["objetivo"] - serie["teorico"]) / denom
+        return serie
+
+    def rebuild_rollups(self) -> None:
+        """Recalcula los rollups desde raw/ (solo para reparar; lee todo el histórico)."""
+        with self._lock:
+            self._rebuild_locked()
+
+    def _rebuild_locked(self) -> None:
+        for grain in GRAINS:
+            path = self._rollup_path(grain)
+            if path.exists():
+                path.unlink()
+        if not self.raw_dir.exists():
+            return
+        records = pq.read_table(self.raw_dir, partitioning=None).to_pandas()
+        self.rollup_dir.mkdir(parents=True, exist_ok=True)
+        for grain in GRAINS:
+            total = _rollup(records[RAW_COLS], grain).sort_values(ROLLUP_KEYS)
+            total["n"] = total["n"].astype(np.int64)
+            _write_atomic(self._rollup_path(grain), pa.Table.from_pandas(total, preserve_index=False))
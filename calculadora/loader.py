@@ -0,0 +1,166 @@
+"""
+Carga del BOM desde Excel con caché binaria persistente (Arrow/Feather).
+
+El primer arranque parsea el xlsx (openpyxl), aplica el ffill y el fix de
+desfase y guarda el DataFrame limpio en data/.cache/. Los arranques
+siguientes mapean en memoria ese archivo en lugar de volver a parsear Excel.
+
+La caché se invalida por ruta, tamaño, mtime y hash del contenido; si solo
+cambió el mtime pero el contenido es idéntico, se reutiliza.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Subir este número si cambia la limpieza de read_bom_excel
+CACHE_VERSION = 2
+
+EXPECTED_COLS = [
+    "Producto",
+    "Nombre_prod",
+    "Cantidad_prod",
+    "Unidad_prod",
+    "Referencia",
+    "Tipo_BOM",
+    "Costo_receta",
+    "PU",
+    "Componente",
+    "Nombre_comp",
+    "Cantidad_comp",
+    "Unidad_comp",
+]
+
+
+def read_bom_excel(path: Path) -> pd.DataFrame:
+    """
+    Parsea el Excel del BOM y devuelve el DataFrame con columnas estándar.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"No se encontró el archivo: {path}")
+    df = pd.read_excel(path)
+
+    missing = [c for c in EXPECTED_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan estas columnas en el Excel: {missing}")
+
+    # Fill-down de cabecera para filas de componentes
+    for col in ["Producto", "Nombre_prod", "Cantidad_prod", "Unidad_prod", "Referencia", "Tipo_BOM", "Costo_receta", "PU"]:
+        df[col] = df[col].ffill()
+
+    # Señal de cabecera
+    mask_header = df["Tipo_BOM"].notna()
+
+    # FIX de desfase (solo si tu excel está corrido así)
+    df["Componente"] = df["Componente"].where(mask_header, df["PU"])
+    df["Nombre_comp"] = df["Nombre_comp"].where(mask_header, df["Componente"])
+    df["Cantidad_comp"] = df["Cantidad_comp"].where(mask_header, df["Nombre_comp"])
+    df["Unidad_comp"] = df["Unidad_comp"].where(mask_header, df["Cantidad_comp"])
+
+    # Numéricos
+    for col in ["Cantidad_prod", "Costo_receta", "PU", "Cantidad_comp"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+    # Textos
+    for col in ["Producto", "Nombre_prod", "Componente", "Nombre_comp", "Unidad_comp"]:
+        df[col] = df[col].astype(str).str.strip()
+    # Cabeceras de texto opcionales: texto, conservando vacíos (Tipo_BOM vacío =
+    # renglón de componente). Un Excel con 12345 y "ABC-1" en la misma columna
+    # no cabe en una columna Arrow si se dejan mezclados.
+    for col in ["Unidad_prod", "Referencia", "Tipo_BOM"]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str).str.strip())
+
+    # Quitar ruido sin componente
+    df = df[df["Componente"] != ""].copy()
+
+    return df
+
+
+def file_digest(path: Path) -> str:
+    """sha256 del contenido del archivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_dir(path: Path) -> Path:
+    return path.parent / ".cache"
+
+
+def _cache_files(path: Path, cache_dir: Path) -> tuple:
+    stem = f"{path.stem}.v{CACHE_VERSION}"
+    return cache_dir / f"{stem}.feather", cache_dir / f"{stem}.json"
+
+
+def _read_meta(meta_path: Path) -> dict:
+    try:
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_atomic(target: Path, write) -> None:
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, target)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def load_bom_cached(path: Path, cache_dir: Path = None) -> pd.DataFrame:
+    """
+    Igual que read_bom_excel, pero usando la caché binaria cuando es válida.
+    Si la carpeta de caché no es escribible (o Arrow no puede guardar el
+    DataFrame), simplemente devuelve el Excel parseado.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"No se encontró el archivo: {path}")
+    cache_dir = cache_dir or default_cache_dir(path)
+    data_path, meta_path = _cache_files(path, cache_dir)
+
+    stat = path.stat()
+    meta = _read_meta(meta_path)
+    key = {
+        "path": str(path.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "version": CACHE_VERSION,
+    }
+
+    if data_path.exists() and meta:
+        same_stat = all(meta.get(k) == v for k, v in key.items())
+        if same_stat:
+            return feather.read_table(data_path, memory_map=True).to_pandas()
+
+        # Cambió el mtime/tamaño: validar por contenido antes de re-parsear
+        digest = file_digest(path)
+        if meta.get("sha256") == digest and meta.get("version") == CACHE_VERSION:
+            try:
+                _write_atomic(meta_path, lambda p: p.write_text(json.dumps({**key, "sha256": digest}), encoding="utf-8"))
+            except OSError:
+                pass
+            return feather.read_table(data_path, memory_map=True).to_pandas()
+    else:
+        digest = file_digest(path)
+
+    df = read_bom_excel(path).reset_index(drop=True)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(
+            data_path,
+            lambda p: feather.write_feather(df, p, compression="uncompressed"),
+        )
+        _write_atomic(meta_path, lambda p: p.write_text(json.dumps({**key, "sha256": digest}), encoding="utf-8"))
+    except (OSError, pa.ArrowException):
+        pass
+
+    return df
@@ -0,0 +1,233 @@
+"""
+Matriz dispersa producto × componente precompilada a partir del BOM.
+
+El requerimiento de insumos de un pedido es un solo producto
+matriz–vector:  Cant_total_comp_teorico = Mᵀ · q
+donde q es el vector de cantidades pedidas por producto.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from calculadora.units import UNITS
+
+COMP_KEYS = ["Componente", "Nombre_comp", "Unidad_comp"]
+
+
+@dataclass(frozen=True)
+class BomMatrix:
+    """
+    BOM compilado:
+      - productos: códigos de Producto (filas de la matriz)
+      - componentes: DataFrame con COMP_KEYS (columnas de la matriz)
+      - matriz: CSR producto × componente con Cantidad_comp, en el orden del Excel
+      - matriz_t: transpuesta en CSR (para Mᵀ · q)
+      - patron_t: misma estructura que matriz_t con 1.0 (componentes tocados)
+    """
+    productos: pd.Index
+    componentes: pd.DataFrame
+    matriz: sparse.csr_matrix
+    matriz_t: sparse.csr_matrix
+    patron_t: sparse.csr_matrix
+
+    @property
+    def shape(self) -> tuple:
+        return self.matriz.shape
+
+    def order_vector(self, pedido_df: pd.DataFrame) -> np.ndarray:
+        """
+        Convierte pedido_df (Producto, Cantidad_pedida) en el vector q alineado
+        con las filas de la matriz. Productos sin BOM se ignoran.
+        """
+        q = np.zeros(len(self.productos), dtype=np.float64)
+        if pedido_df.empty:
+            return q
+        idx = self.productos.get_indexer(pedido_df["Producto"])
+        ok = idx >= 0
+        np.add.at(q, idx[ok], pedido_df["Cantidad_pedida"].to_numpy(dtype=np.float64)[ok])
+        return q
+
+
+def build_bom_matrix(bom_df: pd.DataFrame) -> BomMatrix:
+    """
+    Compila bom_df (salida de load_bom) en una matriz CSR.
+    Filas con Producto o llaves de componente vacías (NaN) se descartan,
+    igual que hace el groupby de la sección 3. Lanza UnknownUnitError si
+    alguna Unidad_comp no está en el registro de unidades.
+    """
+    edges = bom_df[["Producto", *COMP_KEYS, "Cantidad_comp"]].dropna(subset=["Producto", *COMP_KEYS])
+
+    prod_codes, productos = pd.factorize(edges["Producto"])
+    comp_codes, comp_uniques = pd.MultiIndex.from_frame(edges[COMP_KEYS]).factorize()
+    cantidades = edges["Cantidad_comp"].to_numpy(dtype=np.float64)
+
+    n_prod = len(productos)
+    n_comp = len(comp_uniques)
+
+    # CSR manual (orden estable): conserva el orden de componentes del Excel
+    # dentro de cada producto y los renglones duplicados (el matvec los suma).
+    order = np.argsort(prod_codes, kind="stable")
+    indptr = np.zeros(n_prod + 1, dtype=np.int64)
+    np.cumsum(np.bincount(prod_codes, minlength=n_prod), out=indptr[1:])
+    matriz = sparse.csr_matrix(
+        (cantidades[order], comp_codes[order].astype(np.int64), indptr),
+        shape=(n_prod, n_comp),
+    )
+
+    matriz_t = matriz.T.tocsr()
+    patron_t = matriz_t.copy()
+    patron_t.data = np.ones_like(patron_t.data)
+
+    componentes = comp_uniques.to_frame(index=False, name=COMP_KEYS)
+    # Unidad categórica validada una sola vez contra el registro de unidades
+    componentes["Unidad_comp"] = UNITS.encode(componentes["Unidad_comp"])
+
+    return BomMatrix(
+        productos=pd.Index(productos),
+        componentes=componentes,
+        matriz=matriz,
+        matriz_t=matriz_t,
+        patron_t=patron_t,
+    )
+
+
+def summary_frame(bom: BomMatrix, teorico: np.ndarray, tocados: np.ndarray, factor_merma=1.0) -> pd.DataFrame:
+    """
+    Arma el resumen por componente a partir del vector teórico (alineado con
+    bom.componentes) y la máscara de componentes tocados por el pedido.
+    factor_merma puede ser un escalar o un vector por componente.
+    """
+    resumen = bom.componentes[tocados].copy()
+    resumen["Cant_total_comp_teorico"] = teorico[tocados]
+    factor = np.asarray(factor_merma, dtype=np.float64)
+    resumen["Cant_total_comp_objetivo"] = teorico[tocados] * (factor[tocados] if factor.ndim else factor)
+
+    return (
+        resumen.sort_values(COMP_KEYS)
+        .sort_values("Nombre_comp", kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def explode(bom: BomMatrix, pedido_df: pd.DataFrame, factor_merma: float = 1.0) -> pd.DataFrame:
+    """
+    Requerimiento total por componente (equivalente al merge + groupby de la sección 3).
+    Devuelve COMP_KEYS + Cant_total_comp_teorico + Cant_total_comp_objetivo,
+    ordenado por Nombre_comp.
+    """
+    q = bom.order_vector(pedido_df)
+    teorico = bom.matriz_t @ q
+    tocados = (bom.patron_t @ (q > 0).astype(np.float64)) > 0
+    return summary_frame(bom, teorico, tocados, factor_merma)
+
+
+def explode_detail(bom: BomMatrix, pedido_df: pd.DataFrame, factor_merma: float = 1.0) -> pd.DataFrame:
+    """
+    Detalle BOM × pedido (una fila por producto pedido y componente),
+    armado desde las filas CSR de los productos pedidos, sin merge.
+    factor_merma puede ser un escalar o un factor por entrada de bom.matriz
+    (alineado con matriz.data, p. ej. MermaRules.entry_factors).
+    """
+    idx = bom.productos.get_indexer(pedido_df["Producto"])
+    ok = idx >= 0
+    filas = idx[ok]
+    qty = pedido_df["Cantidad_pedida"].to_numpy()[ok]
+
+    indptr = bom.matriz.indptr
+    inicio = indptr[filas]
+    largo = indptr[filas + 1] - inicio
+    total = int(largo.sum())
+
+    # Índices de aristas de todos los rangos [inicio, inicio + largo)
+    offsets = np.repeat(inicio - np.concatenate(([0], np.cumsum(largo)[:-1])), largo)
+    aristas = offsets + np.arange(total)
+    comp = bom.matriz.indices[aristas]
+
+    detalle = pd.DataFrame({
+        "Producto": np.repeat(bom.productos.to_numpy()[filas], largo),
+        "Cantidad_pedida": np.repeat(qty, largo),
+    })
+    detalle = pd.concat(
+        [detalle, bom.componentes.iloc[comp].reset_index(drop=True)],
+        axis=1,
+    )
+    detalle["Cantidad_comp"] = bom.matriz.data[aristas]
+    detalle = detalle[["Producto", "Cantidad_pedida", "Componente", "Nombre_comp", "Cantidad_comp", "Unidad_comp"]]
+
+    detalle["Cant_total_comp_teorico"] = detalle["Cantidad_pedida"] * detalle["Cantidad_comp"]
+    factor = np.asarray(factor_merma, dtype=np.float64)
+    detalle["Cant_total_comp_objetivo"] = detalle["Cant_total_comp_teorico"] * (factor[aristas] if factor.ndim else factor)
+    return detalle
+
+
+def explode_merge(bom_df: pd.DataFrame, pedido_df: pd.DataFrame, factor_merma: float = 1.0) -> pd.DataFrame:
+    """
+    Ruta de referencia (merge + groupby original de la sección 3).
+    Se conserva para verificar el motor matricial.
+    """
+    detalle = pedido_df.merge(
+        bom_df[["Producto", "Componente", "Nombre_comp", "Cantidad_comp", "Unidad_comp"]],
+        on="Producto",
+        how="left",
+    )
+    detalle["Cant_total_comp_teorico"] = detalle["Cantidad_pedida"] * detalle["Cantidad_comp"]
+    detalle["Cant_total_comp_objetivo"] = detalle["Cant_total_comp_teorico"] * factor_merma
+
+    return (
+        detalle.groupby(COMP_KEYS, as_index=False)[
+            ["Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+        ]
+        .sum()
+        .sort_values("Nombre_comp")
+        .reset_index(drop=True)
+    )
+
+
+def compare_with_merge(
+    bom: BomMatrix,
+    bom_df: pd.DataFrame,
+    pedido_df: pd.DataFrame,
+    factor_merma: float = 1.0,
+    atol: float = 1e-9,
+) -> pd.DataFrame:
+    """
+    Compara lado a lado el motor matricial contra el merge/groupby.
+    Devuelve las filas con diferencia (vacío = coinciden).
+    """
+    cols = ["Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+    a = explode(bom, pedido_df, factor_merma)
+    b = explode_merge(bom_df, pedido_df, factor_merma)
+    lado = a.merge(b, on=COMP_KEYS, how="outer", suffixes=("_matriz", "_merge"), indicator=True)
+
+    diff = lado["_merge"] != "both"
+    for c in cols:
+        diff |= ~np.isclose(lado[f"{c}_matriz"], lado[f"{c}_merge"], atol=atol, equal_nan=True)
+    return lado[diff].drop(columns="_merge").reset_index(drop=True)
+
+
+def explode_orders(bom: BomMatrix, ordenes_df: pd.DataFrame, factor_merma: float = 1.0) -> pd.DataFrame:
+    """
+    Explosión por lotes de muchos pedidos a la vez.
+    ordenes_df: order_id, Producto, Cantidad (una fila por línea de pedido).
+    Arma Q (pedido × producto) y calcula Q · M en un solo producto disperso.
+    Devuelve una fila por (order_id, componente) con teórico y objetivo.
+    """
+    cantidad = ordenes_df["Cantidad"].to_numpy(dtype=np.float64)
+    idx = bom.productos.get_indexer(ordenes_df["Producto"])
+    ok = (idx >= 0) & (cantidad > 0)
+
+    order_codes, order_ids = pd.factorize(ordenes_df["order_id"].to_numpy()[ok])
+    q = sparse.csr_matrix(
+        (cantidad[ok], (order_codes, idx[ok])),
+        shape=(len(order_ids), len(bom.productos)),
+    )
+    r = (q @ bom.matriz).tocoo()
+
+    out = bom.componentes.iloc[r.col].reset_index(drop=True)
+    out.insert(0, "order_id", np.asarray(order_ids)[r.row])
+    out["Cant_total_comp_teorico"] = r.data
+    out["Cant_total_comp_objetivo"] = out["Cant_total_comp_teorico"] * factor_merma
+    # Empates de Nombre_comp en el orden de explode() (por COMP_KEYS)
+    return out.sort_values(["order_id", "Nombre_comp", "Componente", "Unidad_comp"], kind="stable").reset_index(drop=True)
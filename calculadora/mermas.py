@@ -0,0 +1,239 @@
+"""
+Reglas de merma objetivo por componente, categoría y producto.
+
+La merma del sidebar es una sola proporción para todo el pedido, pero la
+verdura, la proteína y los abarrotes secos se pierden a tasas muy distintas.
+El archivo de reglas (data/mermas.csv) tiene una fila por regla:
+  Producto, Categoria, Componente, Merma
+Cada fila llena una o dos llaves. Gana la regla más específica:
+  1. Producto + Componente
+  2. Producto + Categoria
+  3. Componente (primero la merma por componente de la sucursal)
+  4. Categoria
+  5. Producto
+  6. merma objetivo (la del sidebar o la de la sucursal)
+Dentro de un mismo nivel gana la última fila. La categoría de un componente
+es el prefijo de su código (PR-ARRINS → PR).
+
+Las reglas se compilan una vez por versión del BOM a arreglos alineados con
+bom.componentes y bom.productos. Los niveles 3, 4 y 6 son un vector de
+factores f por componente, así que el objetivo es un producto elemento a
+elemento:  objetivo = f ∘ (Mᵀ · q).  Los niveles 1, 2 y 5 solo tocan las filas
+de los productos con reglas y se suman como una corrección dispersa
+C = M ∘ (F − f):  objetivo = f ∘ (Mᵀ · q) + Cᵀ · q.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from calculadora.core import parse_merma
+from calculadora.matrix import BomMatrix
+
+RULE_COLS = ["Producto", "Categoria", "Componente", "Merma"]
+NIVELES = {
+    1: "Producto + Componente",
+    2: "Producto + Categoria",
+    3: "Componente",
+    4: "Categoria",
+    5: "Producto",
+}
+
+
+def component_categories(componentes: pd.Series) -> pd.Series:
+    """Categoría de cada componente: el prefijo del código antes del primer guion."""
+    return componentes.astype(str).str.split("-", n=1).str[0].str.strip().str.upper()
+
+
+@dataclass(frozen=True)
+class MermaRules:
+    """
+    Reglas compiladas contra una versión del BOM (la versión aplanada comparte
+    los índices de productos y componentes):
+      - comp: merma por componente de los niveles 3–4 (NaN = sin regla)
+      - prod: merma por producto del nivel 5 (NaN = sin regla)
+      - pares: merma de los niveles 1–2 por llave producto · n_componentes + componente
+      - con_regla: productos con reglas de los niveles 1, 2 o 5
+      - reglas: filas válidas del archivo, con su Nivel
+      - ignorados: filas con productos, componentes o categorías que no están en el BOM
+    """
+    comp: np.ndarray
+    prod: np.ndarray
+    pares: pd.Series
+    con_regla: np.ndarray
+    reglas: pd.DataFrame
+    ignorados: pd.DataFrame
+
+    @property
+    def empty(self) -> bool:
+        return self.reglas.empty
+
+    @property
+    def por_producto(self) -> bool:
+        return bool(self.con_regla.any())
+
+    def vector(self, merma: float, merma_comp: np.ndarray = None) -> np.ndarray:
+        """
+        Factor (1 + merma) por componente con los niveles 3, 4 y 6.
+        merma_comp: mermas por componente de la sucursal (NaN = sin ajuste).
+        """
+        m = self.comp if merma_comp is None else np.where(np.isnan(merma_comp), self.comp, merma_comp)
+        return 1.0 + np.where(np.isnan(m), merma, m)
+
+    def entry_factors(self, matriz: sparse.csr_matrix, merma: float, merma_comp: np.ndarray = None) -> np.ndarray:
+        """
+        Factor de cada entrada almacenada de una matriz producto × componente
+        (la del BOM, la aplanada o el delta de una sucursal), alineado con
+        matriz.data. Solo se resuelven una a una las filas con reglas propias.
+        """
+        vector = self.vector(merma, merma_comp)
+        factor = vector[matriz.indices]
+        if not self.por_producto:
+            return factor
+
+        filas = np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+        sel = np.flatnonzero(self.con_regla[filas])
+        f, c = filas[sel], matriz.indices[sel]
+
+        nuevo = factor[sel]
+        # El nivel 5 solo aplica donde no hay regla de componente ni de categoría
+        sin_comp = np.isnan(self.comp[c])
+        if merma_comp is not None:
+            sin_comp &= np.isnan(merma_comp[c])
+        por_prod = sin_comp & np.isfinite(self.prod[f])
+        nuevo[por_prod] = 1.0 + self.prod[f[por_prod]]
+
+        pos = self.pares.index.get_indexer(f.astype(np.int64) * len(self.comp) + c)
+        nuevo[pos >= 0] = 1.0 + self.pares.to_numpy()[pos[pos >= 0]]
+        factor[sel] = nuevo
+        return factor
+
+    def corrections(self, matriz: sparse.csr_matrix, merma: float, merma_comp: np.ndarray = None) -> sparse.csr_matrix:
+        """C = M ∘ (F − f): lo que agregan los niveles 1, 2 y 5 sobre el vector."""
+        vector = self.vector(merma, merma_comp)
+        extra = matriz.data * (self.entry_factors(matriz, merma, merma_comp) - vector[matriz.indices])
+        # Copias de los índices: eliminate_zeros no debe tocar la matriz del BOM
+        c = sparse.csr_matrix((extra, matriz.indices.copy(), matriz.indptr.copy()), shape=matriz.shape)
+        c.eliminate_zeros()
+        return c
+
+    def factor(self, teorico: np.ndarray, q: np.ndarray, matrices: list, merma: float, merma_comp: np.ndarray = None):
+        """
+        Factor por componente para summary_frame con el pedido q: el vector si
+        no hay reglas por producto; si las hay, (f ∘ teórico + Σ Cᵀ · q) / teórico.
+        matrices: la matriz activa y, si aplica, el delta de la sucursal.
+        """
+        vector = self.vector(merma, merma_comp)
+        if not self.por_producto:
+            return vector
+        extra = sum(q @ self.corrections(m, merma, merma_comp) for m in matrices)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(teorico != 0, vector + extra / teorico, vector)
+
+    def product_factors(
+        self,
+        matrices: list,
+        precio: np.ndarray,
+        merma: float,
+        merma_comp: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Factor de costo objetivo por producto: (M ∘ F) · p / M · p sobre el BOM
+        aplanado (más el delta aplanado de la sucursal). Productos sin costo por
+        componentes usan 1 + merma.
+        """
+        p = np.nan_to_num(precio)
+        vector = self.vector(merma, merma_comp)
+        base = sum(m @ p for m in matrices)
+        objetivo = sum(m @ (vector * p) for m in matrices)
+        if self.por_producto:
+            objetivo = objetivo + sum(self.corrections(m, merma, merma_comp) @ p for m in matrices)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(base != 0, objetivo / base, 1.0 + merma)
+
+    def level_counts(self) -> dict:
+        """Reglas válidas por nivel, en el orden de NIVELES."""
+        conteo = self.reglas["Nivel"].value_counts()
+        return {nombre: int(conteo.get(n, 0)) for n, nombre in NIVELES.items()}
+
+
+def default_rules_path(data_path: Path) -> Path:
+    return data_path.parent / "mermas.csv"
+
+
+def read_rules(source) -> pd.DataFrame:
+    """
+    Lee el CSV de reglas: agrega las columnas que falten, convierte Merma con
+    parse_merma y asigna el Nivel de cada fila (las filas sin llave se descartan).
+    """
+    df = pd.read_csv(source, dtype=str)
+    df.columns = [str(c).strip().replace("Categoría", "Categoria") for c in df.columns]
+    if "Merma" not in df.columns:
+        raise ValueError("El archivo de mermas debe tener la columna **Merma**.")
+    df = df.reindex(columns=RULE_COLS)
+    for c in RULE_COLS[:3]:
+        df[c] = df[c].astype(object).str.strip().replace("", np.nan)
+    df["Categoria"] = df["Categoria"].str.upper()
+    df = df.dropna(subset=["Merma"]).reset_index(drop=True)
+    df["Merma"] = [parse_merma(v) for v in df["Merma"]]
+
+    prod, cat, comp = (df[c].notna() for c in RULE_COLS[:3])
+    df["Nivel"] = np.select([prod & comp, prod & cat, comp, cat, prod], list(NIVELES), default=0)
+    return df[df["Nivel"] > 0].reset_index(drop=True)
+
+
+def compile_rules(bom: BomMatrix, reglas: pd.DataFrame) -> MermaRules:
+    """
+    Compila las reglas (salida de read_rules) contra los índices del BOM.
+    Sin reglas (None) queda la merma única, salvo las mermas por componente de
+    la sucursal.
+    """
+    if reglas is None:
+        reglas = pd.DataFrame(columns=[*RULE_COLS, "Nivel"])
+    n_prod, n_comp = bom.shape
+    codigos = bom.componentes["Componente"].astype(str).to_numpy()
+    categorias = component_categories(bom.componentes["Componente"]).to_numpy()
+    columnas = np.arange(n_comp)
+
+    idx = bom.productos.get_indexer(reglas["Producto"].fillna("").astype(str))
+    validas = (
+        (reglas["Producto"].isna().to_numpy() | (idx >= 0))
+        & (reglas["Componente"].isna() | reglas["Componente"].isin(codigos)).to_numpy()
+        & (reglas["Categoria"].isna() | reglas["Categoria"].isin(categorias)).to_numpy()
+    )
+    r = reglas[validas].assign(p=idx[validas])
+
+    def _ultima(nivel: int, llave: str) -> pd.Series:
+        d = r[r["Nivel"] == nivel].drop_duplicates(llave, keep="last")
+        return d.set_index(llave)["Merma"]
+
+    comp = pd.Series(categorias).map(_ultima(4, "Categoria")).to_numpy(dtype=np.float64)
+    por_comp = pd.Series(codigos).map(_ultima(3, "Componente")).to_numpy(dtype=np.float64)
+    comp = np.where(np.isnan(por_comp), comp, por_comp)
+
+    prod = np.full(n_prod, np.nan)
+    nivel5 = _ultima(5, "p")
+    prod[nivel5.index.to_numpy(dtype=np.int64)] = nivel5.to_numpy(dtype=np.float64)
+
+    # Niveles 1–2 expandidos a pares producto × componente (el 1 va al final: gana)
+    pares = pd.concat([
+        r[r["Nivel"] == 2].merge(pd.DataFrame({"Categoria": categorias, "col": columnas}), on="Categoria"),
+        r[r["Nivel"] == 1].merge(pd.DataFrame({"Componente": codigos, "col": columnas}), on="Componente"),
+    ])
+    llave = pares["p"].to_numpy(dtype=np.int64) * n_comp + pares["col"].to_numpy(dtype=np.int64)
+    pares = pd.Series(pares["Merma"].to_numpy(dtype=np.float64), index=llave)
+    pares = pares[~pares.index.duplicated(keep="last")]
+
+    con_regla = np.isfinite(prod)
+    con_regla[pares.index.to_numpy() // max(n_comp, 1)] = True
+
+    return MermaRules(
+        comp=comp,
+        prod=prod,
+        pares=pares,
+        con_regla=con_regla,
+        reglas=r.drop(columns="p").reset_index(drop=True),
+        ignorados=reglas[~validas][RULE_COLS].reset_index(drop=True),
+    )
@@ -0,0 +1,162 @@
+"""
+Explosión multinivel del BOM.
+
+Un Componente cuyo código también es un Producto (salsas, masas, bases de
+preparación) es una sub-receta. Aquí se arma una sola vez el DAG de
+sub-recetas, se detectan ciclos y se calcula, de abajo hacia arriba, el
+vector de insumos crudos por unidad de cada producto. Cada sub-receta
+compartida se expande una sola vez (memoizado por nivel).
+
+El padre consume la sub-receta en su Unidad_comp y la sub-receta rinde
+Cantidad_prod en su Unidad_prod: ambas se convierten a la unidad base con el
+registro de unidades (200 gr de una base que rinde 1 kg son 0.2 recetas).
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from calculadora.matrix import BomMatrix
+from calculadora.units import UNITS
+
+
+class BomCycleError(ValueError):
+    """El BOM tiene sub-recetas que se referencian en ciclo."""
+
+
+class BomUnitError(ValueError):
+    """Un padre consume una sub-receta en una unidad de otra dimensión que su rendimiento."""
+
+
+@dataclass(frozen=True)
+class ProductYields:
+    """
+    Rendimiento de cada producto, alineado con las filas de la matriz:
+      - cantidad: Cantidad_prod (vacíos o 0 se toman como 1)
+      - factor: conversión de Unidad_prod a la unidad base (1 si no se conoce)
+      - dimension: kg / lt / unidad de Unidad_prod (None si no viene o no
+        está en el registro: se asume la unidad en que la consume el padre)
+    """
+    cantidad: np.ndarray
+    factor: np.ndarray
+    dimension: np.ndarray
+
+
+def product_yields(bom: BomMatrix, bom_df: pd.DataFrame) -> ProductYields:
+    """Rendimientos a partir de bom_df (Producto, Cantidad_prod y, si viene, Unidad_prod)."""
+    grupos = bom_df.groupby("Producto")
+    rend = grupos["Cantidad_prod"].max().reindex(bom.productos).to_numpy(dtype=np.float64)
+    rend = np.where(np.isfinite(rend) & (rend > 0), rend, 1.0)
+
+    factor = np.ones(len(bom.productos))
+    dimension = np.full(len(bom.productos), None, dtype=object)
+    if "Unidad_prod" in bom_df.columns:
+        unidad = grupos["Unidad_prod"].first().reindex(bom.productos)
+        conocida = unidad.fillna("").astype(str).str.strip().str.lower().isin(UNITS.aliases).to_numpy()
+        if conocida.any():
+            factor[conocida], _ = UNITS.lookup(unidad[conocida])
+            dimension[conocida] = UNITS.dimension(unidad[conocida].astype(str))
+    return ProductYields(cantidad=rend, factor=factor, dimension=dimension)
+
+
+def subrecipe_map(bom: BomMatrix) -> np.ndarray:
+    """
+    Para cada columna (componente) devuelve el índice del producto que la
+    fabrica, o -1 si es un insumo crudo.
+    """
+    return bom.productos.get_indexer(bom.componentes["Componente"])
+
+
+def product_levels(bom: BomMatrix, hijos: sparse.csr_matrix) -> np.ndarray:
+    """
+    Nivel de cada producto en el DAG de sub-recetas (0 = solo insumos crudos).
+    Lanza BomCycleError si hay ciclos.
+    """
+    n = hijos.shape[0]
+    pendientes = np.diff(hijos.indptr).astype(np.int64)  # hijos sin resolver
+    padres = hijos.T.tocsr()
+    nivel = np.zeros(n, dtype=np.int64)
+
+    # Kahn desde las hojas hacia arriba
+    cola = list(np.flatnonzero(pendientes == 0))
+    resueltos = 0
+    while cola:
+        p = cola.pop()
+        resueltos += 1
+        for padre in padres.indices[padres.indptr[p]:padres.indptr[p + 1]]:
+            nivel[padre] = max(nivel[padre], nivel[p] + 1)
+            pendientes[padre] -= 1
+            if pendientes[padre] == 0:
+                cola.append(padre)
+
+    if resueltos < n:
+        ciclo = bom.productos[pendientes > 0].tolist()
+        raise BomCycleError(f"Sub-recetas en ciclo (o que dependen de uno): {ciclo}")
+    return nivel
+
+
+def flatten_bom(bom: BomMatrix, rendimientos: ProductYields) -> BomMatrix:
+    """
+    Devuelve un BomMatrix con la misma indexación de productos/componentes cuya
+    matriz es "insumo crudo por unidad de producto". Las columnas de
+    sub-recetas quedan en 0 y no aparecen en explode().
+    Lanza BomUnitError si un padre consume una sub-receta en una unidad de
+    otra dimensión que su Unidad_prod.
+    """
+    fabricado_por = subrecipe_map(bom)
+    es_sub = fabricado_por >= 0
+    n_prod, n_comp = bom.shape
+
+    # A: producto × producto (cuánto de cada sub-receta, en unidades de su rendimiento)
+    sub_cols = np.flatnonzero(es_sub)
+    hijo = fabricado_por[sub_cols]
+    unidad_comp = bom.componentes["Unidad_comp"].iloc[sub_cols]
+    factor_comp, _ = UNITS.gather(unidad_comp)
+    dim_comp = UNITS.dimension(unidad_comp)
+    dim_hijo = rendimientos.dimension[hijo]
+    conocida = pd.notna(dim_hijo)
+    distinta = conocida & (dim_hijo != dim_comp)
+    if distinta.any():
+        pares = sorted({
+            f"{bom.productos[h]} ({u} vs {d})"
+            for h, u, d in zip(hijo[distinta], unidad_comp.to_numpy()[distinta], dim_hijo[distinta])
+        })
+        raise BomUnitError(f"Sub-recetas consumidas en una unidad de otra dimensión que su rendimiento: {pares}")
+    escala = np.where(conocida, factor_comp / rendimientos.factor[hijo], 1.0) / rendimientos.cantidad[hijo]
+    seleccion = sparse.csr_matrix(
+        (escala, (sub_cols, hijo)),
+        shape=(n_comp, n_prod),
+    )
+    a = (bom.matriz @ seleccion).tocsr()
+
+    hijos = a.copy()
+    hijos.data = np.ones_like(hijos.data)
+    nivel = product_levels(bom, hijos)
+
+    # D: solo insumos crudos (se filtran las aristas hacia sub-recetas)
+    crudo = ~es_sub[bom.matriz.indices]
+    filas = np.repeat(np.arange(n_prod), np.diff(bom.matriz.indptr))
+    plana = sparse.csr_matrix(
+        (bom.matriz.data[crudo], (filas[crudo], bom.matriz.indices[crudo])),
+        shape=(n_prod, n_comp),
+    )
+
+    # Bottom-up por nivel: las filas de nivel L solo dependen de niveles < L,
+    # que ya están resueltos en `plana`.
+    for lvl in range(1, int(nivel.max(initial=0)) + 1):
+        a_lvl = (sparse.diags((nivel == lvl).astype(np.float64)) @ a).tocsr()
+        plana = (plana + a_lvl @ plana).tocsr()
+
+    plana.sum_duplicates()
+    plana_t = plana.T.tocsr()
+    patron_t = plana_t.copy()
+    patron_t.data = np.ones_like(patron_t.data)
+
+    return BomMatrix(
+        productos=bom.productos,
+        componentes=bom.componentes,
+        matriz=plana,
+        matriz_t=plana_t,
+        patron_t=patron_t,
+    )
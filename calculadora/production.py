@@ -0,0 +1,191 @@
+"""
+Cálculo inverso: qué se puede producir con el inventario disponible.
+
+Con los mismos coeficientes del BOM (Cantidad_comp por unidad de producto,
+convertidos a la unidad final kg/lt con el registro de unidades y con la
+merma objetivo) y el stock por componente. Un mismo código puede ocupar
+varias columnas del BOM (otro Nombre_comp o Unidad_comp); el stock es uno
+solo por (Componente, Unidad_final), así que las columnas se agrupan y la
+restricción suma el consumo de todas:
+  - max_producible: máximo de cada producto por separado (mínimo de
+    stock / consumo sobre sus componentes, vectorizado sobre la CSR)
+  - production_mix: mezcla de producción que maximiza margen (o unidades)
+    sin exceder el stock, opcionalmente acotada por una demanda. Catálogos
+    chicos se resuelven como ILP disperso con scipy.optimize.milp (HiGHS);
+    los grandes con la relajación LP, su piso (siempre factible: el BOM no
+    tiene coeficientes negativos) y un llenado greedy del stock sobrante.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import Bounds, LinearConstraint, milp
+
+from calculadora.matrix import BomMatrix
+from calculadora.purchasing import normalize_stock
+from calculadora.units import UNITS
+
+DEFAULT_TIME_LIMIT = 5.0
+# Brecha relativa aceptada del ILP (1%): suficiente para planear y mantiene
+# el tiempo interactivo en catálogos de miles de productos
+DEFAULT_GAP = 0.01
+# Con más productos activos que esto, "auto" usa LP + redondeo en vez de ILP
+EXACT_MAX_VARS = 1000
+
+
+def consumption_matrix(bom: BomMatrix, factor_merma: float = 1.0) -> sparse.csr_matrix:
+    """Consumo por unidad de producto en unidad final (kg/lt), con merma."""
+    factor, _ = UNITS.gather(bom.componentes["Unidad_comp"])
+    return (bom.matriz @ sparse.diags(factor * factor_merma)).tocsr()
+
+
+def stock_groups(bom: BomMatrix) -> tuple:
+    """
+    Grupos de stock: (grupo, claves, agrupa). grupo es el grupo de cada
+    columna del BOM, claves un DataFrame (Componente, Nombre_comp,
+    Unidad_final) por grupo y agrupa la matriz 0/1 columna × grupo.
+    """
+    _, unidad = UNITS.gather(bom.componentes["Unidad_comp"])
+    columnas = pd.DataFrame({
+        "Componente": bom.componentes["Componente"].astype(str).to_numpy(),
+        "Nombre_comp": bom.componentes["Nombre_comp"].astype(str).to_numpy(),
+        "Unidad_final": unidad,
+    })
+    grupo, _ = pd.MultiIndex.from_frame(columnas[["Componente", "Unidad_final"]]).factorize()
+    claves = columnas.groupby(grupo, sort=True).agg(
+        Componente=("Componente", "first"),
+        Nombre_comp=("Nombre_comp", lambda s: " / ".join(dict.fromkeys(s))),
+        Unidad_final=("Unidad_final", "first"),
+    ).reset_index(drop=True)
+    agrupa = sparse.csr_matrix(
+        (np.ones(len(grupo)), (np.arange(len(grupo)), grupo)), shape=(len(grupo), len(claves))
+    )
+    return grupo, claves, agrupa
+
+
+def stock_vector(bom: BomMatrix, stock_df: pd.DataFrame) -> np.ndarray:
+    """Stock (en unidad final) alineado con los grupos de stock_groups; 0 si no viene."""
+    stock = normalize_stock(stock_df).set_index("Componente")["Stock"]
+    _, claves, _ = stock_groups(bom)
+    return stock.reindex(claves["Componente"]).fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def max_producible(consumo: sparse.csr_matrix, stock: np.ndarray) -> np.ndarray:
+    """
+    Máximo entero de cada producto por separado. NaN para productos sin
+    componentes con consumo > 0 (no los limita el inventario).
+    """
+    consumo = consumo.tocsr()
+    consumo.eliminate_zeros()
+    n = consumo.shape[0]
+    largo = np.diff(consumo.indptr)
+    out = np.full(n, np.nan)
+    con = largo > 0
+    if not con.any():
+        return out
+    ratio = np.maximum(stock[consumo.indices], 0.0) / consumo.data
+    minimos = np.minimum.reduceat(ratio, consumo.indptr[:-1][con])
+    out[con] = np.floor(minimos + 1e-9)
+    return out
+
+
+def _greedy_fill(consumo: sparse.csr_matrix, x: np.ndarray, tope: np.ndarray, stock: np.ndarray, orden: np.ndarray) -> np.ndarray:
+    """
+    Completa una solución entera factible con el stock que sobró, producto
+    por producto en el orden dado (mayor peso primero).
+    """
+    x = x.copy()
+    resto = stock - consumo.T @ x
+    indptr, indices, data = consumo.indptr, consumo.indices, consumo.data
+    for p in orden:
+        libre = tope[p] - x[p]
+        if libre < 1:
+            continue
+        sl = slice(indptr[p], indptr[p + 1])
+        k = min(libre, np.floor((np.maximum(resto[indices[sl]], 0.0) / data[sl]).min() + 1e-9))
+        if k >= 1:
+            x[p] += k
+            resto[indices[sl]] -= k * data[sl]
+    return x
+
+
+def production_mix(
+    bom: BomMatrix,
+    stock: np.ndarray,
+    margen: np.ndarray = None,
+    demanda: np.ndarray = None,
+    factor_merma: float = 1.0,
+    metodo: str = "auto",
+    time_limit: float = DEFAULT_TIME_LIMIT,
+    gap: float = DEFAULT_GAP,
+) -> tuple:
+    """
+    Mezcla de producción óptima.
+    stock: por grupo (Componente, Unidad_final), como lo da stock_vector.
+    margen: margen por unidad alineado con bom.productos (None = maximizar unidades).
+    demanda: tope por producto (NaN = sin tope).
+    metodo: "ilp" (milp entero, brecha `gap`), "lp" (relajación LP, piso y
+    llenado greedy del stock sobrante) o "auto" (ilp hasta EXACT_MAX_VARS
+    productos activos, lp arriba de eso).
+    Devuelve (plan_df, uso_df, estado).
+    """
+    _, claves, agrupa = stock_groups(bom)
+    # Consumo por grupo de stock: suma las columnas que comparten código
+    consumo = (consumption_matrix(bom, factor_merma) @ agrupa).tocsr()
+    consumo.eliminate_zeros()
+    maximo = max_producible(consumo, stock)
+    tope = maximo
+    if demanda is not None:
+        demanda = np.asarray(demanda, dtype=np.float64)
+        tope = np.where(np.isnan(demanda), tope, np.fmin(tope, np.floor(demanda)))
+
+    # Solo variables acotadas por el inventario, con tope > 0 y peso > 0
+    peso = np.ones(len(bom.productos)) if margen is None else np.nan_to_num(np.asarray(margen, dtype=np.float64))
+    activos = np.flatnonzero(np.isfinite(tope) & (tope > 0) & (peso > 0))
+    if metodo == "auto":
+        metodo = "ilp" if activos.size <= EXACT_MAX_VARS else "lp"
+
+    x = np.zeros(len(bom.productos))
+    estado = "sin inventario suficiente"
+    if activos.size:
+        A = consumo[activos].T.tocsr()
+        filas = np.flatnonzero(np.diff(A.indptr) > 0)
+        A = A[filas]
+        problema = dict(
+            c=-peso[activos],
+            constraints=LinearConstraint(A, -np.inf, stock[filas]),
+            bounds=Bounds(0, tope[activos]),
+            options={"time_limit": time_limit, "mip_rel_gap": gap},
+        )
+        entero = metodo == "ilp"
+        res = milp(integrality=np.full(activos.size, 1 if entero else 0), **problema)
+        if res.x is None and entero:
+            # Sin solución entera a tiempo: se cae a la relajación LP
+            entero = False
+            res = milp(integrality=np.zeros(activos.size), **problema)
+
+        if res.x is None:
+            estado = res.message
+        else:
+            x[activos] = np.floor(res.x + 1e-6)
+            # Llenado greedy del sobrante: mayor margen y mayor parte fraccionaria primero
+            fraccion = res.x - x[activos]
+            orden = activos[np.lexsort((-fraccion, -peso[activos]))]
+            x = _greedy_fill(consumo, x, tope, stock, orden)
+            if entero:
+                estado = "óptimo (ILP)" if res.status == 0 else "límite de tiempo (ILP)"
+            else:
+                estado = "LP + redondeo"
+
+    plan = pd.DataFrame({
+        "Producto": bom.productos,
+        "Max_individual": maximo,
+        "Producir": x,
+        "Margen_unit": peso if margen is not None else np.nan,
+    })
+    plan["Margen_total"] = plan["Producir"] * plan["Margen_unit"]
+    plan = plan[plan["Max_individual"].notna()].reset_index(drop=True)
+
+    uso = claves.assign(Stock=stock, Usado=consumo.T @ x)
+    uso["Restante"] = uso["Stock"] - uso["Usado"]
+    uso = uso[(uso["Stock"] > 0) | (uso["Usado"] > 0)].reset_index(drop=True)
+    return plan, uso, estado
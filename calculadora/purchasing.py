@@ -0,0 +1,243 @@
+"""
+Lista de compra: del requerimiento objetivo a paquetes de proveedor.
+
+Entrada:
+  - resumen (salida de la sección 3, ya en Unidad_final)
+  - catálogo de proveedores: Componente, Proveedor, Presentacion (tamaño del
+    paquete), Precio (por paquete), MOQ (paquetes mínimos por pedido) y
+    Lead_time_dias. Unidad_presentacion es opcional; si viene, se convierte
+    a kg/lt con el registro de unidades y solo se ofrece a componentes de la
+    misma dimensión; si no, se asume Unidad_final.
+  - stock en mano (Componente, Stock) en Unidad_final
+
+Un código puede venir en varias filas del resumen (otro Nombre_comp o
+Unidad_comp): el requerimiento se suma por (Componente, Unidad_final) y el
+stock de un código se descuenta una sola vez.
+
+Para cada componente se busca la compra más barata que cubre
+Neto = max(objetivo − stock, 0): primero la mejor presentación sola
+(redondeo vectorizado a paquetes, respetando MOQ) y después mezclas de dos
+presentaciones, enumerando los paquetes de la más grande (una mochila de
+cobertura pequeña, acotada por MAX_ENUM por mezcla y por MAX_ENUM_COMP y
+MAX_CANDIDATOS en total, resuelta en bloque con numpy).
+"""
+import numpy as np
+import pandas as pd
+
+from calculadora.units import UNITS
+
+CATALOG_COLS = ["Componente", "Proveedor", "Presentacion", "Precio", "MOQ", "Lead_time_dias"]
+STOCK_ALIASES = {
+    "Componente": {"componente", "component", "insumo", "sku", "codigo", "código"},
+    "Stock": {"stock", "existencia", "existencias", "inventario", "on_hand"},
+}
+# Máximo de paquetes de la presentación grande a enumerar por mezcla
+MAX_ENUM = 5000
+# Presupuesto de candidatos de mezclas por componente y en total (memoria
+# acotada); las mezclas que no caben se omiten y queda la presentación sola
+MAX_ENUM_COMP = 20_000
+MAX_CANDIDATOS = 500_000
+_EPS = 1e-9
+
+
+def normalize_catalog(catalogo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Valida y limpia el catálogo de proveedores. Lanza ValueError si faltan
+    columnas obligatorias. Dimension es la de Unidad_presentacion (NaN si no
+    viene).
+    """
+    faltan = [c for c in ["Componente", "Proveedor", "Presentacion", "Precio"] if c not in catalogo.columns]
+    if faltan:
+        raise ValueError(f"Al catálogo de proveedores le faltan columnas: {faltan}")
+
+    cat = catalogo.copy()
+    cat["Componente"] = cat["Componente"].astype(str).str.strip()
+    cat["Proveedor"] = cat["Proveedor"].astype(str).str.strip()
+    for col, default in (("Presentacion", np.nan), ("Precio", np.nan), ("MOQ", 1), ("Lead_time_dias", 0)):
+        if col not in cat.columns:
+            cat[col] = default
+        cat[col] = pd.to_numeric(cat[col], errors="coerce")
+    cat["MOQ"] = np.maximum(cat["MOQ"].fillna(1), 1).astype(np.int64)
+    cat["Lead_time_dias"] = cat["Lead_time_dias"].fillna(0)
+
+    cat["Dimension"] = np.nan
+    if "Unidad_presentacion" in cat.columns:
+        unidad = cat["Unidad_presentacion"].astype(str)
+        factor, _ = UNITS.gather(unidad)
+        cat["Presentacion"] = cat["Presentacion"] * factor
+        cat["Dimension"] = UNITS.dimension(unidad)
+
+    cat = cat[(cat["Presentacion"] > 0) & (cat["Precio"] >= 0)]
+    return cat[[*CATALOG_COLS, "Dimension"]].reset_index(drop=True)
+
+
+def normalize_stock(stock_df: pd.DataFrame) -> pd.DataFrame:
+    """Stock (Componente, Stock) sumado por componente."""
+    rename = {}
+    for c in stock_df.columns:
+        cl = str(c).strip().lower()
+        for target, aliases in STOCK_ALIASES.items():
+            if cl in aliases or c == target:
+                rename[c] = target
+    stock = stock_df.rename(columns=rename)
+    if "Componente" not in stock.columns or "Stock" not in stock.columns:
+        raise ValueError("El stock debe tener columnas: **Componente** y **Stock**.")
+    stock = stock[["Componente", "Stock"]].copy()
+    stock["Componente"] = stock["Componente"].astype(str).str.strip()
+    stock["Stock"] = pd.to_numeric(stock["Stock"], errors="coerce").fillna(0.0)
+    stock = stock[stock["Componente"] != ""]
+    return stock.groupby("Componente", as_index=False)["Stock"].sum()
+
+
+def net_requirements(resumen: pd.DataFrame, stock_df: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Requerido (objetivo) menos stock en mano, una fila por (Componente,
+    Unidad_final). Si un código tiene requerimiento en más de una dimensión,
+    su stock se reparte en ese orden y nunca se descuenta dos veces.
+    """
+    neto = (
+        resumen.groupby(["Componente", "Unidad_final"], sort=False, observed=True)
+        .agg(
+            Nombre_comp=("Nombre_comp", lambda s: " / ".join(dict.fromkeys(s.astype(str)))),
+            Requerido=("Cant_total_objetivo_final", "sum"),
+        )
+        .reset_index()[["Componente", "Nombre_comp", "Unidad_final", "Requerido"]]
+    )
+    if stock_df is not None and not stock_df.empty:
+        neto = neto.merge(normalize_stock(stock_df), on="Componente", how="left")
+    else:
+        neto = neto.assign(Stock=np.nan)
+    stock = neto["Stock"].fillna(0.0).to_numpy()
+    req = neto["Requerido"].clip(lower=0.0)
+    # Stock que ya tomaron las filas anteriores del mismo código; la última se queda con el resto
+    resto = np.maximum(stock - (req.groupby(neto["Componente"], sort=False).cumsum() - req).to_numpy(), 0.0)
+    ultima = ~neto.duplicated("Componente", keep="last").to_numpy()
+    neto["Stock"] = np.where(ultima, resto, np.minimum(resto, req.to_numpy()))
+    neto["Neto"] = np.maximum(neto["Requerido"] - neto["Stock"], 0.0)
+    return neto.reset_index(drop=True)
+
+
+def _packs(cantidad: np.ndarray, tam: np.ndarray, moq: np.ndarray) -> np.ndarray:
+    """Paquetes para cubrir cantidad (0 si no hace falta), respetando MOQ."""
+    n = np.ceil(np.maximum(cantidad, 0.0) / tam - _EPS).astype(np.int64)
+    return np.where(n > 0, np.maximum(n, moq), 0)
+
+
+def _pairs(opts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Mezclas de dos presentaciones por componente. Enumera n_a = 0..⌈neto/s_a⌉
+    paquetes de la grande (a) y completa con la chica (b).
+    """
+    o = opts[["comp", "opt", "Neto", "Presentacion", "Precio", "MOQ"]]
+    pares = o.merge(o, on=["comp", "Neto"], suffixes=("_a", "_b"))
+    pares = pares[
+        (pares["Presentacion_a"] > pares["Presentacion_b"])
+        | ((pares["Presentacion_a"] == pares["Presentacion_b"]) & (pares["opt_a"] < pares["opt_b"]))
+    ]
+    tope = np.ceil(pares["Neto"].to_numpy() / pares["Presentacion_a"].to_numpy() - _EPS).astype(np.int64)
+    ok = tope <= MAX_ENUM
+    pares, tope = pares[ok], tope[ok]
+
+    # Presupuesto: primero las mezclas cuya grande es más barata por unidad
+    pares = pares.assign(largo=tope + 1, _unit=pares["Precio_a"] / pares["Presentacion_a"])
+    pares = pares.sort_values(["comp", "_unit"], kind="stable")
+    acumulado = pares.groupby("comp", sort=False)["largo"].cumsum().to_numpy()
+    pares = pares[acumulado <= MAX_ENUM_COMP]
+    pares = pares[pares["largo"].cumsum().to_numpy() <= MAX_CANDIDATOS]
+    if pares.empty:
+        return pd.DataFrame()
+
+    largo = pares.pop("largo").to_numpy()
+    pares = pares.drop(columns="_unit")
+    fila = np.repeat(np.arange(len(pares)), largo)
+    inicio = np.repeat(np.cumsum(largo) - largo, largo)
+    n_a = np.arange(fila.size) - inicio
+
+    col = {c: pares[c].to_numpy()[fila] for c in pares.columns}
+    n_b = _packs(col["Neto"] - n_a * col["Presentacion_a"], col["Presentacion_b"], col["MOQ_b"])
+    valido = (n_a >= col["MOQ_a"]) & (n_b > 0)
+    return pd.DataFrame({
+        "comp": col["comp"][valido],
+        "opt_a": col["opt_a"][valido],
+        "n_a": n_a[valido],
+        "opt_b": col["opt_b"][valido],
+        "n_b": n_b[valido],
+    })
+
+
+def optimize_purchase(
+    resumen: pd.DataFrame,
+    catalogo: pd.DataFrame,
+    stock_df: pd.DataFrame = None,
+    max_lead_time: float = None,
+) -> tuple:
+    """
+    Lista de compra más barata por componente.
+    Devuelve (compra_df, sin_proveedor_df): una fila por componente ×
+    presentación comprada, y los componentes con Neto > 0 sin opción en el
+    catálogo (o fuera del lead time).
+    """
+    neto = net_requirements(resumen, stock_df)
+    pendiente = neto[neto["Neto"] > _EPS].reset_index(drop=True)
+    pendiente["comp"] = np.arange(len(pendiente))
+
+    cat = normalize_catalog(catalogo)
+    if max_lead_time is not None:
+        cat = cat[cat["Lead_time_dias"] <= max_lead_time]
+    opts = pendiente[["comp", "Componente", "Unidad_final", "Neto"]].merge(cat, on="Componente")
+    # Una presentación en kg no cubre un componente en lt (ni en piezas)
+    misma = opts["Dimension"].isna() | (opts["Dimension"] == UNITS.dimension(opts["Unidad_final"].astype(str)))
+    opts = opts[misma.to_numpy()].drop(columns=["Unidad_final", "Dimension"]).reset_index(drop=True)
+    opts["opt"] = np.arange(len(opts))
+
+    sin_proveedor = pendiente[~pendiente["comp"].isin(opts["comp"])].drop(columns="comp")
+
+    # Candidatos: presentación sola + mezclas de dos
+    solos = pd.DataFrame({
+        "comp": opts["comp"].to_numpy(),
+        "opt_a": opts["opt"].to_numpy(),
+        "n_a": _packs(opts["Neto"].to_numpy(), opts["Presentacion"].to_numpy(), opts["MOQ"].to_numpy()),
+        "opt_b": -1,
+        "n_b": 0,
+    })
+    cand = pd.concat([solos, _pairs(opts)], ignore_index=True)
+
+    tam = opts["Presentacion"].to_numpy()
+    precio = opts["Precio"].to_numpy()
+    b = cand["opt_b"].to_numpy()
+    tiene_b = b >= 0
+    b_idx = np.where(tiene_b, b, 0)
+    n_a, n_b = cand["n_a"].to_numpy(), cand["n_b"].to_numpy()
+    a = cand["opt_a"].to_numpy()
+    costo = n_a * precio[a] + np.where(tiene_b, n_b * precio[b_idx], 0.0)
+    compra = n_a * tam[a] + np.where(tiene_b, n_b * tam[b_idx], 0.0)
+
+    # Más barato por componente; empate: menos sobrante, luego menos paquetes
+    orden = np.lexsort((n_a + n_b, compra, costo, cand["comp"].to_numpy()))
+    comp_ord = cand["comp"].to_numpy()[orden]
+    primero = orden[np.r_[True, comp_ord[1:] != comp_ord[:-1]]] if orden.size else orden
+    mejor = cand.iloc[primero]
+
+    lineas = pd.concat([
+        mejor[["comp", "opt_a", "n_a"]].set_axis(["comp", "opt", "Paquetes"], axis=1),
+        mejor.loc[mejor["opt_b"] >= 0, ["comp", "opt_b", "n_b"]].set_axis(["comp", "opt", "Paquetes"], axis=1),
+    ])
+    lineas = lineas[lineas["Paquetes"] > 0]
+
+    compra_df = (
+        lineas.merge(opts.drop(columns=["Componente", "Neto"]), on=["comp", "opt"])
+        .merge(pendiente, on="comp")
+        .sort_values(["Nombre_comp", "Presentacion"], ascending=[True, False])
+        .reset_index(drop=True)
+    )
+    compra_df["Cantidad_comprada"] = compra_df["Paquetes"] * compra_df["Presentacion"]
+    compra_df["Costo"] = compra_df["Paquetes"] * compra_df["Precio"]
+    comprado = compra_df.groupby("comp")["Cantidad_comprada"].transform("sum")
+    compra_df["Sobrante"] = comprado - compra_df["Neto"]
+
+    cols = [
+        "Componente", "Nombre_comp", "Unidad_final", "Requerido", "Stock", "Neto",
+        "Proveedor", "Presentacion", "MOQ", "Precio", "Paquetes",
+        "Cantidad_comprada", "Costo", "Sobrante", "Lead_time_dias",
+    ]
+    return compra_df[cols], sin_proveedor.reset_index(drop=True)
@@ -0,0 +1,281 @@
+"""
+Planeación por escenarios (sucursal × día × merma) en paralelo.
+
+Cada plan (sucursal, día) se explota contra el BOM compilado y se costea.
+Las líneas se reparten por bloques de planes completos en un
+ProcessPoolExecutor; la matriz CSR y los costos de receta se publican una
+sola vez en memoria compartida y cada worker los adjunta al arrancar (no se
+serializa el BOM por tarea). Cada worker arma sus planes, explota, aplica los
+escenarios de merma y reduce a totales por escenario, así que al padre solo
+regresan tablas chicas (el detalle por plan es opcional).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from calculadora.core import convert_to_base_units
+from calculadora.matrix import BomMatrix
+
+PLAN_KEYS = ["sucursal", "dia"]
+
+
+@dataclass(frozen=True)
+class ScenarioResult:
+    """
+    insumos: una fila por plan, escenario de merma y componente (solo con detalle)
+    costos: una fila por plan y escenario de merma
+    totales: una fila por escenario de merma y componente (todas las sucursales y días)
+    """
+    insumos: pd.DataFrame
+    costos: pd.DataFrame
+    totales: pd.DataFrame
+
+
+# =========================
+# MEMORIA COMPARTIDA
+# =========================
+class SharedArrays:
+    """
+    Publica arreglos numpy en bloques SharedMemory. `spec` es lo único que
+    viaja a los workers (nombres, dtypes y formas).
+    """
+
+    def __init__(self, **arrays):
+        self._blocks = []
+        self.spec = {}
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            self._blocks.append(shm)
+            self.spec[name] = (shm.name, arr.dtype.str, arr.shape)
+
+    def close(self) -> None:
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_arrays(spec: dict) -> tuple:
+    """
+    Adjunta (sin copiar) los arreglos publicados por SharedArrays.
+    Devuelve (arrays, handles); los handles deben mantenerse vivos.
+    """
+    arrays, handles = {}, []
+    for name, (shm_name, dtype, shape) in spec.items():
+        # Los workers comparten el resource tracker del padre, que es quien hace unlink
+        shm = shared_memory.SharedMemory(name=shm_name)
+        handles.append(shm)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return arrays, handles
+
+
+# =========================
+# WORKER
+# =========================
+_WORKER = {}
+
+
+def _init_worker(spec: dict, shape: tuple, productos: pd.Index, componentes: pd.DataFrame) -> None:
+    arrays, handles = attach_arrays(spec)
+    _WORKER["handles"] = handles
+    matriz = sparse.csr_matrix(
+        (arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape, copy=False
+    )
+    # El worker solo usa productos, componentes y la matriz; no necesita la transpuesta
+    _WORKER["bom"] = BomMatrix(productos, componentes, matriz, None, None)
+    _WORKER["costo_receta"] = arrays["costo_receta"]
+
+
+def _run_block(pedidos: pd.DataFrame, mermas: dict, aplicar_merma_a_costos: bool, detalle: bool) -> tuple:
+    return _scenario_block(
+        _WORKER["bom"], _WORKER["costo_receta"], pedidos, mermas, aplicar_merma_a_costos, detalle
+    )
+
+
+def _scenario_block(
+    bom: BomMatrix,
+    costo_receta: np.ndarray,
+    pedidos: pd.DataFrame,
+    mermas: dict,
+    aplicar_merma_a_costos: bool,
+    detalle: bool,
+) -> tuple:
+    """
+    Todo el trabajo de un bloque de planes: armar Q, explotar, costear y
+    reducir a totales por escenario. Devuelve (totales, costos, insumos); solo
+    insumos (por plan) es grande y solo se arma con detalle.
+    """
+    planes_df, q = plan_matrix(bom, pedidos)
+    costo = q @ costo_receta
+    total = np.asarray(q.sum(axis=0)).ravel() @ bom.matriz
+    tocados = np.flatnonzero(total)
+    comp = bom.componentes.iloc[tocados].reset_index(drop=True)
+
+    totales, costos = [], []
+    for nombre, factor in mermas.items():
+        t = comp.copy()
+        t.insert(0, "escenario_merma", nombre)
+        t["Cant_total_comp_teorico"] = total[tocados]
+        t["Cant_total_comp_objetivo"] = total[tocados] * factor
+        totales.append(t)
+
+        c = planes_df.copy()
+        c["escenario_merma"] = nombre
+        c["Costo_total_teorico"] = costo
+        c["Costo_total_objetivo"] = costo * factor if aplicar_merma_a_costos else np.nan
+        costos.append(c)
+
+    insumos = _plan_detail(bom, planes_df, q, mermas) if detalle else None
+    return _concat(totales), _concat(costos), insumos
+
+
+def _plan_detail(bom: BomMatrix, planes_df: pd.DataFrame, q: sparse.csr_matrix, mermas: dict) -> pd.DataFrame:
+    """Una fila por plan, escenario de merma y componente, ya en unidad final."""
+    r = (q @ bom.matriz).tocoo()
+    base = pd.concat(
+        [
+            planes_df.iloc[r.row].reset_index(drop=True),
+            bom.componentes.iloc[r.col].reset_index(drop=True),
+        ],
+        axis=1,
+    )
+    base["Cant_total_comp_teorico"] = r.data
+
+    insumos = []
+    for nombre, factor in mermas.items():
+        parte = base.copy()
+        parte.insert(len(PLAN_KEYS), "escenario_merma", nombre)
+        parte["Cant_total_comp_objetivo"] = r.data * factor
+        insumos.append(parte)
+    return convert_to_base_units(_concat(insumos))
+
+
+def _concat(frames: list) -> pd.DataFrame:
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# =========================
+# API
+# =========================
+def plan_matrix(bom: BomMatrix, pedidos_df: pd.DataFrame) -> tuple:
+    """
+    pedidos_df: sucursal, dia, Producto, Cantidad.
+    Devuelve (planes_df, Q) con Q en CSR plan × producto.
+    """
+    cantidad = pedidos_df["Cantidad"].to_numpy(dtype=np.float64)
+    idx = bom.productos.get_indexer(pedidos_df["Producto"])
+    ok = (idx >= 0) & (cantidad > 0)
+
+    plan_codes, planes = pd.MultiIndex.from_frame(pedidos_df.loc[ok, PLAN_KEYS]).factorize()
+    q = sparse.csr_matrix(
+        (cantidad[ok], (plan_codes, idx[ok])),
+        shape=(len(planes), len(bom.productos)),
+    )
+    return planes.to_frame(index=False, name=PLAN_KEYS), q
+
+
+def split_plans(pedidos_df: pd.DataFrame, n_bloques: int) -> list:
+    """
+    Reparte las líneas en n_bloques por hash de (sucursal, dia): cada plan
+    queda completo en un solo bloque, sin factorizar los planes en el padre.
+    """
+    if n_bloques <= 1 or pedidos_df.empty:
+        return [pedidos_df]
+    bloque = pd.util.hash_pandas_object(pedidos_df[PLAN_KEYS], index=False).to_numpy() % n_bloques
+    orden = np.argsort(bloque, kind="stable")
+    cortes = np.searchsorted(bloque[orden], np.arange(1, n_bloques))
+    partes = [pedidos_df.iloc[i] for i in np.split(orden, cortes)]
+    return [p for p in partes if not p.empty]
+
+
+def run_scenarios(
+    bom: BomMatrix,
+    costo_receta: np.ndarray,
+    pedidos_df: pd.DataFrame,
+    mermas: dict,
+    workers: int = None,
+    bloques: int = None,
+    aplicar_merma_a_costos: bool = True,
+    detalle: bool = False,
+) -> ScenarioResult:
+    """
+    Explota y costea todos los planes para cada escenario de merma.
+      - costo_receta: Costo_receta alineado con bom.productos
+      - mermas: {"nombre": factor_merma}
+      - workers: procesos (None = os.cpu_count(); 1 = en serie, sin pool)
+      - bloques: tareas en que se reparten los planes (None = 4 por worker)
+      - detalle: además de los totales, el requerimiento por plan (insumos)
+    Cada worker arma sus planes, explota y reduce a totales por escenario;
+    al padre solo regresan esos totales y el costo por plan.
+    """
+    costo_receta = np.asarray(costo_receta, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    partes_pedido = split_plans(pedidos_df, 1 if workers == 1 else (bloques or 4 * workers))
+    args = (mermas, aplicar_merma_a_costos, detalle)
+
+    if workers == 1 or len(partes_pedido) <= 1:
+        partes = [_scenario_block(bom, costo_receta, p, *args) for p in partes_pedido]
+    else:
+        with SharedArrays(
+            data=bom.matriz.data,
+            indices=bom.matriz.indices,
+            indptr=bom.matriz.indptr,
+            costo_receta=costo_receta,
+        ) as shared:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(shared.spec, bom.shape, bom.productos, bom.componentes),
+            ) as pool:
+                n = len(partes_pedido)
+                partes = list(pool.map(_run_block, partes_pedido, *([a] * n for a in args)))
+
+    return _reduce(bom, partes, mermas, detalle)
+
+
+def _reduce(bom: BomMatrix, partes: list, mermas: dict, detalle: bool) -> ScenarioResult:
+    """Suma los totales de los bloques (pocas filas) y junta los costos por plan."""
+    comp_cols = list(bom.componentes.columns)
+    cols_totales = ["escenario_merma", *comp_cols, "Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+    totales = _concat([p[0] for p in partes]).reindex(columns=cols_totales)
+    totales = totales.groupby(["escenario_merma", *comp_cols], as_index=False, sort=False, observed=True).sum()
+    # Orden de los escenarios como se pidieron
+    totales = totales.sort_values(
+        "escenario_merma", key=lambda s: s.map({n: i for i, n in enumerate(mermas)}), kind="stable"
+    )
+
+    costos = _concat([p[1] for p in partes]).reindex(
+        columns=[*PLAN_KEYS, "escenario_merma", "Costo_total_teorico", "Costo_total_objetivo"]
+    )
+    cols_insumos = [*PLAN_KEYS, "escenario_merma", *comp_cols, "Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+    insumos = _concat([p[2] for p in partes]) if detalle else pd.DataFrame()
+    if insumos.empty:
+        insumos = convert_to_base_units(pd.DataFrame(columns=cols_insumos))
+
+    return ScenarioResult(
+        insumos=insumos,
+        costos=costos.sort_values([*PLAN_KEYS, "escenario_merma"], kind="stable").reset_index(drop=True),
+        totales=convert_to_base_units(totales.reset_index(drop=True)),
+    )
+
+
+def consolidate(result: ScenarioResult) -> pd.DataFrame:
+    """
+    Requerimiento consolidado (todas las sucursales y días) por escenario de merma.
+    """
+    keys = ["escenario_merma", "Componente", "Nombre_comp", "Unidad_comp", "Unidad_final"]
+    cols = ["Cant_total_comp_teorico", "Cant_total_comp_objetivo", "Cant_total_teorico_final", "Cant_total_objetivo_final"]
+    return result.totales[[*keys, *cols]]
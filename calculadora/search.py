@@ -0,0 +1,152 @@
+"""
+Índice de búsqueda del catálogo de productos (código y nombre).
+
+Se construye una vez por BOM: etiquetas "Producto – Nombre_prod", texto
+normalizado (minúsculas, sin acentos) y un índice invertido de trigramas
+que acota los candidatos antes de verificar la subcadena. También resuelve
+listas de SKUs pegadas (con cantidad opcional) para la captura masiva.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+NGRAM = 3
+DEFAULT_LIMIT = 50
+
+# Separadores de renglón en la lista pegada; dentro del renglón, SKU y cantidad
+_RENGLONES = re.compile(r"[\n;]+")
+_CAMPOS = re.compile(r"[\t,| ]+")
+
+
+def normalize(texto: str) -> str:
+    """Minúsculas, sin acentos y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", str(texto))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def _ngrams(texto: str) -> set:
+    return {texto[i:i + NGRAM] for i in range(len(texto) - NGRAM + 1)}
+
+
+@dataclass(frozen=True)
+class ProductIndex:
+    codigos: np.ndarray
+    etiquetas: np.ndarray
+    texto: pd.Series
+    codigo_norm: pd.Series
+    por_codigo: dict
+    postings: dict
+
+    def __len__(self) -> int:
+        return len(self.codigos)
+
+    @property
+    def labels(self) -> dict:
+        return dict(zip(self.codigos, self.etiquetas))
+
+    def _candidatos(self, token: str) -> np.ndarray:
+        if len(token) < NGRAM:
+            return np.arange(len(self.codigos))
+        listas = [self.postings.get(g) for g in _ngrams(token)]
+        if any(lst is None for lst in listas):
+            return np.empty(0, dtype=np.int32)
+        listas.sort(key=len)
+        cand = listas[0]
+        for lst in listas[1:]:
+            cand = np.intersect1d(cand, lst, assume_unique=True)
+            if cand.size == 0:
+                break
+        return cand
+
+    def search(self, consulta: str, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        Códigos cuyo código o nombre contienen todas las palabras de la
+        consulta. Primero coincidencia exacta de código, luego prefijo, luego
+        el resto en orden de catálogo.
+        """
+        tokens = normalize(consulta).split()
+        if not tokens:
+            return self.codigos[:limit].tolist()
+
+        cand = None
+        for token in sorted(tokens, key=len, reverse=True):
+            c = self._candidatos(token)
+            cand = c if cand is None else np.intersect1d(cand, c, assume_unique=True)
+            if cand.size == 0:
+                return []
+
+        # Verificación vectorizada sobre los candidatos
+        sub = self.texto.take(cand)
+        mask = np.ones(cand.size, dtype=bool)
+        for t in tokens:
+            mask &= sub.str.contains(t, regex=False).to_numpy(dtype=bool)
+        hits = cand[mask]
+
+        q = " ".join(tokens)
+        codigo = self.codigo_norm.take(hits)
+        rango = np.where(codigo.eq(q), 0, np.where(codigo.str.startswith(q), 1, 2))
+        orden = np.lexsort((hits, rango))[:limit]
+        return self.codigos[hits[orden]].tolist()
+
+    def parse_bulk(self, texto: str) -> tuple:
+        """
+        Resuelve una lista pegada (un SKU por renglón, opcionalmente seguido de
+        cantidad). Devuelve (DataFrame Producto/Cantidad_pedida, no_encontrados,
+        invalidos). Cantidad vacía o no numérica = 0; los renglones con cantidad
+        infinita o fuera de rango (inf, 1e400) se descartan y van a invalidos.
+        SKUs repetidos se suman.
+        """
+        filas, faltan, invalidos = [], [], []
+        for renglon in _RENGLONES.split(texto or ""):
+            campos = [c for c in _CAMPOS.split(renglon.strip()) if c]
+            if not campos:
+                continue
+            codigo = self.por_codigo.get(normalize(campos[0]))
+            if codigo is None:
+                faltan.append(campos[0])
+                continue
+            cantidad = pd.to_numeric(campos[1], errors="coerce") if len(campos) > 1 else np.nan
+            if pd.isna(cantidad):
+                filas.append((codigo, 0))
+            elif not np.isfinite(cantidad):
+                invalidos.append(renglon.strip())
+            else:
+                filas.append((codigo, max(int(cantidad), 0)))
+
+        df = pd.DataFrame(filas, columns=["Producto", "Cantidad_pedida"])
+        df = df.groupby("Producto", sort=False, as_index=False)["Cantidad_pedida"].sum()
+        return df, faltan, invalidos
+
+
+def build_product_index(productos_df: pd.DataFrame) -> ProductIndex:
+    """
+    Índice sobre products_table (si un Producto aparece con varios nombres,
+    se queda el último, como el diccionario de etiquetas original).
+    """
+    cat = productos_df[["Producto", "Nombre_prod"]].drop_duplicates("Producto", keep="last")
+    cat = cat.set_index("Producto").reindex(pd.unique(productos_df["Producto"])).reset_index()
+
+    codigos = cat["Producto"].astype(str).to_numpy(dtype=object)
+    nombres = cat["Nombre_prod"].astype(str).to_numpy(dtype=object)
+    etiquetas = np.array([f"{c} – {n}" for c, n in zip(codigos, nombres)], dtype=object)
+    texto = [normalize(f"{c} {n}") for c, n in zip(codigos, nombres)]
+    codigo_norm = [normalize(c) for c in codigos]
+
+    postings = defaultdict(list)
+    for i, t in enumerate(texto):
+        for g in _ngrams(t):
+            postings[g].append(i)
+
+    return ProductIndex(
+        codigos=codigos,
+        etiquetas=etiquetas,
+        texto=pd.Series(texto, dtype="string"),
+        codigo_norm=pd.Series(codigo_norm, dtype="string"),
+        por_codigo=dict(zip(codigo_norm, codigos)),
+        postings={g: np.asarray(v, dtype=np.int32) for g, v in postings.items()},
+    )
@@ -0,0 +1,186 @@
+"""
+Versiones inmutables del BOM con recarga en caliente.
+
+Un BomSnapshot reúne todo lo que se deriva del Excel (BOM compacto, matriz
+de un nivel, BOM aplanado, catálogo, costo de receta e índice de búsqueda)
+y se construye y valida completo antes de publicarse: columnas esperadas y
+fix de desfase (read_bom_excel), unidades (build_bom_matrix) y ciclos de
+sub-recetas (flatten_bom).
+
+BomWatcher revisa el archivo en un hilo de fondo (polling de tamaño y
+mtime; el cambio debe verse igual en dos revisiones seguidas para no leer
+un archivo a medio copiar) y, si el contenido cambió, arma la versión nueva
+fuera del request y la publica con una sola asignación de referencia. Quien
+toma current() al inicio de un cálculo usa esa versión completa de principio
+a fin; una recarga fallida deja publicada la versión anterior.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculadora.compact import CompactBom, compact_bom
+from calculadora.core import products_table, recipe_cost_vector
+from calculadora.loader import file_digest, load_bom_cached
+from calculadora.matrix import COMP_KEYS, BomMatrix, build_bom_matrix
+from calculadora.multilevel import flatten_bom, product_yields
+from calculadora.search import ProductIndex, build_product_index
+
+DEFAULT_INTERVAL = 2.0
+
+logger = logging.getLogger("calculadora.snapshot")
+
+
+@dataclass(frozen=True)
+class BomSnapshot:
+    version: int
+    sha256: str
+    path: Path
+    cargado: datetime
+    compact: CompactBom
+    bom: BomMatrix
+    flat: BomMatrix
+    productos: pd.DataFrame
+    costo_receta: np.ndarray
+    indice: ProductIndex
+
+    @property
+    def tag(self) -> str:
+        """Identificador estable del contenido (para guardar junto a resultados)."""
+        return self.sha256[:12]
+
+    @property
+    def label(self) -> str:
+        return f"v{self.version} · {self.sha256[:8]} · {self.cargado:%Y-%m-%d %H:%M:%S}"
+
+    def info_frame(self) -> pd.DataFrame:
+        """Una fila con la versión, para adjuntar a los resultados exportados."""
+        return pd.DataFrame({
+            "BOM_version": [self.version],
+            "BOM_sha256": [self.sha256],
+            "Archivo": [str(self.path)],
+            "Cargado": [self.cargado.strftime("%Y-%m-%d %H:%M:%S")],
+            "Productos": [len(self.bom.productos)],
+            "Componentes": [len(self.bom.componentes)],
+        })
+
+
+@dataclass(frozen=True)
+class ReloadError:
+    fecha: datetime
+    mensaje: str
+
+
+def build_snapshot(path: Path, version: int, cache_dir: Path = None) -> BomSnapshot:
+    """
+    Parsea, compila y valida el BOM completo. Lanza ValueError (o sus
+    subclases UnknownUnitError / BomCycleError / BomUnitError) si el archivo no es válido.
+    """
+    digest = file_digest(path)
+    compact = compact_bom(load_bom_cached(path, cache_dir))
+    if len(compact) == 0:
+        raise ValueError("El BOM no tiene renglones de componentes.")
+
+    bom = build_bom_matrix(compact.to_frame(["Producto", *COMP_KEYS, "Cantidad_comp"]))
+    flat = flatten_bom(bom, product_yields(bom, compact.to_frame(["Producto", "Cantidad_prod", "Unidad_prod"])))
+    productos = products_table(compact.to_frame(["Producto", "Nombre_prod", "Tipo_BOM", "Costo_receta", "PU"]))
+    return BomSnapshot(
+        version=version,
+        sha256=digest,
+        path=path,
+        cargado=datetime.now(),
+        compact=compact,
+        bom=bom,
+        flat=flat,
+        productos=productos,
+        costo_receta=recipe_cost_vector(bom, productos),
+        indice=build_product_index(productos),
+    )
+
+
+class BomWatcher:
+    """
+    Versión publicada del BOM y el hilo que la recarga cuando cambia el archivo.
+    La primera carga es síncrona (y lanza la excepción si el BOM es inválido).
+    """
+
+    def __init__(self, path: Path, interval: float = DEFAULT_INTERVAL, cache_dir: Path = None):
+        self.path = Path(path)
+        self.interval = interval
+        self.cache_dir = cache_dir
+        self.error = None
+        self._recarga = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._firma = self._visto = self._stat()
+        self._actual = build_snapshot(self.path, 1, cache_dir)
+
+    def current(self) -> BomSnapshot:
+        return self._actual
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def check(self, force: bool = False) -> bool:
+        """
+        Publica una versión nueva si el archivo cambió. Devuelve True si hubo
+        cambio. Sin force, espera a que el archivo se vea igual en dos
+        revisiones seguidas.
+        """
+        with self._recarga:
+            firma = self._stat()
+            estable = force or firma == self._visto
+            self._visto = firma
+            if firma is None or firma == self._firma or not estable:
+                return False
+
+            actual = self._actual
+            try:
+                if file_digest(self.path) == actual.sha256:
+                    # Solo cambió el mtime (p. ej. se volvió a guardar igual)
+                    self._firma = firma
+                    return False
+                nuevo = build_snapshot(self.path, actual.version + 1, self.cache_dir)
+            except Exception as e:
+                # No reintentar el mismo archivo: se espera al siguiente cambio
+                self._firma = firma
+                self.error = ReloadError(datetime.now(), f"{type(e).__name__}: {e}")
+                logger.warning("Recarga del BOM fallida (%s): %s", self.path, self.error.mensaje)
+                return False
+
+            if self._stat() != firma:
+                # Cambió mientras se armaba: se reintenta en la siguiente revisión
+                return False
+            self._actual = nuevo
+            self._firma = firma
+            self.error = None
+            logger.info("BOM %s publicado: %s", self.path, nuevo.label)
+            return True
+
+    def _loop(self) -> None:
+        while not self._detener.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Error revisando %s", self.path)
+
+    def start(self) -> "BomWatcher":
+        if self._hilo is None or not self._hilo.is_alive():
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._loop, name="bom-watcher", daemon=True)
+            self._hilo.start()
+        return self
+
+    def stop(self) -> None:
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.interval + 1)
+            self._hilo = None
@@ -0,0 +1,110 @@
+"""
+Registro de unidades y conversión vectorizada a unidades base (kg / lt).
+
+Unidad_comp se guarda como categórica al compilar el BOM; convertir un
+DataFrame es entonces resolver las pocas categorías contra el registro y
+hacer un gather por código entero. Una unidad que no está en el registro
+lanza UnknownUnitError en lugar de pasar sin convertir.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# alias (minúsculas) -> (unidad_final, factor). unidad_final None = conservar la etiqueta original
+UNIT_ROWS = [
+    # masa -> kg
+    (("gr", "g", "grs", "gramo", "gramos"), "kg", 1 / 1000),
+    (("kg", "kgs", "kilo", "kilos", "kilogramo", "kilogramos"), "kg", 1.0),
+    (("mg", "miligramo", "miligramos"), "kg", 1 / 1_000_000),
+    (("oz", "onza", "onzas"), "kg", 0.028349523125),
+    (("lb", "lbs", "libra", "libras"), "kg", 0.45359237),
+    # volumen -> lt
+    (("ml", "mililitro", "mililitros"), "lt", 1 / 1000),
+    (("lt", "l", "lts", "litro", "litros"), "lt", 1.0),
+    (("cucharada", "cucharadas", "cda", "tbsp"), "lt", 0.015),
+    (("cucharadita", "cucharaditas", "cdta", "tsp"), "lt", 0.005),
+    (("taza", "tazas"), "lt", 0.24),
+    # conteo (sin conversión)
+    (("unidad", "unidades", "und", "u", "pz", "pza", "pzs", "pieza", "piezas"), None, 1.0),
+]
+
+# Dimensión de las unidades de conteo (su unidad final es la etiqueta original)
+COUNT = "unidad"
+
+
+class UnknownUnitError(ValueError):
+    """Unidad_comp que no está en el registro de unidades."""
+
+
+@dataclass(frozen=True)
+class UnitRegistry:
+    aliases: dict
+
+    @classmethod
+    def from_rows(cls, rows) -> "UnitRegistry":
+        aliases = {}
+        for nombres, destino, factor in rows:
+            for nombre in nombres:
+                aliases[nombre] = (destino, float(factor))
+        return cls(aliases)
+
+    def lookup(self, unidades) -> tuple:
+        """
+        Para una lista corta de etiquetas (p. ej. las categorías) devuelve
+        (factor, unidad_final) como arreglos. Lanza UnknownUnitError si alguna
+        no está registrada.
+        """
+        unidades = list(unidades)
+        claves = [str(u).strip().lower() for u in unidades]
+        faltan = sorted({u for u, k in zip(unidades, claves) if k not in self.aliases}, key=str)
+        if faltan:
+            raise UnknownUnitError(
+                f"Unidades sin conversión registrada: {faltan}. Agrégalas a calculadora/units.py."
+            )
+        factor = np.array([self.aliases[k][1] for k in claves], dtype=np.float64)
+        destino = np.array(
+            [self.aliases[k][0] or u for u, k in zip(unidades, claves)],
+            dtype=object,
+        )
+        return factor, destino
+
+    def gather(self, unidades: pd.Series) -> tuple:
+        """
+        (factor, unidad_final) por renglón: resuelve solo las categorías y
+        hace un gather por código.
+        """
+        cat = unidades if isinstance(unidades.dtype, pd.CategoricalDtype) else unidades.astype("category")
+        codes = cat.cat.codes.to_numpy()
+        if (codes < 0).any():
+            raise UnknownUnitError("Hay componentes sin Unidad_comp.")
+        factor, destino = self.lookup(cat.cat.categories)
+        return factor[codes], destino[codes]
+
+    def dimension(self, unidades: pd.Series) -> np.ndarray:
+        """
+        Dimensión por renglón: la unidad base (kg / lt) o COUNT para las
+        unidades de conteo. Sirve para comparar unidades sin convertirlas.
+        """
+        cat = unidades if isinstance(unidades.dtype, pd.CategoricalDtype) else unidades.astype("category")
+        codes = cat.cat.codes.to_numpy()
+        if (codes < 0).any():
+            raise UnknownUnitError("Hay renglones sin unidad.")
+        self.lookup(cat.cat.categories)
+        dims = np.array(
+            [self.aliases[str(u).strip().lower()][0] or COUNT for u in cat.cat.categories],
+            dtype=object,
+        )
+        return dims[codes]
+
+    def encode(self, unidades: pd.Series) -> pd.Series:
+        """
+        Convierte la columna a categórica y valida que todas sus unidades
+        estén registradas.
+        """
+        cat = unidades.astype("category")
+        self.lookup(cat.cat.categories)
+        return cat
+
+
+UNITS = UnitRegistry.from_rows(UNIT_ROWS)
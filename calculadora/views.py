@@ -0,0 +1,187 @@
+"""
+Vistas paginadas de tablas de resultados.
+
+st.dataframe convierte la tabla completa a Arrow en cada rerun y la manda
+entera al navegador. Aquí solo se materializa la página visible: el filtro
+de texto, el top-N y el orden se resuelven del lado del servidor como un
+vector de posiciones, y cada página se guarda ya convertida a
+pyarrow.Table en una caché LRU por (hash de la tabla, vista, página).
+La tabla completa solo se arma al exportar.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from calculadora.exports import frames_digest
+from calculadora.search import normalize
+
+PAGE_SIZES = (25, 50, 100, 250)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGES_CACHED = 128
+MAX_ORDERS_CACHED = 32
+
+
+@dataclass(frozen=True)
+class ViewSpec:
+    """
+    Qué parte de la tabla se ve.
+    columnas: columnas visibles (None = todas).
+    filtro: texto (sin acentos ni mayúsculas) en cualquier columna visible de texto.
+    top_n / top_por: solo las top_n filas con mayor |top_por| (p. ej. el gap).
+    orden / ascendente: orden de las filas (NaN al final).
+    pagina: base 0; se ajusta al rango válido.
+    """
+
+    columnas: tuple = None
+    filtro: str = ""
+    top_n: int = 0
+    top_por: str = None
+    orden: str = None
+    ascendente: bool = True
+    por_pagina: int = DEFAULT_PAGE_SIZE
+    pagina: int = 0
+
+    def rows_key(self) -> tuple:
+        return (self.columnas, normalize(self.filtro), self.top_n, self.top_por, self.orden, self.ascendente)
+
+
+@dataclass(frozen=True)
+class Page:
+    tabla: pa.Table
+    total: int
+    pagina: int
+    paginas: int
+    inicio: int
+
+    @property
+    def fin(self) -> int:
+        return self.inicio + self.tabla.num_rows
+
+
+def input_digest(*partes) -> str:
+    """
+    sha256 de las entradas que producen una tabla (DataFrames, arrays, bytes
+    o escalares). Más barato que hashear la tabla cuando las entradas son
+    chicas (p. ej. el pedido) y el resultado es grande.
+    """
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            h.update(frames_digest({"": parte}).encode())
+        elif isinstance(parte, np.ndarray):
+            h.update(f"{parte.dtype}{parte.shape}".encode())
+            h.update(np.ascontiguousarray(parte).tobytes())
+        elif isinstance(parte, bytes):
+            h.update(parte)
+        else:
+            h.update(repr(parte).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+def page_count(total: int, por_pagina: int) -> int:
+    return max(1, -(-total // por_pagina))
+
+
+def filter_mask(df: pd.DataFrame, texto: str) -> np.ndarray:
+    """
+    Filas con el texto en alguna columna no numérica. Cada columna se
+    normaliza por valor único (factorize), no por fila.
+    """
+    texto = normalize(texto)
+    mask = np.zeros(len(df), dtype=bool)
+    if not texto:
+        return ~mask
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_bool_dtype(s):
+            continue
+        codes, uniques = pd.factorize(s)
+        hit = np.fromiter((texto in normalize(u) for u in uniques), dtype=bool, count=len(uniques))
+        mask |= (codes >= 0) & hit[np.maximum(codes, 0)]
+    return mask
+
+
+def row_positions(df: pd.DataFrame, spec: ViewSpec) -> np.ndarray:
+    """Posiciones (iloc) de las filas de la vista, ya filtradas y ordenadas."""
+    visibles = df if spec.columnas is None else df[list(spec.columnas)]
+    pos = np.flatnonzero(filter_mask(visibles, spec.filtro))
+
+    if spec.top_n and spec.top_por and spec.top_n < len(pos):
+        magnitud = np.abs(pd.to_numeric(df[spec.top_por], errors="coerce").to_numpy(dtype=np.float64)[pos])
+        magnitud = np.nan_to_num(magnitud, nan=-np.inf)
+        pos = pos[np.argpartition(-magnitud, spec.top_n - 1)[:spec.top_n]]
+        pos.sort()
+
+    if spec.orden:
+        valores = df[spec.orden].iloc[pos].reset_index(drop=True)
+        orden = valores.sort_values(ascending=spec.ascendente, na_position="last", kind="stable").index
+        pos = pos[orden.to_numpy()]
+    return pos
+
+
+class PageCache:
+    """
+    Posiciones por (tabla, vista) y páginas Arrow por (tabla, vista, página),
+    en LRU. Compartida entre sesiones (st.cache_resource); las tablas se
+    identifican por hash de contenido, no por objeto.
+    """
+
+    def __init__(self, max_pages: int = MAX_PAGES_CACHED, max_orders: int = MAX_ORDERS_CACHED):
+        self.max_pages = max_pages
+        self.max_orders = max_orders
+        self._lock = threading.Lock()
+        self._orders = OrderedDict()
+        self._pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(df: pd.DataFrame) -> str:
+        return frames_digest({"tabla": df})
+
+    def _get(self, store: OrderedDict, key):
+        with self._lock:
+            valor = store.get(key)
+            if valor is not None:
+                store.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return valor
+
+    def _put(self, store: OrderedDict, key, valor, limite: int) -> None:
+        with self._lock:
+            store[key] = valor
+            while len(store) > limite:
+                store.popitem(last=False)
+
+    def rows(self, df: pd.DataFrame, spec: ViewSpec, digest: str = None) -> np.ndarray:
+        key = (digest or self.digest(df), spec.rows_key())
+        pos = self._get(self._orders, key)
+        if pos is None:
+            pos = row_positions(df, spec)
+            self._put(self._orders, key, pos, self.max_orders)
+        return pos
+
+    def page(self, df: pd.DataFrame, spec: ViewSpec, digest: str = None) -> Page:
+        digest = digest or self.digest(df)
+        pos = self.rows(df, spec, digest)
+        paginas = page_count(len(pos), spec.por_pagina)
+        pagina = min(max(spec.pagina, 0), paginas - 1)
+
+        key = (digest, spec.rows_key(), spec.por_pagina, pagina)
+        tabla = self._get(self._pages, key)
+        if tabla is None:
+            inicio = pagina * spec.por_pagina
+            sub = df.iloc[pos[inicio:inicio + spec.por_pagina]]
+            if spec.columnas is not None:
+                sub = sub[list(spec.columnas)]
+            tabla = pa.Table.from_pandas(sub, preserve_index=False)
+            self._put(self._pages, key, tabla, self.max_pages)
+        return Page(tabla, len(pos), pagina, paginas, pagina * spec.por_pagina)
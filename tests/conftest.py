@@ -0,0 +1,45 @@
+"""
+Fixtures de las pruebas: el BOM del repo (data/bom_recetas.xlsx) y un
+constructor de BOMs chicos a mano.
+"""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+SHIPPED_BOM = ROOT / "data" / "bom_recetas.xlsx"
+
+
+def bom_frame(filas: list) -> pd.DataFrame:
+    """
+    bom_df mínimo a partir de tuplas
+    (Producto, Componente, Nombre_comp, Cantidad_comp, Unidad_comp).
+    """
+    df = pd.DataFrame(filas, columns=["Producto", "Componente", "Nombre_comp", "Cantidad_comp", "Unidad_comp"])
+    return df.assign(
+        Nombre_prod=df["Producto"],
+        Cantidad_prod=1.0,
+        Unidad_prod="Unidades",
+        Referencia="",
+        Tipo_BOM="Manufactura",
+        Costo_receta=0.0,
+        PU=0.0,
+    )
+
+
+@pytest.fixture(scope="session")
+def shipped_bom_df() -> pd.DataFrame:
+    from calculadora.loader import read_bom_excel
+
+    return read_bom_excel(SHIPPED_BOM)
+
+
+@pytest.fixture(scope="session")
+def shipped_bom(shipped_bom_df):
+    from calculadora.matrix import build_bom_matrix
+
+    return build_bom_matrix(shipped_bom_df)
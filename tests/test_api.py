@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from calculadora.api import ApiError, BomService, explode_batch_lines, explode_one, kpi_one
+from calculadora.snapshot import BomWatcher
+from conftest import SHIPPED_BOM
+
+
+@pytest.fixture(scope="module")
+def service():
+    return BomService(BomWatcher(SHIPPED_BOM).current())
+
+
+@pytest.fixture(scope="module")
+def lineas(service):
+    # Incluye LA-SCQUMO (mismo código en gr y ml): empates de Nombre_comp
+    productos = service.un_nivel.productos
+    return [{"Producto": p, "Cantidad": 3.7} for p in productos]
+
+
+def _respuesta(resultado):
+    # JSONResponse serializa con allow_nan=False
+    return json.loads(json.dumps(resultado, allow_nan=False))
+
+
+def _batch(service, body):
+    return [json.loads(linea) for bloque in explode_batch_lines(service, body) for linea in bloque.splitlines()]
+
+
+@pytest.mark.parametrize("cantidad", [1e400, -1e400, "inf", "NaN"])
+def test_cantidades_no_finitas_son_400(service, lineas, cantidad):
+    mala = [*lineas, {"Producto": lineas[0]["Producto"], "Cantidad": cantidad}]
+    with pytest.raises(ApiError):
+        explode_one(service, {"lineas": mala})
+    with pytest.raises(ApiError):
+        _batch(service, {"pedidos": [{"order_id": "a", "lineas": mala}]})
+    with pytest.raises(ApiError):
+        kpi_one(service, {"lineas": mala, "real": [{"Componente": "X", "Cant_real": 1}]})
+
+
+def test_real_invalido_es_400(service, lineas):
+    for real in [None, [], [1, 2], [{"x": 1}], [{"Componente": "X", "Cant_real": "inf"}]]:
+        with pytest.raises(ApiError):
+            kpi_one(service, {"lineas": lineas, "real": real})
+    _respuesta(kpi_one(service, {"lineas": lineas, "real": [{"componente": "X", "real": 3}]}))
+
+
+@pytest.mark.parametrize("campo", ["multinivel", "convertir_real"])
+def test_opciones_booleanas(service, lineas, campo):
+    body = {"lineas": lineas, "real": [{"Componente": "X", "Cant_real": 1}], campo: "false"}
+    with pytest.raises(ApiError):
+        kpi_one(service, body)
+
+
+@pytest.mark.parametrize("multinivel", [True, False])
+def test_batch_coincide_con_explode(service, lineas, multinivel):
+    body = {"lineas": lineas, "merma": "7.5%", "multinivel": multinivel}
+    uno = _respuesta(explode_one(service, body))
+    (batch,) = _batch(service, {"pedidos": [{"order_id": "a", "lineas": lineas}], "merma": "7.5%", "multinivel": multinivel})
+    # Mismo orden y mismas cantidades (hasta el orden de suma de punto flotante)
+    assert len(batch["insumos"]) == len(uno["insumos"])
+    for b, u in zip(batch["insumos"], uno["insumos"]):
+        assert {k: v for k, v in b.items() if not k.startswith("Cant")} == {k: v for k, v in u.items() if not k.startswith("Cant")}
+        for k in ("Cant_total_teorico_final", "Cant_total_objetivo_final"):
+            assert b[k] == pytest.approx(u[k], rel=1e-13)
+    assert batch["costo_teorico"] == pytest.approx(uno["costo_teorico"])
@@ -0,0 +1,77 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from calculadora.branches import compile_branches, explode_branch, read_overrides
+from calculadora.matrix import COMP_KEYS, build_bom_matrix, explode
+from calculadora.multilevel import flatten_bom, product_yields
+from calculadora.units import UNITS
+
+
+def _codigos_simples(bom, unidad=None):
+    """Códigos de una sola columna del BOM (con esa Unidad_comp, si se pide)."""
+    comps = bom.componentes
+    sel = ~comps["Componente"].duplicated(keep=False)
+    if unidad is not None:
+        sel &= comps["Unidad_comp"] == unidad
+    return comps.loc[sel, "Componente"].tolist()
+
+
+def _editar(bom_df, bom, ajustes):
+    """Aplica los ajustes a mano sobre el bom_df, renglón por renglón."""
+    df = bom_df.astype({"Cantidad_comp": np.float64})
+    for producto, componente, cantidad, sustituto, factor in ajustes:
+        if sustituto is None:
+            filas = df.index[(df["Producto"] == producto) & (df["Componente"] == componente)]
+            df = df.drop(filas[1:] if cantidad else filas)
+            if cantidad:
+                df.loc[filas[0], "Cantidad_comp"] = cantidad
+            continue
+        destino = bom.componentes[bom.componentes["Componente"] == sustituto].iloc[0]
+        filas = (df["Componente"] == componente) & ((df["Producto"] == producto) if producto else True)
+        origen, _ = UNITS.gather(df.loc[filas, "Unidad_comp"])
+        dest, _ = UNITS.gather(pd.Series([destino["Unidad_comp"]]))
+        df.loc[filas, "Cantidad_comp"] = df.loc[filas, "Cantidad_comp"] * factor * origen / dest[0]
+        for k in COMP_KEYS:
+            df.loc[filas, k] = destino[k]
+    return df
+
+
+def test_delta_igual_a_bom_editado(shipped_bom, shipped_bom_df):
+    bom = shipped_bom
+    productos = bom.productos
+    simples = set(_codigos_simples(bom))
+
+    def usa(p, codigos):
+        cols = bom.matriz[productos.get_loc(p)].indices
+        return [c for c in bom.componentes["Componente"].iloc[cols] if c in codigos]
+
+    con_frijol = next(p for p in productos if usa(p, {"ADCO-FRBAME"}))
+    p_cambio, p_quitado = [p for p in productos if usa(p, simples)][:2]
+    cambio, quitado = usa(p_cambio, simples)[0], usa(p_quitado, simples)[-1]
+    gr = [c for c in _codigos_simples(bom, "gr") if c not in {cambio, quitado}]
+    ajustes = [
+        (p_cambio, cambio, 123.0, None, None),
+        (p_quitado, quitado, 0.0, None, None),
+        (None, gr[0], None, gr[1], 1.5),
+        (con_frijol, "ADCO-FRBAME", None, gr[2], 2.0),
+    ]
+    csv = "Sucursal,Producto,Componente,Cantidad_comp,Sustituto,Factor\n" + "".join(
+        f"Norte,{p or ''},{c},{'' if q is None else q},{s or ''},{'' if f is None else f}\n"
+        for p, c, q, s, f in ajustes
+    )
+    rendimientos = product_yields(bom, shipped_bom_df)
+    modelo = compile_branches(bom, flatten_bom(bom, rendimientos), rendimientos, read_overrides(io.StringIO(csv)))
+    assert modelo.ignorados.empty
+
+    editado = build_bom_matrix(_editar(shipped_bom_df, bom, ajustes))
+    pedido = pd.DataFrame({"Producto": productos, "Cantidad_pedida": np.arange(1.0, len(productos) + 1)})
+    cols = [*COMP_KEYS, "Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+    for plano in (False, True):
+        rama = explode_branch(bom, modelo.delta("Norte", plano), pedido, 1.05)[cols]
+        esperado = explode(editado, pedido, 1.05)[cols]
+        juntos = rama.merge(esperado, on=COMP_KEYS, how="outer", suffixes=("_rama", "_editado"), indicator=True)
+        assert (juntos["_merge"] == "both").all()
+        for c in cols[3:]:
+            np.testing.assert_allclose(juntos[f"{c}_rama"], juntos[f"{c}_editado"], rtol=1e-12)
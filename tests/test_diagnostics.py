@@ -0,0 +1,30 @@
+import tracemalloc
+
+import pytest
+
+from calculadora.diagnostics import Profiler
+
+
+@pytest.fixture(autouse=True)
+def sin_trazo():
+    tracemalloc.stop()
+    yield
+    tracemalloc.stop()
+
+
+def test_el_ultimo_perfilador_detiene_el_trazo():
+    a, b = Profiler(memory=True), Profiler(memory=True)
+    a.close()
+    assert tracemalloc.is_tracing()
+    with b.stage("x") as etapa:
+        bytearray(1 << 20)
+    assert etapa.peak_kb is not None
+    b.close()
+    assert not tracemalloc.is_tracing()
+
+
+def test_no_detiene_un_trazo_ajeno():
+    tracemalloc.start()
+    p = Profiler(memory=True)
+    p.close()
+    assert tracemalloc.is_tracing()
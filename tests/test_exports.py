@@ -0,0 +1,32 @@
+import io
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from calculadora.exports import write_xlsx
+
+
+def _libro(contenido: bytes):
+    return openpyxl.load_workbook(io.BytesIO(contenido), read_only=True)
+
+
+def test_xlsx_con_infinitos():
+    df = pd.DataFrame({"Componente": ["A", "B", "C"], "Merma_real_pct": [0.1, np.inf, -np.inf]})
+    hoja = _libro(write_xlsx({"kpi": df}))["kpi"]
+    valores = [fila[1] for fila in hoja.iter_rows(min_row=2, values_only=True)]
+    assert valores[0] == 0.1
+    # Celdas de error de Excel (fórmula 1/0), no vacías
+    assert all(isinstance(v, str) for v in valores[1:])
+
+
+def test_xlsx_reparte_tablas_que_no_caben_en_una_hoja():
+    df = pd.DataFrame({"n": range(5)})
+    libro = _libro(write_xlsx({"kpi": df, "otra": df.head(2)}, max_rows=3))
+    assert libro.sheetnames == ["kpi (1)", "kpi (2)", "kpi (3)", "otra"]
+    leidos = [
+        fila[0]
+        for nombre in libro.sheetnames[:3]
+        for fila in libro[nombre].iter_rows(min_row=2, values_only=True)
+    ]
+    assert leidos == list(range(5))
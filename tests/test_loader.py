@@ -0,0 +1,45 @@
+import pandas as pd
+import pyarrow as pa
+from pandas.testing import assert_frame_equal
+
+from calculadora import loader
+from conftest import SHIPPED_BOM
+
+
+def _workbook_mixto(tmp_path):
+    """El BOM del repo con Referencia numérica y de texto en la misma columna."""
+    raw = pd.read_excel(SHIPPED_BOM)
+    cabeceras = raw.index[raw["Tipo_BOM"].notna()]
+    raw["Referencia"] = raw["Referencia"].astype(object)
+    raw.loc[cabeceras[::2], "Referencia"] = 12345
+    raw.loc[cabeceras[1::2], "Referencia"] = "ABC-1"
+    path = tmp_path / "bom_recetas.xlsx"
+    raw.to_excel(path, index=False)
+    return path
+
+
+def test_feather_round_trip_columnas_mixtas(tmp_path):
+    path = _workbook_mixto(tmp_path)
+    esperado = loader.read_bom_excel(path).reset_index(drop=True)
+
+    primero = loader.load_bom_cached(path)
+    data_path, _ = loader._cache_files(path, loader.default_cache_dir(path))
+    assert data_path.exists()
+    desde_cache = loader.load_bom_cached(path)
+
+    assert set(esperado["Referencia"].dropna()) == {"12345", "ABC-1"}
+    assert_frame_equal(primero, esperado)
+    assert_frame_equal(desde_cache, esperado, check_dtype=False)
+
+
+def test_error_de_arrow_cae_al_excel(tmp_path, monkeypatch):
+    path = _workbook_mixto(tmp_path)
+
+    def falla(*args, **kwargs):
+        raise pa.lib.ArrowInvalid("Conversion failed for column Referencia")
+
+    monkeypatch.setattr(loader.feather, "write_feather", falla)
+    df = loader.load_bom_cached(path)
+    assert len(df) == len(loader.read_bom_excel(path))
+    data_path, _ = loader._cache_files(path, loader.default_cache_dir(path))
+    assert not data_path.exists()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora.matrix import compare_with_merge, explode, explode_merge, explode_orders
+
+
+def _pedido(bom, semilla):
+    rng = np.random.default_rng(semilla)
+    productos = rng.choice(bom.productos, size=min(12, len(bom.productos)), replace=False)
+    return pd.DataFrame({"Producto": productos, "Cantidad_pedida": rng.integers(1, 40, len(productos)).astype(float)})
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_explode_igual_a_merge(shipped_bom, shipped_bom_df, semilla):
+    pedido = _pedido(shipped_bom, semilla)
+    assert compare_with_merge(shipped_bom, shipped_bom_df, pedido, 1.075).empty
+
+    matriz = explode(shipped_bom, pedido, 1.075)
+    merge = explode_merge(shipped_bom_df, pedido, 1.075)
+    assert len(matriz) == len(merge)
+    assert matriz["Nombre_comp"].tolist() == merge["Nombre_comp"].tolist()
+
+
+def test_pedido_completo_igual_a_merge(shipped_bom, shipped_bom_df):
+    pedido = pd.DataFrame({"Producto": shipped_bom.productos, "Cantidad_pedida": 3.0})
+    assert compare_with_merge(shipped_bom, shipped_bom_df, pedido, 1.1).empty
+
+
+def test_explode_orders_igual_a_explode(shipped_bom):
+    pedidos = [_pedido(shipped_bom, s) for s in range(3)]
+    ordenes = pd.concat(
+        [p.rename(columns={"Cantidad_pedida": "Cantidad"}).assign(order_id=f"o{k}") for k, p in enumerate(pedidos)]
+    )
+    lotes = explode_orders(shipped_bom, ordenes, 1.05)
+    cols = ["Componente", "Nombre_comp", "Cant_total_comp_teorico", "Cant_total_comp_objetivo"]
+    for k, pedido in enumerate(pedidos):
+        uno = explode(shipped_bom, pedido, 1.05)[cols].reset_index(drop=True)
+        lote = lotes[lotes["order_id"] == f"o{k}"][cols].reset_index(drop=True)
+        pd.testing.assert_frame_equal(lote, uno, check_exact=False, rtol=1e-12)
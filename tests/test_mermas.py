@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora.mermas import component_categories, compile_rules, read_rules
+
+MERMA = 0.05
+
+
+def _reglas_csv(bom) -> str:
+    """Reglas de todos los niveles sobre códigos del BOM real, con empates y filas ajenas."""
+    productos = bom.productos
+    comps = bom.componentes["Componente"].astype(str)
+    cats = component_categories(bom.componentes["Componente"]).unique()
+    filas = ["Producto,Categoria,Componente,Merma"]
+    p0 = productos[0]
+    c0 = comps[bom.matriz[0].indices[0]]
+    filas += [
+        f"{p0},,{c0},0.30",                 # nivel 1
+        f"{p0},,{c0},0.31",                 # nivel 1: gana la última
+        f"{productos[1]},{cats[0]},,0.20",  # nivel 2
+        f"{p0},{cats[1]},,0.21",            # nivel 2
+        f",,{comps[3]},0.12",               # nivel 3
+        f",,ADCO-FRBAME,0.13",              # nivel 3 (código en dos columnas)
+        f",{cats[0]},,8%",                  # nivel 4
+        f",{cats[2]},,0.09",                # nivel 4
+        f"{productos[2]},,,0.15",           # nivel 5
+        f"{p0},,,0.16",                     # nivel 5
+        f"{productos[1]},,,0.17",           # nivel 5
+        "NO-EXISTE,,,0.5",                  # ignorada
+        ",ZZ,,0.5",                         # ignorada
+    ]
+    return "\n".join(filas) + "\n"
+
+
+def _fuerza_bruta(reglas, producto, componente, categoria, merma, merma_comp):
+    """Merma de una entrada aplicando la precedencia documentada, regla por regla."""
+    def ultima(mascara):
+        sel = reglas[mascara]
+        return sel["Merma"].iloc[-1] if len(sel) else None
+
+    p, c, k, n = reglas["Producto"], reglas["Componente"], reglas["Categoria"], reglas["Nivel"]
+    for valor in (
+        ultima((n == 1) & (p == producto) & (c == componente)),
+        ultima((n == 2) & (p == producto) & (k == categoria)),
+        None if np.isnan(merma_comp) else merma_comp,
+        ultima((n == 3) & (c == componente)),
+        ultima((n == 4) & (k == categoria)),
+        ultima((n == 5) & (p == producto)),
+    ):
+        if valor is not None:
+            return valor
+    return merma
+
+
+@pytest.mark.parametrize("con_sucursal", [False, True])
+def test_precedencia_contra_fuerza_bruta(shipped_bom, con_sucursal):
+    reglas = compile_rules(shipped_bom, read_rules(io.StringIO(_reglas_csv(shipped_bom))))
+    assert len(reglas.ignorados) == 2
+
+    n_comp = shipped_bom.shape[1]
+    merma_comp = np.full(n_comp, np.nan)
+    if con_sucursal:
+        merma_comp[::4] = 0.4
+    factores = reglas.entry_factors(shipped_bom.matriz, MERMA, merma_comp if con_sucursal else None)
+
+    m = shipped_bom.matriz
+    filas = np.repeat(np.arange(m.shape[0]), np.diff(m.indptr))
+    comps = shipped_bom.componentes["Componente"].astype(str).to_numpy()
+    cats = component_categories(shipped_bom.componentes["Componente"]).to_numpy()
+    assert len(factores) == m.nnz == 136
+    for f, c, obtenido in zip(filas, m.indices, factores):
+        esperado = _fuerza_bruta(reglas.reglas, shipped_bom.productos[f], comps[c], cats[c], MERMA, merma_comp[c])
+        assert obtenido == pytest.approx(1.0 + esperado), (shipped_bom.productos[f], comps[c])
+
+
+def test_factor_de_resumen_igual_a_entradas(shipped_bom):
+    reglas = compile_rules(shipped_bom, read_rules(io.StringIO(_reglas_csv(shipped_bom))))
+    q = np.arange(1, shipped_bom.shape[0] + 1, dtype=np.float64)
+    m = shipped_bom.matriz
+    teorico = m.T @ q
+    objetivo = pd.Series(q[np.repeat(np.arange(m.shape[0]), np.diff(m.indptr))] * m.data
+                         * reglas.entry_factors(m, MERMA)).groupby(m.indices).sum()
+    factor = reglas.factor(teorico, q, [m], MERMA)
+    np.testing.assert_allclose((factor * teorico)[objetivo.index], objetivo.to_numpy(), rtol=1e-12)
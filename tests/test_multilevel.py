@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+import pytest
+
+from calculadora.branches import compile_branches, read_overrides
+from calculadora.matrix import build_bom_matrix
+from calculadora.multilevel import BomUnitError, flatten_bom, product_yields
+from conftest import bom_frame
+
+
+def _bom_df(unidad_taco="gr", unidad_salsa="kg"):
+    df = bom_frame([
+        ("TACO", "SALSA", "Salsa roja", 200, unidad_taco),
+        ("TACO", "TORT", "Tortilla", 2, "Unidades"),
+        ("SALSA", "TOMATE", "Tomate", 800, "gr"),
+        ("SALSA", "CHILE", "Chile seco", 0.2, "kg"),
+        ("OTRO", "CHILE2", "Chile de árbol", 10, "gr"),
+        ("OTRO", "ACEITE", "Aceite", 10, "ml"),
+    ])
+    df.loc[df["Producto"] == "SALSA", "Unidad_prod"] = unidad_salsa
+    return df
+
+
+def _valor(bom, matriz, producto, componente):
+    p = bom.productos.get_loc(producto)
+    c = np.flatnonzero(bom.componentes["Componente"].to_numpy() == componente)[0]
+    return matriz[p, c]
+
+
+def test_subreceta_en_otra_unidad_se_convierte():
+    df = _bom_df()
+    bom = build_bom_matrix(df)
+    plana = flatten_bom(bom, product_yields(bom, df)).matriz
+    # 200 gr de una salsa que rinde 1 kg = 0.2 recetas
+    assert _valor(bom, plana, "TACO", "TOMATE") == pytest.approx(160.0)
+    assert _valor(bom, plana, "TACO", "CHILE") == pytest.approx(0.04)
+    assert _valor(bom, plana, "TACO", "SALSA") == 0.0
+
+
+def test_subreceta_de_otra_dimension_falla():
+    df = _bom_df(unidad_taco="ml")
+    bom = build_bom_matrix(df)
+    with pytest.raises(BomUnitError, match="SALSA"):
+        flatten_bom(bom, product_yields(bom, df))
+
+
+def test_rendimiento_sin_unidad_conserva_la_del_padre():
+    df = _bom_df(unidad_salsa="Porción")
+    bom = build_bom_matrix(df)
+    plana = flatten_bom(bom, product_yields(bom, df)).matriz
+    assert _valor(bom, plana, "TACO", "TOMATE") == pytest.approx(200 * 800)
+
+
+def _compilar(df, csv):
+    bom = build_bom_matrix(df)
+    rendimientos = product_yields(bom, df)
+    return bom, compile_branches(bom, flatten_bom(bom, rendimientos), rendimientos, read_overrides(io.StringIO(csv)))
+
+
+def test_sustituto_se_convierte_a_la_unidad_del_destino():
+    bom, modelo = _compilar(_bom_df(), "Sucursal,Componente,Sustituto,Factor\nNorte,CHILE,CHILE2,2\n")
+    delta = modelo.delta("Norte", plano=False).delta.toarray()
+    # 0.2 kg × 2 = 400 gr en la columna (gr) de CHILE2
+    assert _valor(bom, delta, "SALSA", "CHILE") == pytest.approx(-0.2)
+    assert _valor(bom, delta, "SALSA", "CHILE2") == pytest.approx(400.0)
+    assert modelo.ignorados.empty
+
+
+def test_sustituto_de_otra_dimension_se_ignora():
+    _, modelo = _compilar(_bom_df(), "Sucursal,Componente,Sustituto\nNorte,CHILE,ACEITE\n")
+    assert modelo.delta("Norte", plano=False) is None
+    assert modelo.ignorados["Sustituto"].tolist() == ["ACEITE"]
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from calculadora.matrix import build_bom_matrix
+from calculadora.production import production_mix, stock_groups, stock_vector
+from conftest import bom_frame
+
+
+def _bom_codigo_duplicado():
+    # X aparece en dos columnas (otro Nombre_comp), como ADCO-FRBAME en el BOM real
+    return build_bom_matrix(bom_frame([
+        ("P1", "X", "Frijoles Refritos", 600, "gr"),
+        ("P2", "X", "Frijoles bayos refritos", 600, "gr"),
+        ("P2", "Y", "Tortilla", 1, "Unidades"),
+    ]))
+
+
+def test_codigo_duplicado_comparte_stock():
+    bom = _bom_codigo_duplicado()
+    _, claves, _ = stock_groups(bom)
+    assert claves["Componente"].tolist() == ["X", "Y"]
+
+    stock = stock_vector(bom, pd.DataFrame({"Componente": ["X", "Y"], "Stock": [1.0, 10.0]}))
+    for metodo in ("ilp", "lp"):
+        plan, uso, _ = production_mix(bom, stock, metodo=metodo)
+        assert plan["Producir"].sum() == 1
+        usado = uso.set_index("Componente")["Usado"]
+        assert usado["X"] <= 1.0 + 1e-9
+
+
+def test_codigo_duplicado_en_bom_real(shipped_bom):
+    """10 kg de ADCO-FRBAME (dos columnas en el BOM) no pueden usarse dos veces."""
+    stock_df = pd.DataFrame({"Componente": shipped_bom.componentes["Componente"].unique(), "Stock": 1e6})
+    stock_df.loc[stock_df["Componente"] == "ADCO-FRBAME", "Stock"] = 10.0
+    stock = stock_vector(shipped_bom, stock_df)
+
+    con_frijol = (shipped_bom.matriz[:, (shipped_bom.componentes["Componente"] == "ADCO-FRBAME").to_numpy()]
+                  .sum(axis=1).A1 > 0)
+    margen = np.where(con_frijol, 100.0, 0.0)
+    _, uso, _ = production_mix(shipped_bom, stock, margen, metodo="ilp")
+    fila = uso[uso["Componente"] == "ADCO-FRBAME"].iloc[0]
+    assert 9.0 <= fila["Usado"] <= 10.0 + 1e-9
@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculadora.purchasing import net_requirements, optimize_purchase
+
+
+def _resumen(filas):
+    return pd.DataFrame(filas, columns=["Componente", "Nombre_comp", "Unidad_final", "Cant_total_objetivo_final"])
+
+
+def _stock(**stock):
+    return pd.DataFrame({"Componente": list(stock), "Stock": list(stock.values())})
+
+
+def test_stock_se_descuenta_una_vez_por_codigo():
+    resumen = _resumen([("A", "Frijoles Refritos", "kg", 24.5), ("A", "Frijoles bayos", "kg", 5.5)])
+    neto = net_requirements(resumen, _stock(A=20.0))
+    assert neto[["Requerido", "Stock", "Neto"]].values.tolist() == [[30.0, 20.0, 10.0]]
+
+    catalogo = pd.DataFrame({"Componente": ["A"], "Proveedor": ["p"], "Presentacion": [1.0], "Precio": [10.0]})
+    compra, _ = optimize_purchase(resumen, catalogo, _stock(A=20.0))
+    assert compra["Paquetes"].sum() == 10
+
+
+def test_stock_repartido_entre_dimensiones():
+    resumen = _resumen([("A", "Queso", "kg", 5.0), ("A", "Queso", "lt", 10.0)])
+    neto = net_requirements(resumen, _stock(A=8.0)).set_index("Unidad_final")
+    assert neto["Stock"].sum() == pytest.approx(8.0)
+    assert neto.loc["kg", "Neto"] == 0.0 and neto.loc["lt", "Neto"] == pytest.approx(7.0)
+
+
+def test_presentacion_de_otra_dimension_no_se_ofrece():
+    resumen = _resumen([("B", "Jarabe", "lt", 3.0)])
+    catalogo = pd.DataFrame({
+        "Componente": ["B", "B"],
+        "Proveedor": ["kilo", "litro"],
+        "Presentacion": [1.0, 1.0],
+        "Precio": [1.0, 5.0],
+        "Unidad_presentacion": ["kg", "lt"],
+    })
+    compra, _ = optimize_purchase(resumen, catalogo)
+    assert compra["Proveedor"].tolist() == ["litro"]
+
+    compra, sin_proveedor = optimize_purchase(resumen, catalogo.iloc[:1])
+    assert compra.empty and sin_proveedor["Componente"].tolist() == ["B"]
+
+
+def _fuerza_bruta(neto, opciones):
+    """Costo mínimo con una o dos presentaciones (lo que explora el optimizador)."""
+    mejor = np.inf
+    for k in (1, 2):
+        for combo in itertools.combinations(opciones, k):
+            rangos = [
+                [0, *range(moq, int(np.ceil(neto / tam)) + moq + 1)] for tam, _, moq in combo
+            ]
+            for n in itertools.product(*rangos):
+                if sum(n) and sum(ni * tam for ni, (tam, _, _) in zip(n, combo)) >= neto - 1e-9:
+                    mejor = min(mejor, sum(ni * precio for ni, (_, precio, _) in zip(n, combo)))
+    return mejor
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_optimo_contra_fuerza_bruta(semilla):
+    rng = np.random.default_rng(semilla)
+    codigos = [f"C{i}" for i in range(6)]
+    # Códigos repetidos en el resumen, como en el BOM real
+    filas = [(c, f"{c}-{j}", "kg", float(rng.uniform(0.5, 15))) for c in codigos for j in range(rng.integers(1, 3))]
+    resumen = _resumen(filas)
+    stock = _stock(**{c: float(rng.uniform(0, 10)) for c in codigos[::2]})
+    catalogo = pd.DataFrame([
+        (c, f"p{k}", float(rng.choice([0.5, 1, 2.5, 5, 10])), float(rng.uniform(5, 120)), int(rng.integers(1, 4)))
+        for c in codigos for k in range(rng.integers(1, 4))
+    ], columns=["Componente", "Proveedor", "Presentacion", "Precio", "MOQ"])
+
+    compra, sin_proveedor = optimize_purchase(resumen, catalogo, stock)
+    assert sin_proveedor.empty
+
+    requerido = resumen.groupby("Componente")["Cant_total_objetivo_final"].sum()
+    en_mano = stock.set_index("Componente")["Stock"].reindex(requerido.index).fillna(0.0)
+    costo = compra.groupby("Componente")["Costo"].sum()
+    for c, neto in (requerido - en_mano).clip(lower=0).items():
+        opciones = catalogo.loc[catalogo["Componente"] == c, ["Presentacion", "Precio", "MOQ"]]
+        esperado = _fuerza_bruta(neto, list(opciones.itertuples(index=False))) if neto > 1e-9 else 0.0
+        assert costo.get(c, 0.0) == pytest.approx(esperado)
+        comprado = compra.loc[compra["Componente"] == c, "Cantidad_comprada"].sum()
+        assert comprado >= neto - 1e-9